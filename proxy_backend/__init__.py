@@ -0,0 +1,5 @@
+"""FastAPI proxy between the TARS Flutter app and the upstream AI service.
+
+Serve it with ``uvicorn proxy_backend.main:app``, ``python -m proxy_backend.main``
+or ``python proxy_backend/main.py`` from the repository root.
+"""
@@ -0,0 +1,11 @@
+"""``python -m proxy_backend``: serve the proxy with uvicorn."""
+import os
+
+import uvicorn
+
+uvicorn.run(
+    "proxy_backend.main:app",
+    host="0.0.0.0",
+    port=int(os.getenv("PORT", "8000")),
+    reload=os.getenv("ENV", "development") == "development",
+)
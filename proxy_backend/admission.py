@@ -0,0 +1,282 @@
+"""Admission control and priority scheduling for upstream calls.
+
+At most ``max_concurrent`` calls run at once. Further callers wait in a
+bounded queue. Interactive requests (an agent live on a call) are served
+before background ones (auto-coach), and background calls may only occupy
+``background_share`` of the slots so they cannot crowd agents out when the
+upstream is saturated. A background waiter queued for longer than
+``background_max_wait`` is served ahead of interactive traffic, so
+background work still completes. Within each priority the queue is drained
+round-robin across clients so a single burst cannot starve everyone else.
+Requests are rejected up front instead of waiting when the queue is full or
+the estimated wait exceeds the queue deadline.
+"""
+from __future__ import annotations
+
+import asyncio
+import collections
+import enum
+import math
+import os
+import time
+from typing import Callable, Deque, Dict, Optional
+
+UPSTREAM_MAX_CONCURRENCY = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "32"))
+UPSTREAM_QUEUE_SIZE = int(os.getenv("UPSTREAM_QUEUE_SIZE", "128"))
+UPSTREAM_QUEUE_PER_CLIENT = int(os.getenv("UPSTREAM_QUEUE_PER_CLIENT", "8"))
+UPSTREAM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT_SECONDS", "30"))
+# Fraction of the slots and of the queue that background requests may use.
+UPSTREAM_BACKGROUND_SHARE = float(os.getenv("UPSTREAM_BACKGROUND_SHARE", "0.5"))
+# Background requests may be deferred longer, but are promoted once they waited MAX_WAIT.
+UPSTREAM_BACKGROUND_QUEUE_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_BACKGROUND_QUEUE_TIMEOUT_SECONDS", "120"))
+UPSTREAM_BACKGROUND_MAX_WAIT_SECONDS = float(os.getenv("UPSTREAM_BACKGROUND_MAX_WAIT_SECONDS", "20"))
+# Weight of the latest hold time in the moving average used for wait estimates.
+HOLD_TIME_SMOOTHING = 0.2
+
+
+class Priority(str, enum.Enum):
+    INTERACTIVE = "interactive"
+    BACKGROUND = "background"
+
+
+class Overloaded(Exception):
+    """The call was not admitted; ``status_code`` is 429 (this client) or 503 (everyone)."""
+
+    def __init__(self, status_code: int, reason: str, retry_after: float) -> None:
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class _Waiter:
+    __slots__ = ("future", "client", "enqueued_at")
+
+    def __init__(self, future: "asyncio.Future[None]", client: str, enqueued_at: float) -> None:
+        self.future = future
+        self.client = client
+        self.enqueued_at = enqueued_at
+
+
+class _FairQueue:
+    """Per-client FIFOs served round-robin; the dict order is the rotation order."""
+
+    def __init__(self) -> None:
+        self._clients: "collections.OrderedDict[str, Deque[_Waiter]]" = collections.OrderedDict()
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def clients(self) -> int:
+        return len(self._clients)
+
+    def queued_for(self, client: str) -> int:
+        return len(self._clients.get(client, ()))
+
+    def push(self, waiter: _Waiter) -> None:
+        self._clients.setdefault(waiter.client, collections.deque()).append(waiter)
+        self.size += 1
+
+    def oldest(self) -> Optional[_Waiter]:
+        """The longest-waiting head of any client queue."""
+
+        return min((waiters[0] for waiters in self._clients.values()), key=lambda w: w.enqueued_at, default=None)
+
+    def pop_next(self) -> Optional[_Waiter]:
+        """Take the head of the next client in rotation and move that client to the back."""
+
+        if not self._clients:
+            return None
+        client, waiters = next(iter(self._clients.items()))
+        waiter = waiters.popleft()
+        self._forget_or_rotate(client, waiters)
+        return waiter
+
+    def remove(self, waiter: _Waiter) -> bool:
+        waiters = self._clients.get(waiter.client)
+        if waiters is None or waiter not in waiters:
+            return False
+        rotate = waiters[0] is waiter
+        waiters.remove(waiter)
+        if rotate:
+            self._forget_or_rotate(waiter.client, waiters)
+        else:
+            self.size -= 1
+        return True
+
+    def _forget_or_rotate(self, client: str, waiters: Deque[_Waiter]) -> None:
+        self.size -= 1
+        if waiters:
+            self._clients.move_to_end(client)
+        else:
+            del self._clients[client]
+
+
+class AdmissionController:
+    """Counting semaphore with bounded, prioritized, per-client fair wait queues.
+
+    Callers pair :meth:`acquire` with :meth:`release` for the same priority,
+    passing how long the slot was held so wait estimates follow the real
+    upstream latency.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        max_queue: int,
+        max_queue_per_client: int,
+        queue_timeout: float,
+        background_share: float = 1.0,
+        background_queue_timeout: Optional[float] = None,
+        background_max_wait: float = math.inf,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.max_queue_per_client = max(1, max_queue_per_client)
+        share = min(1.0, max(0.0, background_share))
+        self.max_background = max(1, int(self.max_concurrent * share))
+        self.max_background_queue = int(self.max_queue * share)
+        self.timeouts = {
+            Priority.INTERACTIVE: queue_timeout,
+            Priority.BACKGROUND: queue_timeout if background_queue_timeout is None else background_queue_timeout,
+        }
+        self.background_max_wait = background_max_wait
+        self._clock = clock
+        self._active = {priority: 0 for priority in Priority}
+        self._queues = {priority: _FairQueue() for priority in Priority}
+        self.admitted = {priority: 0 for priority in Priority}
+        self.promoted = 0
+        self.rejected: Dict[str, int] = {}
+        # Moving average of how long a slot is held; unknown until the first release.
+        self._hold_seconds: Optional[float] = None
+
+    @property
+    def active(self) -> int:
+        return sum(self._active.values())
+
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def active_for(self, priority: Priority) -> int:
+        return self._active[priority]
+
+    def queued_for(self, priority: Priority) -> int:
+        return len(self._queues[priority])
+
+    def estimated_wait(self, priority: Priority = Priority.INTERACTIVE) -> float:
+        """Rough time until a newly queued call would start (0 before any call finished)."""
+
+        hold = self._hold_seconds or 0.0
+        if priority is Priority.INTERACTIVE:
+            return (self.queued_for(Priority.INTERACTIVE) + 1) / self.max_concurrent * hold
+        return (self.queued + 1) / self.max_background * hold
+
+    async def acquire(self, client: str, priority: Priority = Priority.INTERACTIVE) -> None:
+        # Nobody of equal or higher priority is waiting: take a free slot directly.
+        ahead = self.queued_for(Priority.INTERACTIVE) if priority is Priority.INTERACTIVE else self.queued
+        if not ahead and self._has_room(priority):
+            self._grant(priority)
+            return
+        self._check_queue(client, priority)
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), client, self._clock())
+        self._queues[priority].push(waiter)
+        try:
+            await asyncio.wait_for(waiter.future, self.timeouts[priority])
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just as we gave up; hand the slot on.
+                self.release(priority)
+            else:
+                self._queues[priority].remove(waiter)
+            if isinstance(exc, asyncio.TimeoutError):
+                self._reject("queue_timeout")
+                raise Overloaded(503, "queue_timeout", self.estimated_wait(priority)) from None
+            raise
+
+    def release(self, priority: Priority = Priority.INTERACTIVE, held_seconds: Optional[float] = None) -> None:
+        if held_seconds is not None:
+            previous = held_seconds if self._hold_seconds is None else self._hold_seconds
+            self._hold_seconds = previous + HOLD_TIME_SMOOTHING * (held_seconds - previous)
+        self._active[priority] -= 1
+        self._dispatch()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "active": {priority.value: count for priority, count in self._active.items()},
+            "queued": {priority.value: len(queue) for priority, queue in self._queues.items()},
+            "clients_waiting": sum(queue.clients for queue in self._queues.values()),
+            "admitted": {priority.value: count for priority, count in self.admitted.items()},
+            "background_promoted": self.promoted,
+            "rejected": dict(self.rejected),
+            "estimated_wait_s": round(self.estimated_wait(), 3),
+        }
+
+    def _has_room(self, priority: Priority) -> bool:
+        if self.active >= self.max_concurrent:
+            return False
+        return priority is Priority.INTERACTIVE or self._active[Priority.BACKGROUND] < self.max_background
+
+    def _grant(self, priority: Priority) -> None:
+        self._active[priority] += 1
+        self.admitted[priority] += 1
+
+    def _dispatch(self) -> None:
+        interactive = self._queues[Priority.INTERACTIVE]
+        background = self._queues[Priority.BACKGROUND]
+        while self.active < self.max_concurrent:
+            waiter, priority = None, Priority.INTERACTIVE
+            if len(background) and self._has_room(Priority.BACKGROUND):
+                oldest = background.oldest()
+                starving = oldest is not None and self._clock() - oldest.enqueued_at >= self.background_max_wait
+                if starving and len(interactive):
+                    background.remove(oldest)
+                    waiter, priority = oldest, Priority.BACKGROUND
+                    self.promoted += 1
+                elif not len(interactive):
+                    waiter, priority = background.pop_next(), Priority.BACKGROUND
+            if waiter is None:
+                waiter = interactive.pop_next()
+            if waiter is None:
+                return
+            if not waiter.future.done():
+                self._grant(priority)
+                waiter.future.set_result(None)
+
+    def _check_queue(self, client: str, priority: Priority) -> None:
+        if self.queued >= self.max_queue:
+            self._reject("queue_full")
+            raise Overloaded(503, "queue_full", self.estimated_wait(priority))
+        if priority is Priority.BACKGROUND and self.queued_for(priority) >= self.max_background_queue:
+            # Background traffic is shed first so the rest of the queue stays available to agents.
+            self._reject("background_queue_full")
+            raise Overloaded(503, "background_queue_full", self.estimated_wait(priority))
+        if self._queues[priority].queued_for(client) >= self.max_queue_per_client:
+            self._reject("client_queue_full")
+            raise Overloaded(429, "client_queue_full", self.estimated_wait(priority))
+        if self.estimated_wait(priority) > self.timeouts[priority]:
+            # It would time out in the queue anyway; fail now and free the client.
+            self._reject("wait_exceeds_deadline")
+            raise Overloaded(503, "wait_exceeds_deadline", self.estimated_wait(priority))
+
+    def _reject(self, reason: str) -> None:
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+
+
+def create_admission_controller() -> Optional[AdmissionController]:
+    """``None`` when UPSTREAM_MAX_CONCURRENCY is 0, which disables admission control."""
+
+    if UPSTREAM_MAX_CONCURRENCY <= 0:
+        return None
+    return AdmissionController(
+        UPSTREAM_MAX_CONCURRENCY,
+        UPSTREAM_QUEUE_SIZE,
+        UPSTREAM_QUEUE_PER_CLIENT,
+        UPSTREAM_QUEUE_TIMEOUT_SECONDS,
+        background_share=UPSTREAM_BACKGROUND_SHARE,
+        background_queue_timeout=UPSTREAM_BACKGROUND_QUEUE_TIMEOUT_SECONDS,
+        background_max_wait=UPSTREAM_BACKGROUND_MAX_WAIT_SECONDS,
+    )
@@ -0,0 +1,40 @@
+"""Fixed benchmark inputs drawn from the Tally manual."""
+from __future__ import annotations
+
+import json
+import os
+from typing import List
+
+MANUAL_PATH = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "..", "assets", "tally_manual.json"))
+
+ISSUE_QUERIES = [
+    "tally not opening",
+    "Tally not opening on startup",
+    "GST returns showing mismatch in voucher 102",
+    "sales voucher",
+    "invoice not generating",
+    "bill not printing",
+    "bank reconciliation difference",
+    "license activation failed",
+    "stock item valuation wrong",
+    "edit log",
+    "your issue",
+    "Getting error 'No accounting entries' while saving sales voucher in Tally Prime.",
+]
+
+COMPLETE_ANSWER = (
+    "Issue Acknowledgement:\n• I understand the GST mismatch.\n\n"
+    "Clarifying Question:\n• Does it happen while saving (A) or while reviewing (B)?\n\n"
+    "Solution:\nIf A):\n- Step 1: Re-open the voucher.\n- Step 2: Check the tax ledger.\n\n"
+    "If B):\n- Step 1: Re-open the report.\n- Step 2: Export to PDF."
+)
+PARTIAL_ANSWER = "Issue Acknowledgement: I see you have a problem with Tally."
+
+
+def query_corpus() -> List[str]:
+    """Hand-written issue texts plus every tutorial title in the manual."""
+
+    with open(MANUAL_PATH, "r", encoding="utf-8") as manual_file:
+        tutorials = json.load(manual_file).get("tutorials", [])
+    titles = [tutorial.get("title", "") for tutorial in tutorials if tutorial.get("title")]
+    return ISSUE_QUERIES + titles
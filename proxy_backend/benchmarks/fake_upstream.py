@@ -0,0 +1,60 @@
+"""In-process stand-in for the upstream AI service used by the load benchmark."""
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+from dataclasses import dataclass, field
+from typing import Dict
+
+import httpx
+
+STRUCTURED_ANSWER = (
+    "Issue Acknowledgement:\n• I understand the issue you reported.\n\n"
+    "Clarifying Question:\n• Does it happen while saving (A) or while reviewing (B)?\n\n"
+    "Solution:\nIf A):\n- Step 1: Re-open the voucher.\n\nIf B):\n- Step 1: Re-open the report."
+)
+
+
+@dataclass
+class FakeUpstreamConfig:
+    """Latency is drawn from a log-normal around ``median_latency`` seconds."""
+
+    median_latency: float = 0.05
+    latency_sigma: float = 0.5
+    error_rate: float = 0.0
+    timeout_rate: float = 0.0
+    timeout_after: float = 0.2
+    seed: int = 1234
+
+
+@dataclass
+class FakeUpstream:
+    config: FakeUpstreamConfig = field(default_factory=FakeUpstreamConfig)
+    calls: int = 0
+    outcomes: Dict[str, int] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        self._random = random.Random(self.config.seed)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        roll = self._random.random()
+        if roll < self.config.timeout_rate:
+            self._count("timeout")
+            await asyncio.sleep(self.config.timeout_after)
+            raise httpx.ReadTimeout("fake upstream timed out", request=request)
+        await asyncio.sleep(self._random.lognormvariate(0.0, self.config.latency_sigma) * self.config.median_latency)
+        if roll < self.config.timeout_rate + self.config.error_rate:
+            self._count("error")
+            return httpx.Response(500, text="fake upstream failure", request=request)
+        self._count("ok")
+        body = json.loads(request.content or b"{}")
+        answer = STRUCTURED_ANSWER if "image" not in body else STRUCTURED_ANSWER + "\n(image received)"
+        return httpx.Response(200, json={"answer": answer}, request=request)
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(self.handle))
+
+    def _count(self, outcome: str) -> None:
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
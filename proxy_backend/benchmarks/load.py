@@ -0,0 +1,79 @@
+"""End-to-end load generator for the FastAPI app against the fake upstream."""
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Dict, List
+
+import httpx
+
+from .corpus import query_corpus
+from .fake_upstream import FakeUpstream, FakeUpstreamConfig
+from .micro import percentile
+
+
+async def _run_load(requests: int, concurrency: int, upstream: FakeUpstream) -> Dict[str, object]:
+    from .. import main
+
+    queries = query_corpus()
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    previous_client = main.UPSTREAM_CLIENT
+    main.UPSTREAM_CLIENT = upstream.client()
+    # ASGITransport does not run the lifespan, so start the CPU pool and a lag sampler here.
+    main.CPU_EXECUTOR.start(main.__name__)
+    lag_samples: List[float] = []
+    lag_sampler = asyncio.ensure_future(_sample_loop_lag(lag_samples))
+
+    async def one(client: httpx.AsyncClient, index: int) -> None:
+        # A per-request suffix keeps the response cache and single-flight out of the measurement.
+        payload = {"question": f"Customer issue: {queries[index % len(queries)]} (#{index})"}
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post("/ask", json=payload)
+            latencies.append(time.perf_counter() - started)
+        statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+    transport = httpx.ASGITransport(app=main.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            started = time.perf_counter()
+            await asyncio.gather(*(one(client, index) for index in range(requests)))
+            wall = time.perf_counter() - started
+    finally:
+        lag_sampler.cancel()
+        main.CPU_EXECUTOR.shutdown()
+        await main.UPSTREAM_CLIENT.aclose()
+        main.UPSTREAM_CLIENT = previous_client
+
+    latencies.sort()
+    lag_samples.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "wall_s": round(wall, 4),
+        "throughput_rps": round(requests / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        "loop_lag_p99_ms": round(percentile(lag_samples, 0.99) * 1000, 3),
+        "loop_lag_max_ms": round(lag_samples[-1] * 1000, 3) if lag_samples else 0.0,
+        "cpu_executor": main.CPU_EXECUTOR.kind,
+        "statuses": statuses,
+        "upstream_calls": upstream.calls,
+        "upstream_outcomes": upstream.outcomes,
+    }
+
+
+async def _sample_loop_lag(samples: List[float], interval: float = 0.005) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - expected))
+
+
+def run_load(requests: int, concurrency: int, config: FakeUpstreamConfig) -> Dict[str, object]:
+    return asyncio.run(_run_load(requests, concurrency, FakeUpstream(config)))
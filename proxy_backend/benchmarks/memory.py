@@ -0,0 +1,92 @@
+"""Peak memory of one screenshot request, via /ask (base64 JSON) and /ask/upload (multipart).
+
+Peaks are measured with ``tracemalloc`` around a single request through the
+ASGI app. They include the client-side request body chunks and the body
+copy the mock upstream transport keeps, which are the same for both paths.
+"""
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+import random
+import tracemalloc
+from typing import AsyncIterator, Dict
+
+import httpx
+
+from .fake_upstream import STRUCTURED_ANSWER
+
+UPLOAD_BOUNDARY = "benchmark-boundary-7f3a"
+CHUNK_BYTES = 64 * 1024
+
+
+def _fake_png(size: int, seed: int) -> bytes:
+    return b"\x89PNG\r\n\x1a\n" + random.Random(seed).randbytes(max(0, size - 8))
+
+
+def _multipart_body(question: str, image: bytes) -> bytes:
+    return b"".join(
+        [
+            f'--{UPLOAD_BOUNDARY}\r\nContent-Disposition: form-data; name="question"\r\n\r\n'.encode("ascii"),
+            question.encode("utf-8"),
+            f'\r\n--{UPLOAD_BOUNDARY}\r\nContent-Disposition: form-data; name="image"; filename="screen.png"\r\n'
+            "Content-Type: image/png\r\n\r\n".encode("ascii"),
+            image,
+            f"\r\n--{UPLOAD_BOUNDARY}--\r\n".encode("ascii"),
+        ]
+    )
+
+
+async def _chunks(body: bytes) -> AsyncIterator[bytes]:
+    view = memoryview(body)
+    for start in range(0, len(body), CHUNK_BYTES):
+        yield bytes(view[start : start + CHUNK_BYTES])
+
+
+async def _peak_bytes(client: httpx.AsyncClient, path: str, body: bytes, content_type: str) -> int:
+    tracemalloc.start()
+    try:
+        response = await client.post(path, content=_chunks(body), headers={"content-type": content_type})
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    response.raise_for_status()
+    return peak
+
+
+async def _run_memory(image_bytes: int, seed: int) -> Dict[str, object]:
+    from .. import main
+
+    def upstream(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"answer": STRUCTURED_ANSWER}, request=request)
+
+    image = _fake_png(image_bytes, seed)
+    # Prepared up front so only the server side of each request is traced.
+    json_body = json.dumps(
+        {"question": "Customer issue: invoice screen shows an error (json)", "image_base64": base64.b64encode(image).decode("ascii")}
+    ).encode("utf-8")
+    upload_body = _multipart_body("Customer issue: invoice screen shows an error (upload)", image)
+
+    previous_client = main.UPSTREAM_CLIENT
+    main.UPSTREAM_CLIENT = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+    transport = httpx.ASGITransport(app=main.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            json_peak = await _peak_bytes(client, "/ask", json_body, "application/json")
+            upload_peak = await _peak_bytes(
+                client, "/ask/upload", upload_body, f"multipart/form-data; boundary={UPLOAD_BOUNDARY}"
+            )
+    finally:
+        await main.UPSTREAM_CLIENT.aclose()
+        main.UPSTREAM_CLIENT = previous_client
+
+    return {
+        "image_bytes": image_bytes,
+        "ask_json": {"peak_bytes": json_peak, "peak_per_image_byte": round(json_peak / image_bytes, 2)},
+        "ask_upload": {"peak_bytes": upload_peak, "peak_per_image_byte": round(upload_peak / image_bytes, 2)},
+    }
+
+
+def run_memory(image_bytes: int, seed: int = 1234) -> Dict[str, object]:
+    return asyncio.run(_run_memory(image_bytes, seed))
@@ -0,0 +1,74 @@
+"""Micro-benchmarks for the CPU-bound helpers on the /ask path."""
+from __future__ import annotations
+
+import statistics
+import time
+from typing import Callable, Dict, List, Sequence
+
+from ..manual_index import query_terms
+from ..manual_vectors import PassageVectors, numpy_available
+from .corpus import COMPLETE_ANSWER, PARTIAL_ANSWER, query_corpus
+
+
+def _time_calls(function: Callable[[str], object], inputs: Sequence[str], repeat: int) -> Dict[str, float]:
+    samples: List[float] = []
+    for _ in range(repeat):
+        for value in inputs:
+            started = time.perf_counter()
+            function(value)
+            samples.append(time.perf_counter() - started)
+    samples.sort()
+    return {
+        "calls": len(samples),
+        "mean_us": round(statistics.fmean(samples) * 1e6, 3),
+        "p50_us": round(percentile(samples, 0.50) * 1e6, 3),
+        "p95_us": round(percentile(samples, 0.95) * 1e6, 3),
+        "p99_us": round(percentile(samples, 0.99) * 1e6, 3),
+        "max_us": round(samples[-1] * 1e6, 3),
+    }
+
+
+def percentile(ordered: Sequence[float], fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def _without_memo(main, function: Callable[[str], object], query: str) -> object:
+    """Call ``function`` with the manual search memo bypassed, to time the search itself."""
+
+    memo, main.MANUAL_SEARCH_MEMO = main.MANUAL_SEARCH_MEMO, None
+    try:
+        return function(query)
+    finally:
+        main.MANUAL_SEARCH_MEMO = memo
+
+
+def run_micro(repeat: int = 20) -> Dict[str, Dict[str, float]]:
+    from .. import main
+
+    queries = query_corpus()
+    answers = [COMPLETE_ANSWER, PARTIAL_ANSWER, ""]
+    contexts = {query: main.search_manual_context(query) for query in queries}
+    results = {
+        "search_manual_snippet": _time_calls(main.search_manual_snippet, queries, repeat),
+        "search_manual_context": _time_calls(main.search_manual_context, queries, repeat),
+        "search_manual_context_cold": _time_calls(
+            lambda query: _without_memo(main, main.search_manual_context, query), queries, repeat
+        ),
+        "classify_issue": _time_calls(main.classify_issue, queries, repeat),
+        "parse_sections": _time_calls(
+            lambda answer: main.parse_sections(answer, main.REQUIRED_SECTION_HEADERS), answers, repeat * 10
+        ),
+        "normalize_response": _time_calls(
+            lambda query: main.normalize_response(query, COMPLETE_ANSWER if len(query) % 2 else PARTIAL_ANSWER, contexts[query]),
+            queries,
+            repeat,
+        ),
+    }
+    if numpy_available() and len(main.MANUAL_INDEX):
+        # Timed whatever MANUAL_RANKING is, so vector query latency is tracked across runs.
+        vectors = main.MANUAL_INDEX.vectors or PassageVectors.build(main.MANUAL_INDEX)
+        results["vector_search"] = _time_calls(lambda query: vectors.search(query_terms(query), 1), queries, repeat)
+    return results
@@ -0,0 +1,129 @@
+"""Run the proxy benchmarks and write machine-readable results.
+
+Usage (from the repository root)::
+
+    python -m proxy_backend.benchmarks.run --output bench.json
+    python -m proxy_backend.benchmarks.run --compare bench.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Dict, Optional
+
+# Keep the per-request log lines out of the measurements; must happen before main is imported.
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from .fake_upstream import FakeUpstreamConfig  # noqa: E402
+from .load import run_load  # noqa: E402
+from .memory import run_memory  # noqa: E402
+from .micro import run_micro  # noqa: E402
+
+# Lower is better for every tracked number except throughput.
+HIGHER_IS_BETTER = {"throughput_rps"}
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(__file__),
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous: Dict[str, object], current: Dict[str, object], threshold: float) -> Dict[str, Dict[str, float]]:
+    """Return tracked numbers that moved in the wrong direction by more than ``threshold``."""
+
+    regressions: Dict[str, Dict[str, float]] = {}
+
+    def walk(before: object, after: object, path: str) -> None:
+        if isinstance(before, dict) and isinstance(after, dict):
+            for key in before.keys() & after.keys():
+                walk(before[key], after[key], f"{path}.{key}" if path else key)
+            return
+        if not isinstance(before, (int, float)) or not isinstance(after, (int, float)) or not before:
+            return
+        metric = path.rsplit(".", 1)[-1]
+        if not metric.endswith(("_us", "_ms", "_s", "_rps", "_bytes")):
+            return
+        change = (after - before) / before
+        if metric in HIGHER_IS_BETTER:
+            change = -change
+        if change > threshold:
+            regressions[path] = {"before": before, "after": after, "change": round(change, 4)}
+
+    walk(previous.get("micro", {}), current.get("micro", {}), "micro")
+    walk(previous.get("load", {}), current.get("load", {}), "load")
+    walk(previous.get("memory", {}), current.get("memory", {}), "memory")
+    return regressions
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="Write results JSON to this path (default: stdout).")
+    parser.add_argument("--compare", help="Previous results JSON; exit non-zero on regressions.")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative slowdown (default 0.10).")
+    parser.add_argument("--repeat", type=int, default=20, help="Micro-benchmark passes over the query corpus.")
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--skip-memory", action="store_true")
+    parser.add_argument("--image-bytes", type=int, default=5 * 1024 * 1024, help="Screenshot size for the memory run.")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05, help="Median fake upstream latency in seconds.")
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-after", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args(argv)
+
+    results: Dict[str, object] = {
+        "revision": _git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+    if not args.skip_micro:
+        results["micro"] = run_micro(args.repeat)
+    if not args.skip_load:
+        config = FakeUpstreamConfig(
+            median_latency=args.latency,
+            latency_sigma=args.latency_sigma,
+            error_rate=args.error_rate,
+            timeout_rate=args.timeout_rate,
+            timeout_after=args.timeout_after,
+            seed=args.seed,
+        )
+        results["load"] = run_load(args.requests, args.concurrency, config)
+        results["load"]["fake_upstream"] = vars(config)
+    if not args.skip_memory:
+        results["memory"] = run_memory(args.image_bytes, args.seed)
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as previous_file:
+            regressions = compare(json.load(previous_file), results, args.threshold)
+        results["regressions"] = regressions
+        exit_code = 1 if regressions else 0
+
+    rendered = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            output_file.write(rendered + "\n")
+    else:
+        print(rendered)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""Run CPU-bound request stages off the event loop.
+
+Manual search and response normalization are synchronous. Inside an async
+handler they stall every concurrent upstream await, so sufficiently large
+inputs are dispatched to a bounded thread or process pool instead.
+"""
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import functools
+import importlib
+import os
+from typing import Any, Callable, Optional, TypeVar
+
+from .metrics import Histogram
+
+T = TypeVar("T")
+
+# "inline" runs on the loop thread, "thread" uses a thread pool, "process" a process pool.
+CPU_EXECUTOR_KIND = os.getenv("CPU_EXECUTOR", "thread").strip().lower()
+CPU_POOL_SIZE = int(os.getenv("CPU_POOL_SIZE", str(min(4, os.cpu_count() or 1))))
+# Inputs shorter than this many characters are cheap enough to run inline.
+CPU_OFFLOAD_MIN_CHARS = int(os.getenv("CPU_OFFLOAD_MIN_CHARS", "0"))
+EVENT_LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("EVENT_LOOP_LAG_INTERVAL_SECONDS", "0.5"))
+
+
+def _warm_worker(module_name: str) -> None:
+    """Process-pool initializer: importing the app module loads the manual once per worker."""
+
+    importlib.import_module(module_name)
+
+
+class CpuExecutor:
+    def __init__(self, kind: str, workers: int, min_chars: int) -> None:
+        self.kind = kind if kind in {"inline", "thread", "process"} else "thread"
+        self.workers = max(1, workers)
+        self.min_chars = min_chars
+        self._executor: Optional[concurrent.futures.Executor] = None
+        self.offloaded = 0
+        self.inline = 0
+
+    def start(self, module_name: str) -> None:
+        if self._executor is not None or self.kind == "inline":
+            return
+        self._executor = self._create(module_name)
+
+    def _create(self, module_name: str) -> concurrent.futures.Executor:
+        if self.kind == "process":
+            return concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_warm_worker,
+                initargs=(module_name,),
+            )
+        return concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix="proxy-cpu",
+        )
+
+    def shutdown(self) -> None:
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def restart(self, module_name: str) -> None:
+        """Replace a process pool so its workers pick up freshly loaded module state.
+
+        Thread pools share the parent's globals and need no restart. New calls
+        go to the new pool at once; work already queued on the old one is
+        left to finish against the previous snapshot instead of being cancelled.
+        """
+
+        if self.kind != "process" or self._executor is None:
+            return
+        previous, self._executor = self._executor, self._create(module_name)
+        previous.shutdown(wait=False, cancel_futures=False)
+
+    async def run(self, size: int, function: Callable[..., T], *args: Any) -> T:
+        """Call ``function(*args)``, offloading it when ``size`` reaches the threshold.
+
+        Outside the app lifespan (no pool started) calls always run inline.
+        """
+
+        executor = self._executor
+        if executor is None or size < self.min_chars:
+            self.inline += 1
+            return function(*args)
+        self.offloaded += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(function, *args))
+
+
+async def monitor_event_loop_lag(histogram: Histogram, interval: float = EVENT_LOOP_LAG_INTERVAL_SECONDS) -> None:
+    """Record how late the loop wakes up from a fixed sleep; blocking work shows up as lag."""
+
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        histogram.observe(max(0.0, loop.time() - expected))
+
+
+def lag_monitor_task(histogram: Histogram) -> Optional["asyncio.Task[None]"]:
+    if EVENT_LOOP_LAG_INTERVAL_SECONDS <= 0:
+        return None
+    return asyncio.ensure_future(monitor_event_loop_lag(histogram))
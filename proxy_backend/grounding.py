@@ -0,0 +1,125 @@
+"""Choosing which manual excerpts go into the upstream prompt.
+
+Search returns the best passage of several tutorials. Passages that mostly
+repeat one already chosen are dropped, since the manual reuses boilerplate
+across tutorials. The best excerpt always goes in first, cut down to the
+budget when it is longer; the room it leaves is filled from the rest with a
+0/1 knapsack, so a GST passage and an invoicing passage can both make it in
+instead of one long excerpt crowding the other out.
+"""
+from __future__ import annotations
+
+import math
+import os
+from typing import Callable, List, Sequence, Set, TypeVar
+
+T = TypeVar("T")
+
+# Longest single excerpt cut from one tutorial.
+MANUAL_MAX_SNIPPET_CHARS = 1800
+# Tutorials considered per query; 1 restores single-excerpt grounding.
+MANUAL_CONTEXT_TOP_K = int(os.getenv("MANUAL_CONTEXT_TOP_K", "3"))
+# Defaults to one excerpt's worth, so grounding costs no more tokens than a single excerpt did:
+# the best excerpt takes what it needs and shorter ones from other tutorials share the rest.
+# Raise it to send more context.
+MANUAL_CONTEXT_BUDGET_CHARS = int(os.getenv("MANUAL_CONTEXT_BUDGET_CHARS", str(MANUAL_MAX_SNIPPET_CHARS)))
+# When set, the budget is counted in estimated tokens instead of characters.
+MANUAL_CONTEXT_BUDGET_TOKENS = int(os.getenv("MANUAL_CONTEXT_BUDGET_TOKENS", "0"))
+# Excerpts scoring below this fraction of the best one are not worth the prompt space.
+MANUAL_CONTEXT_MIN_RELATIVE_SCORE = float(os.getenv("MANUAL_CONTEXT_MIN_RELATIVE_SCORE", "0.5"))
+# Share of an excerpt's terms already covered by a chosen excerpt above which it is a near-duplicate.
+MANUAL_CONTEXT_MAX_OVERLAP = float(os.getenv("MANUAL_CONTEXT_MAX_OVERLAP", "0.6"))
+CHARS_PER_TOKEN = 4
+# Knapsack capacity resolution; costs are rounded up to this many budget units.
+PACK_GRANULARITY = 25
+ELLIPSIS = "..."
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for budgeting; English prose averages about four characters per token."""
+
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def budget_cost(text: str) -> int:
+    """Cost of ``text`` in the configured budget unit."""
+
+    return estimate_tokens(text) if MANUAL_CONTEXT_BUDGET_TOKENS > 0 else len(text)
+
+
+def context_budget() -> int:
+    return MANUAL_CONTEXT_BUDGET_TOKENS if MANUAL_CONTEXT_BUDGET_TOKENS > 0 else MANUAL_CONTEXT_BUDGET_CHARS
+
+
+def trim_to_budget(text: str, budget: int, reserved: str = "") -> str:
+    """``text`` cut at a word boundary and marked with ``...`` so that ``reserved + text`` fits ``budget``.
+
+    ``reserved`` is whatever goes out alongside the text, such as its header.
+    A budget too small for even that leaves the text whole.
+    """
+
+    if budget_cost(reserved + text) <= budget:
+        return text
+    room = budget * CHARS_PER_TOKEN if MANUAL_CONTEXT_BUDGET_TOKENS > 0 else budget
+    room -= len(reserved) + len(ELLIPSIS)
+    if room <= 0:
+        return text
+    cut = text[:room]
+    space = cut.rfind(" ")
+    if space > room // 2:
+        cut = cut[:space]
+    return cut.rstrip(" .") + ELLIPSIS
+
+
+def overlap(terms: Set[str], other: Set[str]) -> float:
+    """Share of ``terms`` that also occur in ``other``."""
+
+    if not terms:
+        return 1.0
+    return len(terms & other) / len(terms)
+
+
+def drop_overlapping(
+    candidates: Sequence[T], terms_of: Callable[[T], Set[str]], max_overlap: float = MANUAL_CONTEXT_MAX_OVERLAP
+) -> List[T]:
+    """Keep candidates in order, skipping any that mostly repeat one already kept."""
+
+    kept: List[T] = []
+    kept_terms: List[Set[str]] = []
+    for candidate in candidates:
+        terms = terms_of(candidate)
+        if any(overlap(terms, other) > max_overlap for other in kept_terms):
+            continue
+        kept.append(candidate)
+        kept_terms.append(terms)
+    return kept
+
+
+def pack(candidates: Sequence[T], costs: Sequence[int], values: Sequence[float], budget: int) -> List[T]:
+    """Most valuable subset of ``candidates`` whose total cost fits ``budget``, in input order.
+
+    A 0/1 knapsack over costs rounded up to ``PACK_GRANULARITY``; with a
+    handful of candidates and a budget of a few thousand units the table
+    stays tiny.
+    """
+
+    capacity = budget // PACK_GRANULARITY
+    weights = [math.ceil(cost / PACK_GRANULARITY) for cost in costs]
+    best = [0.0] * (capacity + 1)
+    chosen: List[List[bool]] = []
+    for weight, value in zip(weights, values):
+        taken = [False] * (capacity + 1)
+        for room in range(capacity, weight - 1, -1):
+            with_item = best[room - weight] + value
+            if with_item > best[room]:
+                best[room] = with_item
+                taken[room] = True
+        chosen.append(taken)
+
+    selected: List[int] = []
+    room = capacity
+    for index in range(len(candidates) - 1, -1, -1):
+        if chosen[index][room]:
+            selected.append(index)
+            room -= weights[index]
+    return [candidates[index] for index in sorted(selected)]
@@ -0,0 +1,172 @@
+"""Screenshot preprocessing and a content-addressed store of the results.
+
+Before an image goes upstream it is downscaled to ``IMAGE_MAX_DIMENSION``
+pixels on its longer side and recompressed as JPEG at ``IMAGE_JPEG_QUALITY``.
+This needs the optional Pillow package. Without it there is nothing to gain
+from decoding the image, so it is forwarded unchanged as before and the
+store below stays off.
+
+Results are keyed by the SHA-256 of the original image bytes. The same
+screenshot attached to several tickets is processed and base64-encoded once,
+and the digest doubles as the image part of the response cache key. A
+perceptual hash is deliberately not used: two error dialogs that differ only
+in their message text would collide.
+"""
+from __future__ import annotations
+
+import base64
+import importlib.util
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from .image_upload import UploadedImage
+
+logger = logging.getLogger(__name__)
+
+IMAGE_PREPROCESS_ENABLED = os.getenv("IMAGE_PREPROCESS_ENABLED", "true").strip().lower() in {"1", "true", "yes", "on"}
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "1600"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "80"))
+# Images within IMAGE_MAX_DIMENSION and under this size are forwarded as they are.
+IMAGE_RECOMPRESS_MIN_BYTES = int(os.getenv("IMAGE_RECOMPRESS_MIN_BYTES", str(256 * 1024)))
+IMAGE_STORE_MAX_BYTES = int(os.getenv("IMAGE_STORE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+class ProcessedImage(NamedTuple):
+    """An image ready for the upstream.
+
+    ``digest`` is the SHA-256 of the original upload and ``data_base64`` the
+    base64 of the bytes actually sent.
+    """
+
+    digest: str
+    media_type: str
+    data_base64: bytes
+    original_bytes: int
+    processed_bytes: int
+    width: Optional[int] = None
+    height: Optional[int] = None
+
+
+def pillow_available() -> bool:
+    """Downscaling needs the optional ``Pillow`` package."""
+
+    return importlib.util.find_spec("PIL") is not None
+
+
+_PILLOW = pillow_available()
+
+
+def preprocess_image(image: UploadedImage) -> ProcessedImage:
+    """Downscale and recompress ``image`` when that makes it smaller; otherwise keep its bytes.
+
+    Pure function of the image so it can run in the CPU worker pool.
+    """
+
+    data: bytes = image.data
+    media_type = image.media_type
+    width = height = None
+    if _PILLOW:
+        shrunk = _downscale(image)
+        if shrunk is not None:
+            data, media_type, (width, height) = shrunk
+    return ProcessedImage(
+        image.sha256, media_type, base64.b64encode(data), len(image.data), len(data), width, height
+    )
+
+
+def _downscale(image: UploadedImage) -> Optional[Tuple[bytes, str, Tuple[int, int]]]:
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(image.data)) as opened:
+            size = opened.size
+            if max(size) <= IMAGE_MAX_DIMENSION and len(image.data) < IMAGE_RECOMPRESS_MIN_BYTES:
+                return None
+            # JPEG sources can be decoded at reduced scale, which is much cheaper than a full decode.
+            opened.draft("RGB", (IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION))
+            picture = opened.convert("RGBA") if opened.mode in ("P", "LA", "PA") else opened.copy()
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        logger.warning("image could not be decoded; forwarding it unchanged", extra={"fields": {"error": str(exc)}})
+        return None
+    picture.thumbnail((IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION), Image.LANCZOS)
+    if picture.mode == "RGBA":
+        # JPEG has no alpha; flatten onto white like the screenshot would appear.
+        background = Image.new("RGB", picture.size, (255, 255, 255))
+        background.paste(picture, mask=picture.getchannel("A"))
+        picture = background
+    elif picture.mode not in ("RGB", "L"):
+        picture = picture.convert("RGB")
+    output = io.BytesIO()
+    picture.save(output, "JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True)
+    if output.tell() >= len(image.data):
+        return None
+    return output.getvalue(), "image/jpeg", picture.size
+
+
+class ImageStore:
+    """LRU of processed images keyed by content digest, bounded by total base64 size."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, ProcessedImage]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    def get(self, digest: str) -> Optional[ProcessedImage]:
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return entry
+
+    def put(self, image: ProcessedImage) -> None:
+        size = len(image.data_base64)
+        with self._lock:
+            self.bytes_saved += max(0, image.original_bytes - image.processed_bytes)
+            if size > self.max_bytes:
+                return
+            previous = self._entries.pop(image.digest, None)
+            if previous is not None:
+                self._bytes -= len(previous.data_base64)
+            self._entries[image.digest] = image
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.data_base64)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "bytes_saved": self.bytes_saved,
+            }
+
+
+def create_image_store() -> Optional[ImageStore]:
+    """``None`` when IMAGE_PREPROCESS_ENABLED is off or Pillow is missing; images then go upstream untouched.
+
+    Without Pillow the store would only decode each screenshot and keep a
+    second copy of the same base64, for no size benefit.
+    """
+
+    if not IMAGE_PREPROCESS_ENABLED:
+        return None
+    if not _PILLOW:
+        logger.warning("Pillow is not installed; screenshots are forwarded without downscaling")
+        return None
+    return ImageStore(IMAGE_STORE_MAX_BYTES)
@@ -0,0 +1,382 @@
+"""Streaming, size-bounded parsing of screenshot uploads.
+
+``/ask/upload`` takes a ``multipart/form-data`` body. It is parsed as it
+arrives, so the whole request is never held as one string. Form fields:
+
+* ``request``: optional JSON object with any :class:`AskRequest` fields.
+* ``question``, ``persona_prompt``, ``ticket_id``, ``auto_coach``: plain
+  fields that override ``request``.
+* ``image``: the screenshot as raw bytes (a file part).
+* ``image_base64``: the screenshot as base64 text, decoded chunk by chunk.
+  Use this instead of ``image``.
+
+The image type is checked from its first bytes. The size is checked on
+every chunk, so an oversized or non-image upload is rejected before the
+rest of the body is read.
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+import hashlib
+import os
+import re
+from typing import AsyncIterable, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(5 * 1024 * 1024)))
+IMAGE_ALLOWED_TYPES: FrozenSet[str] = frozenset(
+    item.strip().lower()
+    for item in os.getenv("IMAGE_ALLOWED_TYPES", "image/png,image/jpeg,image/webp,image/gif").split(",")
+    if item.strip()
+)
+# Budget for everything in the form except the image: question, persona prompt, context JSON.
+UPLOAD_FIELDS_MAX_BYTES = int(os.getenv("UPLOAD_FIELDS_MAX_BYTES", str(256 * 1024)))
+MULTIPART_MAX_HEADER_BYTES = 16 * 1024
+# Multipart framing (boundaries, part headers) allowed on top of the image and field budgets.
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+IMAGE_FIELDS = ("image", "image_base64")
+
+_SIGNATURES: Tuple[Tuple[bytes, str], ...] = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+SNIFF_BYTES = 12
+_BASE64_WHITESPACE = b" \t\r\n"
+_OPTION_PATTERN = re.compile(r';\s*([^\s=;]+)\s*=\s*("(?:[^"\\]|\\.)*"|[^;]*)')
+
+
+class UploadError(ValueError):
+    """A malformed upload; ``status_code`` is the HTTP status to answer with."""
+
+    status_code = 400
+
+
+class ImageTooLarge(UploadError):
+    status_code = 413
+
+
+class UnsupportedImage(UploadError):
+    status_code = 415
+
+
+class UploadedImage(NamedTuple):
+    """A validated screenshot. ``data`` is the decoded image; ``sha256`` is its hex digest."""
+
+    data: bytearray
+    media_type: str
+    sha256: str
+
+
+class ImageUpload(NamedTuple):
+    fields: Dict[str, str]
+    image: Optional[UploadedImage]
+
+
+def base64_length(raw_bytes: int) -> int:
+    """Characters needed to base64-encode ``raw_bytes`` bytes, padding included."""
+
+    return (raw_bytes + 2) // 3 * 4
+
+
+def max_upload_bytes(max_image_bytes: int = IMAGE_MAX_BYTES) -> int:
+    """Largest request body ``/ask/upload`` reads, with the image sent as base64."""
+
+    return base64_length(max_image_bytes) + UPLOAD_FIELDS_MAX_BYTES + MULTIPART_OVERHEAD_BYTES
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Media type from the leading magic bytes, or ``None`` for anything that is not a known image."""
+
+    for signature, media_type in _SIGNATURES:
+        if head.startswith(signature):
+            return media_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def parse_header_options(value: str) -> Tuple[str, Dict[str, str]]:
+    """Split ``form-data; name="image"; filename="a.png"`` into the main value and its options."""
+
+    main, _, rest = value.partition(";")
+    options: Dict[str, str] = {}
+    for match in _OPTION_PATTERN.finditer(";" + rest):
+        option = match.group(2).strip()
+        if len(option) >= 2 and option[0] == option[-1] == '"':
+            option = re.sub(r"\\(.)", r"\1", option[1:-1])
+        options[match.group(1).lower()] = option
+    return main.strip().lower(), options
+
+
+class ImageSink:
+    """Collects decoded image bytes, checking the type on the first bytes and the size on every chunk."""
+
+    def __init__(self, max_bytes: int = IMAGE_MAX_BYTES, allowed_types: FrozenSet[str] = IMAGE_ALLOWED_TYPES) -> None:
+        self.max_bytes = max_bytes
+        self.allowed_types = allowed_types
+        self.media_type: Optional[str] = None
+        self._data = bytearray()
+        self._digest = hashlib.sha256()
+
+    def write(self, data: bytes) -> None:
+        if len(self._data) + len(data) > self.max_bytes:
+            raise ImageTooLarge(f"image exceeds the {self.max_bytes} byte limit")
+        self._data += data
+        self._digest.update(data)
+        if self.media_type is None and len(self._data) >= SNIFF_BYTES:
+            self._check_type()
+
+    def finish(self) -> UploadedImage:
+        if not self._data:
+            raise UploadError("image is empty")
+        if self.media_type is None:
+            self._check_type()
+        return UploadedImage(self._data, self.media_type or "", self._digest.hexdigest())
+
+    def _check_type(self) -> None:
+        media_type = sniff_image_type(bytes(self._data[:SNIFF_BYTES]))
+        if media_type is None or media_type not in self.allowed_types:
+            raise UnsupportedImage(
+                f"image must be one of {', '.join(sorted(self.allowed_types))}; got {media_type or 'unknown data'}"
+            )
+        self.media_type = media_type
+
+
+class Base64Decoder:
+    """Decodes base64 text fed in arbitrary chunks.
+
+    Whitespace is skipped and a ``data:image/...;base64,`` prefix is
+    tolerated. Incomplete 4-character groups are carried over to the next
+    chunk, so chunk boundaries can fall anywhere.
+    """
+
+    def __init__(self) -> None:
+        self._pending = b""
+        self._prefix_checked = False
+        self._finished = False
+
+    def feed(self, data: bytes) -> bytes:
+        data = self._pending + data.translate(None, _BASE64_WHITESPACE)
+        if not self._prefix_checked:
+            if len(data) < 5 and b"data:".startswith(data):
+                self._pending = data
+                return b""
+            if data.startswith(b"data:"):
+                comma = data.find(b",")
+                if comma < 0:
+                    if len(data) > 256:
+                        raise UploadError("image_base64 has a malformed data URL prefix")
+                    self._pending = data
+                    return b""
+                data = data[comma + 1 :]
+            self._prefix_checked = True
+        usable = len(data) - len(data) % 4
+        self._pending = data[usable:]
+        return self._decode(data[:usable])
+
+    def close(self) -> None:
+        if self._pending:
+            raise UploadError("image_base64 is truncated")
+
+    def _decode(self, data: bytes) -> bytes:
+        if not data:
+            return b""
+        if self._finished:
+            raise UploadError("image_base64 has data after its padding")
+        self._finished = data.endswith(b"=")
+        try:
+            return base64.b64decode(data, validate=True)
+        except binascii.Error as exc:
+            raise UploadError(f"image_base64 is not valid base64: {exc}") from None
+
+
+def decode_image_base64(text: str, max_bytes: int = IMAGE_MAX_BYTES) -> UploadedImage:
+    """Decode and validate an ``image_base64`` JSON field the same way an uploaded ``image_base64`` part is."""
+
+    try:
+        encoded = text.encode("ascii")
+    except UnicodeEncodeError:
+        raise UploadError("image_base64 is not valid base64") from None
+    decoder = Base64Decoder()
+    sink = ImageSink(max_bytes)
+    sink.write(decoder.feed(encoded))
+    decoder.close()
+    return sink.finish()
+
+
+class MultipartParser:
+    """Push parser for ``multipart/form-data`` bodies.
+
+    :meth:`feed` takes body chunks as they arrive and calls back into the
+    collector: ``part_begin(headers)``, ``part_data(bytes)`` zero or more
+    times, then ``part_end()``. Only a boundary-sized tail is buffered
+    between chunks.
+    """
+
+    _PREAMBLE, _HEADERS, _BODY, _DONE = range(4)
+
+    def __init__(self, boundary: bytes, collector: "_FormCollector") -> None:
+        self._delimiter = b"--" + boundary
+        self._separator = b"\r\n" + self._delimiter
+        self._collector = collector
+        self._buffer = bytearray()
+        self._state = self._PREAMBLE
+
+    def feed(self, data: bytes) -> None:
+        if self._state == self._DONE:
+            return
+        self._buffer += data
+        while self._step():
+            pass
+
+    def close(self) -> None:
+        if self._state != self._DONE:
+            raise UploadError("multipart body ended before its closing boundary")
+
+    def _step(self) -> bool:
+        """Advance through the buffer; ``False`` when more input is needed."""
+
+        buffer = self._buffer
+        if self._state == self._PREAMBLE:
+            index = buffer.find(self._delimiter)
+            if index < 0:
+                del buffer[: max(0, len(buffer) - len(self._delimiter) + 1)]
+                return False
+            return self._after_boundary(index + len(self._delimiter))
+        if self._state == self._HEADERS:
+            index = buffer.find(b"\r\n\r\n")
+            if index < 0:
+                if len(buffer) > MULTIPART_MAX_HEADER_BYTES:
+                    raise UploadError("multipart part headers are too large")
+                return False
+            headers = self._parse_headers(bytes(buffer[:index]))
+            del buffer[: index + 4]
+            self._collector.part_begin(headers)
+            self._state = self._BODY
+            return True
+        if self._state == self._BODY:
+            index = buffer.find(self._separator)
+            if index < 0:
+                # Hold back a possible partial separator; everything before it is part data.
+                keep = len(self._separator) - 1
+                if len(buffer) > keep:
+                    self._collector.part_data(bytes(buffer[:-keep]))
+                    del buffer[:-keep]
+                return False
+            if index:
+                self._collector.part_data(bytes(buffer[:index]))
+                del buffer[:index]
+            if len(buffer) < len(self._separator) + 2:
+                return False
+            self._collector.part_end()
+            return self._after_boundary(len(self._separator))
+        buffer.clear()
+        return False
+
+    def _after_boundary(self, end: int) -> bool:
+        buffer = self._buffer
+        if len(buffer) < end + 2:
+            return False
+        marker = bytes(buffer[end : end + 2])
+        del buffer[: end + 2]
+        if marker == b"--":
+            self._state = self._DONE
+            buffer.clear()
+            return False
+        if marker != b"\r\n":
+            raise UploadError("malformed multipart boundary")
+        self._state = self._HEADERS
+        return True
+
+    @staticmethod
+    def _parse_headers(block: bytes) -> Dict[str, str]:
+        headers: Dict[str, str] = {}
+        for line in block.decode("utf-8", "replace").split("\r\n"):
+            name, separator, value = line.partition(":")
+            if not separator:
+                raise UploadError("malformed multipart part header")
+            headers[name.strip().lower()] = value.strip()
+        return headers
+
+
+class _FormCollector:
+    """Routes multipart parts: image parts into an :class:`ImageSink`, the rest into bounded text fields."""
+
+    def __init__(self, max_image_bytes: int) -> None:
+        self.fields: Dict[str, str] = {}
+        self.image: Optional[UploadedImage] = None
+        self._max_image_bytes = max_image_bytes
+        self._field_bytes = 0
+        self._name = ""
+        self._text: List[bytes] = []
+        self._sink: Optional[ImageSink] = None
+        self._decoder: Optional[Base64Decoder] = None
+
+    def part_begin(self, headers: Dict[str, str]) -> None:
+        disposition, options = parse_header_options(headers.get("content-disposition", ""))
+        if disposition != "form-data" or not options.get("name"):
+            raise UploadError("every multipart part needs a form-data name")
+        self._name = options["name"]
+        if self._name in IMAGE_FIELDS:
+            if self.image is not None or self._sink is not None:
+                raise UploadError("only one image may be uploaded")
+            self._sink = ImageSink(self._max_image_bytes)
+            self._decoder = Base64Decoder() if self._name == "image_base64" else None
+
+    def part_data(self, data: bytes) -> None:
+        if self._sink is not None:
+            self._sink.write(self._decoder.feed(data) if self._decoder else data)
+            return
+        self._field_bytes += len(data)
+        if self._field_bytes > UPLOAD_FIELDS_MAX_BYTES:
+            raise ImageTooLarge(f"form fields exceed the {UPLOAD_FIELDS_MAX_BYTES} byte limit")
+        self._text.append(data)
+
+    def part_end(self) -> None:
+        if self._sink is not None:
+            if self._decoder is not None:
+                self._decoder.close()
+            self.image = self._sink.finish()
+            self._sink = self._decoder = None
+            return
+        try:
+            self.fields[self._name] = b"".join(self._text).decode("utf-8")
+        except UnicodeDecodeError:
+            raise UploadError(f"form field {self._name!r} is not UTF-8 text") from None
+        self._text = []
+
+
+async def read_image_upload(
+    content_type: str,
+    chunks: AsyncIterable[bytes],
+    content_length: Optional[int] = None,
+    max_image_bytes: int = IMAGE_MAX_BYTES,
+) -> ImageUpload:
+    """Parse a streamed ``multipart/form-data`` body into text fields and at most one image.
+
+    A declared ``content_length`` over the limit is rejected before anything
+    is read; bodies without one are cut off as soon as they cross it.
+    """
+
+    media_type, options = parse_header_options(content_type)
+    if media_type != "multipart/form-data":
+        raise UploadError("expected a multipart/form-data body")
+    boundary = options.get("boundary", "")
+    if not boundary or len(boundary) > 200:
+        raise UploadError("multipart/form-data body needs a boundary")
+    limit = max_upload_bytes(max_image_bytes)
+    if content_length is not None and content_length > limit:
+        raise ImageTooLarge(f"request body exceeds the {limit} byte limit")
+
+    collector = _FormCollector(max_image_bytes)
+    parser = MultipartParser(boundary.encode("latin-1"), collector)
+    received = 0
+    async for chunk in chunks:
+        received += len(chunk)
+        if received > limit:
+            raise ImageTooLarge(f"request body exceeds the {limit} byte limit")
+        parser.feed(chunk)
+    parser.close()
+    return ImageUpload(collector.fields, collector.image)
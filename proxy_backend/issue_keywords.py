@@ -0,0 +1,173 @@
+"""Single-pass multi-keyword matching for issue classification.
+
+All keywords of every category are compiled into one Aho-Corasick automaton,
+so an issue text is scanned once no matter how many keywords are configured.
+A hit only counts when it sits on word boundaries ("500" does not match
+"1500", "tax" does not match "taxonomy"); a hyphen separates words, so
+"e-invoice" and "sub-ledger" match "invoice" and "ledger". Common English inflections are
+tolerated: "invoices", "crashed", "reconciled" and "installing" match their
+keywords, and a keyword ending in a silent "e" also matches its "-ing" form
+("invoicing" for "invoice").
+"""
+from __future__ import annotations
+
+import json
+from collections import deque
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Sequence, Tuple
+
+INFLECTION_SUFFIXES = ("ing", "es", "ed", "s")
+# Only after a keyword that already ends in "e": "reconcile" + "d".
+E_SUFFIXES = ("d",)
+
+
+class KeywordMatch(NamedTuple):
+    keyword: str
+    category: str
+    start: int
+    end: int
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum()
+
+
+def _is_boundary(text: str, position: int) -> bool:
+    """True when ``text[position]`` is outside the text or not a word character."""
+
+    return position < 0 or position >= len(text) or not _is_word_char(text[position])
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton over lowercase keywords, each tagged with categories.
+
+    A keyword listed under several categories reports one match per category.
+    """
+
+    def __init__(self, keyword_sets: Mapping[str, Iterable[str]]) -> None:
+        self.categories = list(keyword_sets)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Terminal outputs per state: (keyword, matched length, categories) for every pattern ending there.
+        self._outputs: List[List[Tuple[str, int, Tuple[str, ...]]]] = [[]]
+        tagged: Dict[str, List[str]] = {}
+        for category, keywords in keyword_sets.items():
+            for keyword in keywords:
+                folded = " ".join(keyword.lower().split())
+                if folded and category not in tagged.setdefault(folded, []):
+                    tagged[folded].append(category)
+        for keyword, categories in tagged.items():
+            self._add(keyword, keyword, tuple(categories))
+            gerund = _drop_e_gerund(keyword)
+            if gerund and gerund not in tagged:
+                self._add(gerund, keyword, tuple(categories))
+        self._link()
+        self._delta = self._transitions()
+        self.size = len(tagged)
+
+    def _add(self, pattern: str, keyword: str, categories: Tuple[str, ...]) -> None:
+        state = 0
+        for char in pattern:
+            following = self._goto[state].get(char)
+            if following is None:
+                following = len(self._goto)
+                self._goto[state][char] = following
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            state = following
+        self._outputs[state].append((keyword, len(pattern), categories))
+
+    def _link(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, following in self._goto[state].items():
+                queue.append(following)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[following] = target if target != following else 0
+                # Suffix outputs are merged up front so the scan never walks fail links for output.
+                self._outputs[following] = self._outputs[following] + self._outputs[self._fail[following]]
+
+    def _transitions(self) -> List[Dict[str, int]]:
+        """Resolve fail links into a full transition table so the scan takes one step per character."""
+
+        delta: List[Dict[str, int]] = [dict(self._goto[0])]
+        delta.extend({} for _ in range(len(self._goto) - 1))
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            # Breadth-first order guarantees the fail state's row is already complete.
+            row = dict(delta[self._fail[state]])
+            row.update(self._goto[state])
+            delta[state] = row
+            queue.extend(self._goto[state].values())
+        return delta
+
+    def find(self, text: str) -> List[KeywordMatch]:
+        """Every keyword occurrence in ``text`` that lies on word boundaries, in text order."""
+
+        lowered = text.lower()
+        matches: List[KeywordMatch] = []
+        delta, outputs = self._delta, self._outputs
+        state = 0
+        for index, char in enumerate(lowered):
+            state = delta[state].get(char, 0)
+            if not outputs[state]:
+                continue
+            end = index + 1
+            for keyword, length, categories in outputs[state]:
+                start = end - length
+                if _is_word_char(keyword[0]) and not _is_boundary(lowered, start - 1):
+                    continue
+                stop = self._word_end(lowered, end, keyword)
+                if stop < 0:
+                    continue
+                for category in categories:
+                    matches.append(KeywordMatch(keyword, category, start, stop))
+        return matches
+
+    @staticmethod
+    def _word_end(text: str, end: int, keyword: str) -> int:
+        """End offset of the matched word, or -1 when the keyword continues into a longer word."""
+
+        if _is_boundary(text, end) or not _is_word_char(keyword[-1]):
+            return end
+        suffixes = INFLECTION_SUFFIXES + E_SUFFIXES if text[end - 1] == "e" else INFLECTION_SUFFIXES
+        for suffix in suffixes:
+            if text.startswith(suffix, end) and _is_boundary(text, end + len(suffix)):
+                return end + len(suffix)
+        return -1
+
+
+def _drop_e_gerund(keyword: str) -> str:
+    """``"invoice"`` → ``"invoicing"``; empty for keywords that do not end in a silent "e"."""
+
+    if len(keyword) < 4 or not keyword.endswith("e") or not keyword[-2].isalpha() or keyword[-2] in "aeiou":
+        return ""
+    return keyword[:-1] + "ing"
+
+
+def load_keyword_sets(path: str) -> Dict[str, List[str]]:
+    """Read ``{"category": ["keyword", ...], ...}`` from a JSON file."""
+
+    with open(path, "r", encoding="utf-8") as keyword_file:
+        parsed = json.load(keyword_file)
+    if not isinstance(parsed, dict) or not all(
+        isinstance(words, list) and all(isinstance(word, str) for word in words) for words in parsed.values()
+    ):
+        raise ValueError(f"{path} must map category names to keyword lists")
+    return parsed
+
+
+def matched_keywords(matches: Sequence[KeywordMatch]) -> Dict[str, List[str]]:
+    """Group matches by category with each keyword listed once, in order of appearance."""
+
+    grouped: Dict[str, List[str]] = {}
+    for match in matches:
+        keywords = grouped.setdefault(match.category, [])
+        if match.keyword not in keywords:
+            keywords.append(match.keyword)
+    return grouped
@@ -5,24 +5,127 @@ frontend while remaining transparent to the upstream AI service.
 """
 from __future__ import annotations
 
+import asyncio
+import base64
+import hashlib
 import json
+import logging
 import os
 import re
+import sys
+import time
+from contextlib import asynccontextmanager, nullcontext
 from enum import Enum
-from typing import Dict, List, Optional, Sequence, TypedDict
+from typing import Any, AsyncContextManager, AsyncIterator, Dict, List, NamedTuple, Optional, Sequence, Tuple, TypedDict, Union
 
 import httpx
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, Header, HTTPException, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, PrivateAttr, ValidationError
+
+if __name__ == "__main__":
+    # `python proxy_backend/main.py` or `python -m proxy_backend.main`: hand over to the package
+    # entry point, which lets uvicorn import this module. Running this copy as well would load the
+    # manual and register metrics twice, and as a plain script the relative imports below fail.
+    import runpy
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    runpy.run_module("proxy_backend", run_name="__main__", alter_sys=True)
+    sys.exit(0)
+
+from .admission import Overloaded, Priority, create_admission_controller
+from .cpu_offload import CPU_EXECUTOR_KIND, CPU_OFFLOAD_MIN_CHARS, CPU_POOL_SIZE, CpuExecutor, lag_monitor_task
+from .grounding import (
+    MANUAL_CONTEXT_MIN_RELATIVE_SCORE,
+    MANUAL_CONTEXT_TOP_K,
+    MANUAL_MAX_SNIPPET_CHARS,
+    budget_cost,
+    context_budget,
+    drop_overlapping,
+    pack,
+    trim_to_budget,
+)
+from .image_processing import ProcessedImage, create_image_store, preprocess_image
+from .image_upload import (
+    IMAGE_MAX_BYTES,
+    UploadedImage,
+    UploadError,
+    base64_length,
+    decode_image_base64,
+    read_image_upload,
+)
+from .issue_keywords import KeywordAutomaton, KeywordMatch, load_keyword_sets, matched_keywords
+from .manual_binary import ManualIndexFormatError, load_manual_index
+from .manual_index import BM25Params, ManualIndex, Passage, query_terms
+from .manual_vectors import MANUAL_VECTOR_MIN_SCORE, PassageVectors, VectorHit, numpy_available
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from .metrics import REGISTRY
+from .resilience import (
+    RETRYABLE_ERRORS,
+    RETRYABLE_STATUSES,
+    UPSTREAM_DEADLINE_MIN_SAMPLES,
+    UPSTREAM_HEDGE_ENABLED,
+    UPSTREAM_HEDGE_PERCENTILE,
+    UPSTREAM_LATENCY_SAMPLES,
+    UPSTREAM_MAX_RETRIES,
+    UPSTREAM_RETRY_BACKOFF_BASE_SECONDS,
+    UPSTREAM_RETRY_BACKOFF_MAX_SECONDS,
+    AdaptiveDeadline,
+    CircuitOpenError,
+    CircuitState,
+    DeadlineExceeded,
+    LatencyWindow,
+    UpstreamUnavailable,
+    backoff_delay,
+    create_retry_budget,
+    create_upstream_breaker,
+    hedged,
+)
+from .response_cache import cache_key, create_response_cache, image_digest
+from .search_memo import create_search_memo, memo_key
+from .sections import missing_sections, parse_sections, section_contents
+from .singleflight import SingleFlight
+from .structured_logging import configure_logging, elapsed_ms, summarize_upstream_payload
+from .upstream_client import ConnectTimer, create_upstream_client, encode_upstream_body
+
+configure_logging()
+logger = logging.getLogger(__name__)
 
 UPSTREAM_ASK_URL = os.getenv("UPSTREAM_ASK_URL", "https://tars-jdno.onrender.com/ask")
+# Upstream endpoint that streams its answer (event stream or chunked text). /ask/stream is disabled
+# while unset: relaying the buffered /ask endpoint would only re-chunk an answer that is already complete.
+UPSTREAM_STREAM_URL = os.getenv("UPSTREAM_STREAM_URL", "").strip()
 HTTP_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_TIMEOUT_SECONDS", "90"))
 MANUAL_PATH = os.getenv(
     "TALLY_MANUAL_PATH",
     os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "assets", "tally_manual.json")),
 )
-MANUAL_MAX_SNIPPET_CHARS = 1800
+# Compiled by `python -m proxy_backend.manual_binary`; used instead of the JSON when present and current.
+MANUAL_INDEX_PATH = os.getenv("TALLY_MANUAL_INDEX_PATH", os.path.splitext(MANUAL_PATH)[0] + ".idx")
+# Poll interval for reloading the manual when its files change; 0 disables the watcher.
+MANUAL_WATCH_INTERVAL_SECONDS = float(os.getenv("MANUAL_WATCH_INTERVAL_SECONDS", "0"))
+# Required in X-Admin-Token for admin endpoints; they are disabled while unset.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+ASK_BATCH_MAX_ITEMS = int(os.getenv("ASK_BATCH_MAX_ITEMS", "100"))
+# The whole batch body is held in memory while it is validated; screenshots make up most of it.
+ASK_BATCH_MAX_BYTES = int(os.getenv("ASK_BATCH_MAX_BYTES", str(16 * 1024 * 1024)))
+# Upstream calls in flight per batch; admission control still bounds the total.
+ASK_BATCH_CONCURRENCY = int(os.getenv("ASK_BATCH_CONCURRENCY", "4"))
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").strip().lower() in {"1", "true", "yes", "on"}
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "900"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+RESPONSE_CACHE_SQLITE_PATH = os.getenv("RESPONSE_CACHE_SQLITE_PATH", "")
+# "legacy" keeps the fixed title/body match scores; "bm25" ranks with BM25F;
+# "vector" ranks passages by latent-semantic similarity (needs numpy, else BM25F).
+MANUAL_RANKING = os.getenv("MANUAL_RANKING", "legacy").strip().lower()
+MANUAL_BM25_PARAMS = BM25Params(
+    k1=float(os.getenv("MANUAL_BM25_K1", "1.2")),
+    title_weight=float(os.getenv("MANUAL_BM25_TITLE_WEIGHT", "3.0")),
+    body_weight=float(os.getenv("MANUAL_BM25_BODY_WEIGHT", "1.0")),
+    title_b=float(os.getenv("MANUAL_BM25_TITLE_B", "0.5")),
+    body_b=float(os.getenv("MANUAL_BM25_BODY_B", "0.75")),
+)
 ESCALATION_MESSAGE = (
     "This issue needs review by a support executive to ensure it’s resolved correctly. "
     "I’ve noted this under your ticket, and our support team will assist you shortly."
@@ -50,6 +153,9 @@ SYSTEM_KEYWORDS = {
     "blank screen",
     "install",
     "installation",
+    "installer",
+    "reinstall",
+    "uninstall",
     "system",
     "login",
     "password",
@@ -57,14 +163,20 @@ SYSTEM_KEYWORDS = {
     "500",
     "access",
     "slow",
+    "slowly",
 }
 FUNCTIONAL_KEYWORDS = {
     "invoice",
     "gst",
+    "gstr",
+    "gstin",
     "tax",
+    "taxable",
+    "taxation",
     "ledger",
     "report",
     "reconcile",
+    "reconciliation",
     "recon",
     "stock",
     "inventory",
@@ -76,6 +188,7 @@ FUNCTIONAL_KEYWORDS = {
     "bill",
     "receipt",
     "bank",
+    "banking",
     "import",
     "export",
     "screen",
@@ -86,10 +199,18 @@ FUNCTIONAL_KEYWORDS = {
 }
 
 
+# Optional JSON file {"system": [...], "functional": [...]}; listed categories replace the defaults.
+ISSUE_KEYWORDS_PATH = os.getenv("ISSUE_KEYWORDS_PATH", "")
+
+
 class ManualSnippet(TypedDict):
     title: str
     learning: str
-    score: int
+    score: float
+
+
+# Excerpts chosen to ground one question, best first; empty when the manual has nothing relevant.
+ManualContext = List[ManualSnippet]
 
 
 class IssueCategory(str, Enum):
@@ -100,6 +221,36 @@ class IssueCategory(str, Enum):
     UNKNOWN = "UNKNOWN_OR_INSUFFICIENT"
 
 
+class IssueDetection(NamedTuple):
+    category: IssueCategory
+    matches: List[KeywordMatch]
+
+
+def _load_issue_keywords() -> KeywordAutomaton:
+    keyword_sets: Dict[str, Sequence[str]] = {
+        IssueCategory.SYSTEM.value: sorted(SYSTEM_KEYWORDS),
+        IssueCategory.FUNCTIONAL.value: sorted(FUNCTIONAL_KEYWORDS),
+    }
+    if not ISSUE_KEYWORDS_PATH:
+        return KeywordAutomaton(keyword_sets)
+    try:
+        configured = load_keyword_sets(ISSUE_KEYWORDS_PATH)
+        unknown = [name for name in configured if name.upper() not in {"SYSTEM", "FUNCTIONAL"}]
+        if unknown:
+            raise ValueError(f"unknown issue categories: {', '.join(unknown)}")
+        for name, keywords in configured.items():
+            keyword_sets[IssueCategory[name.upper()].value] = keywords
+    except (OSError, ValueError) as exc:
+        logger.warning(
+            "ignoring issue keyword config; using built-in keywords",
+            extra={"fields": {"path": ISSUE_KEYWORDS_PATH, "reason": str(exc)}},
+        )
+    return KeywordAutomaton(keyword_sets)
+
+
+ISSUE_KEYWORDS = _load_issue_keywords()
+
+
 class ScreenContext(BaseModel):
     screen_name: Optional[str] = Field(default=None, alias="screen_name")
     active_field: Optional[str] = Field(default=None, alias="active_field")
@@ -113,11 +264,30 @@ class AskRequest(BaseModel):
     context: Optional[ScreenContext] = None
     question: str
     persona_prompt: Optional[str] = Field(default=None, alias="persona_prompt")
-    image_base64: Optional[str] = Field(default=None, alias="image_base64")
+    # Allows a data URL prefix on top of the base64 text; /ask/upload avoids the base64 string entirely.
+    image_base64: Optional[str] = Field(default=None, alias="image_base64", max_length=base64_length(IMAGE_MAX_BYTES) + 64)
+    ticket_id: Optional[Union[int, str]] = Field(default=None, alias="ticket_id")
+    auto_coach: bool = Field(default=False, alias="auto_coach")
+    # Set by /ask/upload and by image preprocessing, never parsed from a request body.
+    _uploaded_image: Optional[UploadedImage] = PrivateAttr(default=None)
+    _prepared_image: Optional[ProcessedImage] = PrivateAttr(default=None)
 
     class Config:
         populate_by_name = True
 
+    @property
+    def uploaded_image(self) -> Optional[UploadedImage]:
+        return self._uploaded_image
+
+    @property
+    def prepared_image(self) -> Optional[ProcessedImage]:
+        return self._prepared_image
+
+
+class BatchAskRequest(BaseModel):
+    # Items are validated one by one so a malformed entry fails alone.
+    items: List[Dict[str, Any]] = Field(min_length=1, max_length=ASK_BATCH_MAX_ITEMS)
+
 
 class AskResponse(BaseModel):
     answer: str
@@ -126,7 +296,126 @@ class AskResponse(BaseModel):
         extra = "allow"
 
 
-app = FastAPI(title="TARS Structured Proxy", version="1.0.0")
+# Upstream JSON fields; ``bytes`` values are base64 image data spliced into the body as-is.
+UpstreamPayload = Dict[str, Union[str, bytes]]
+
+UPSTREAM_CLIENT: Optional[httpx.AsyncClient] = None
+UPSTREAM_FLIGHTS: SingleFlight[str] = SingleFlight()
+UPSTREAM_BREAKER = create_upstream_breaker()
+UPSTREAM_LATENCIES = LatencyWindow(UPSTREAM_LATENCY_SAMPLES)
+UPSTREAM_RETRY_BUDGET = create_retry_budget()
+UPSTREAM_ADMISSION = create_admission_controller()
+UPSTREAM_DEADLINE = AdaptiveDeadline(UPSTREAM_LATENCIES, ceiling=HTTP_TIMEOUT_SECONDS)
+RESPONSE_CACHE = create_response_cache(
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_TTL_SECONDS,
+    RESPONSE_CACHE_SQLITE_PATH,
+)
+IMAGE_STORE = create_image_store()
+
+STAGE_SECONDS = REGISTRY.histogram("proxy_stage_seconds", "Time spent in each /ask stage.", ["stage"])
+FALLBACK_RESPONSES = REGISTRY.counter(
+    "proxy_fallback_responses", "Answers rebuilt from a deterministic template.", ["category"]
+)
+MANUAL_LOOKUPS = REGISTRY.counter("proxy_manual_lookups", "Manual searches by outcome.", ["result"])
+UPSTREAM_RESPONSES = REGISTRY.counter("proxy_upstream_responses", "Upstream responses by HTTP status.", ["status"])
+UPSTREAM_TIMEOUTS = REGISTRY.counter("proxy_upstream_timeouts", "Upstream calls that timed out.")
+EVENT_LOOP_LAG_SECONDS = REGISTRY.histogram(
+    "proxy_event_loop_lag_seconds", "How late the event loop woke up from a scheduled sleep."
+)
+MANUAL_RELOAD_LOCK = asyncio.Lock()
+CPU_EXECUTOR = CpuExecutor(CPU_EXECUTOR_KIND, CPU_POOL_SIZE, CPU_OFFLOAD_MIN_CHARS)
+REGISTRY.gauge("proxy_cpu_offloaded", "CPU stages run in the worker pool.", function=lambda: CPU_EXECUTOR.offloaded)
+REGISTRY.gauge("proxy_upstream_inflight", "Distinct upstream calls in flight.", function=lambda: len(UPSTREAM_FLIGHTS))
+REGISTRY.gauge(
+    "proxy_upstream_coalesced", "Callers that joined an identical in-flight call.", function=lambda: UPSTREAM_FLIGHTS.coalesced
+)
+REGISTRY.gauge("proxy_response_cache_hits", "Response cache hits.", function=lambda: RESPONSE_CACHE.hits)
+REGISTRY.gauge("proxy_response_cache_misses", "Response cache misses.", function=lambda: RESPONSE_CACHE.misses)
+REGISTRY.gauge(
+    "proxy_image_store_hits", "Screenshots served already processed.", function=lambda: IMAGE_STORE.hits if IMAGE_STORE else 0
+)
+REGISTRY.gauge(
+    "proxy_image_store_misses", "Screenshots that had to be processed.", function=lambda: IMAGE_STORE.misses if IMAGE_STORE else 0
+)
+if CPU_EXECUTOR.kind != "process":
+    # Process workers each keep their own memo, which the parent cannot see; see _search_memo_stats.
+    REGISTRY.gauge(
+        "proxy_manual_memo_hits",
+        "Manual searches answered from the search memo.",
+        function=lambda: MANUAL_SEARCH_MEMO.hits if MANUAL_SEARCH_MEMO else 0,
+    )
+    REGISTRY.gauge(
+        "proxy_manual_memo_misses",
+        "Manual searches that had to rank the manual.",
+        function=lambda: MANUAL_SEARCH_MEMO.misses if MANUAL_SEARCH_MEMO else 0,
+    )
+UPSTREAM_SHORT_CIRCUITS = REGISTRY.counter(
+    "proxy_upstream_short_circuits", "Requests answered from the template because the upstream circuit was open."
+)
+REGISTRY.gauge(
+    "proxy_upstream_circuit_state",
+    "Upstream circuit breaker state: 0 closed, 1 half-open, 2 open.",
+    function=lambda: _CIRCUIT_STATE_VALUES[UPSTREAM_BREAKER.state] if UPSTREAM_BREAKER else 0,
+)
+REGISTRY.gauge(
+    "proxy_upstream_deadline_seconds", "Current adaptive deadline for upstream calls.", function=lambda: UPSTREAM_DEADLINE.seconds()
+)
+UPSTREAM_RETRIES = REGISTRY.counter(
+    "proxy_upstream_retries", "Extra upstream calls sent, by kind (error, status, hedge).", ["kind"]
+)
+UPSTREAM_RETRIES_DENIED = REGISTRY.counter(
+    "proxy_upstream_retries_denied", "Retries or hedges skipped because the retry budget was spent.", ["kind"]
+)
+ADMISSION_REJECTED = REGISTRY.counter(
+    "proxy_admission_rejected", "Requests shed before reaching the upstream, by reason.", ["reason"]
+)
+REGISTRY.gauge(
+    "proxy_upstream_active",
+    "Upstream calls holding an admission slot.",
+    function=lambda: UPSTREAM_ADMISSION.active if UPSTREAM_ADMISSION else 0,
+)
+REGISTRY.gauge(
+    "proxy_upstream_queue_depth",
+    "Requests waiting for an admission slot.",
+    function=lambda: UPSTREAM_ADMISSION.queued if UPSTREAM_ADMISSION else 0,
+)
+REGISTRY.gauge(
+    "proxy_upstream_background_active",
+    "Background (auto-coach) upstream calls holding an admission slot.",
+    function=lambda: UPSTREAM_ADMISSION.active_for(Priority.BACKGROUND) if UPSTREAM_ADMISSION else 0,
+)
+REGISTRY.gauge(
+    "proxy_upstream_background_queue_depth",
+    "Background (auto-coach) requests waiting for an admission slot.",
+    function=lambda: UPSTREAM_ADMISSION.queued_for(Priority.BACKGROUND) if UPSTREAM_ADMISSION else 0,
+)
+_CIRCUIT_STATE_VALUES = {CircuitState.CLOSED: 0, CircuitState.HALF_OPEN: 1, CircuitState.OPEN: 2}
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    """Own the pooled upstream client, CPU pool and loop-lag monitor for the lifetime of the app."""
+
+    global UPSTREAM_CLIENT
+    UPSTREAM_CLIENT = create_upstream_client(HTTP_TIMEOUT_SECONDS)
+    CPU_EXECUTOR.start(__name__)
+    background = [lag_monitor_task(EVENT_LOOP_LAG_SECONDS)]
+    if MANUAL_WATCH_INTERVAL_SECONDS > 0:
+        background.append(asyncio.ensure_future(watch_manual_files(MANUAL_WATCH_INTERVAL_SECONDS)))
+    try:
+        yield
+    finally:
+        for task in background:
+            if task is not None:
+                task.cancel()
+        CPU_EXECUTOR.shutdown()
+        client, UPSTREAM_CLIENT = UPSTREAM_CLIENT, None
+        await client.aclose()
+
+
+app = FastAPI(title="TARS Structured Proxy", version="1.0.0", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -137,13 +426,63 @@ app.add_middleware(
 
 
 @app.post("/ask", response_model=AskResponse)
-async def proxy_ask(payload: AskRequest) -> AskResponse:
+async def proxy_ask(payload: AskRequest, request: Request, response: Response) -> AskResponse:
     """Proxy the /ask call while enforcing structured responses."""
 
+    started = time.perf_counter()
     issue_text = extract_issue_text(payload)
-    manual_context = search_manual_snippet(issue_text)
+    detection = detect_issue(issue_text)
+    response.headers["X-Issue-Detected"] = _issue_header(detection)
+    issue_ms = _finish_stage("extract_issue_text", started)
+    stage = time.perf_counter()
+    await _prepare_image(payload)
+    image_ms = _finish_stage("image_preprocess", stage)
+    stage = time.perf_counter()
+    manual_context = await _search_manual(issue_text)
+    search_ms = _finish_stage("search_manual_snippet", stage)
+    stage = time.perf_counter()
+    upstream_answer = await _upstream_answer(
+        payload, manual_context, _client_key(payload, request), _request_priority(payload, request)
+    )
+    upstream_ms = elapsed_ms(stage)
+    stage = time.perf_counter()
+    normalized_answer = await _normalize(issue_text, upstream_answer, manual_context)
+    logger.info(
+        "ask completed",
+        extra={
+            "fields": {
+                "issue_ms": issue_ms,
+                "image_ms": image_ms,
+                "search_ms": search_ms,
+                "upstream_ms": upstream_ms,
+                "normalize_ms": _finish_stage("normalize_response", stage),
+                "total_ms": elapsed_ms(started),
+                "manual_titles": _manual_titles(manual_context),
+                "issue_category": detection.category.value,
+                "fallback": normalized_answer != upstream_answer,
+            }
+        },
+    )
+    return AskResponse(answer=normalized_answer)
+
+
+async def _upstream_answer(
+    payload: AskRequest, manual_context: ManualContext, client: str, priority: Priority
+) -> str:
+    """Fetch the raw upstream answer, mapping upstream failures to client-facing HTTP errors."""
+
     try:
-        upstream_answer = await fetch_upstream_answer(payload, manual_context)
+        return await fetch_cached_upstream_answer(payload, manual_context, client, priority)
+    except Overloaded as exc:
+        raise HTTPException(
+            status_code=exc.status_code,
+            detail=f"The assistant is busy ({exc.reason}). Please retry in {exc.retry_after} seconds.",
+            headers={"Retry-After": str(exc.retry_after)},
+        ) from exc
+    except UpstreamUnavailable as exc:
+        # Degraded upstream: answer right away from the template instead of queueing behind it.
+        logger.warning("upstream unavailable; serving fallback", extra={"fields": {"reason": str(exc)}})
+        return ""
     except httpx.ReadTimeout as exc:
         raise HTTPException(
             status_code=status.HTTP_504_GATEWAY_TIMEOUT,
@@ -168,26 +507,601 @@ async def proxy_ask(payload: AskRequest) -> AskResponse:
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail=f"Upstream request failed: {exc}",
         ) from exc
-    normalized_answer = normalize_response(issue_text, upstream_answer, manual_context)
-    return AskResponse(answer=normalized_answer)
 
 
-async def fetch_upstream_answer(payload: AskRequest, manual_context: Optional[ManualSnippet]) -> str:
-    """Call the upstream AI service and extract the answer string."""
+async def _prepare_image(payload: AskRequest) -> None:
+    """Attach the downscaled, deduplicated screenshot to ``payload`` before it goes upstream.
+
+    A repeat of an already seen screenshot reuses the stored result. An
+    ``image_base64`` that is not a valid image is forwarded untouched, as before.
+    """
+
+    if IMAGE_STORE is None or payload.prepared_image is not None:
+        return
+    image = payload.uploaded_image
+    if image is None and payload.image_base64:
+        try:
+            image = await CPU_EXECUTOR.run(len(payload.image_base64), decode_image_base64, payload.image_base64)
+        except UploadError as exc:
+            logger.info("image_base64 not preprocessed", extra={"fields": {"reason": str(exc)}})
+            return
+    if image is None:
+        return
+    prepared = IMAGE_STORE.get(image.sha256)
+    if prepared is None:
+        prepared = await CPU_EXECUTOR.run(len(image.data), preprocess_image, image)
+        IMAGE_STORE.put(prepared)
+    payload._prepared_image = prepared
+
+
+async def _search_manual(issue_text: str) -> ManualContext:
+    manual_context = await CPU_EXECUTOR.run(len(issue_text), search_manual_context, issue_text)
+    MANUAL_LOOKUPS.inc(result="hit" if manual_context else "miss")
+    return manual_context
+
+
+async def _normalize(issue_text: str, raw_answer: str, manual_context: ManualContext) -> str:
+    normalized = await CPU_EXECUTOR.run(
+        len(raw_answer or ""), normalize_response, issue_text, raw_answer, manual_context
+    )
+    if normalized != (raw_answer or "").strip():
+        # Counted here rather than in normalize_response so process-pool workers don't lose it.
+        FALLBACK_RESPONSES.inc(category=classify_issue(issue_text).value)
+    return normalized
+
+
+def _finish_stage(stage: str, started: float) -> float:
+    """Record a stage duration in the histogram and return it in milliseconds for logging."""
+
+    seconds = time.perf_counter() - started
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    return round(seconds * 1000, 2)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """Prometheus text exposition of the proxy metrics."""
 
-    upstream_payload = {
+    return PlainTextResponse(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+def _require_admin(token: Optional[str]) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin endpoints are disabled.")
+    if token != ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid admin token.")
+
+
+@app.post("/admin/manual/reload")
+async def admin_reload_manual(x_admin_token: Optional[str] = Header(default=None)) -> Dict[str, object]:
+    """Rebuild the manual and its indexes in the background and swap them in."""
+
+    _require_admin(x_admin_token)
+    try:
+        return await reload_manual()
+    except Exception as exc:
+        logger.exception("manual reload failed")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Manual reload failed; the previous manual is still active: {exc}",
+        ) from exc
+
+
+@app.get("/admin/manual")
+async def admin_manual_stats(x_admin_token: Optional[str] = Header(default=None)) -> Dict[str, object]:
+    """Stats of the manual snapshot currently serving searches."""
+
+    _require_admin(x_admin_token)
+    return MANUAL_STATS
+
+
+@app.post("/ask/upload", response_model=AskResponse)
+async def proxy_ask_upload(request: Request, response: Response) -> AskResponse:
+    """multipart/form-data variant of /ask for questions with a screenshot.
+
+    The body is parsed as it streams in (see :mod:`image_upload` for the form
+    fields). Oversized bodies get 413 and non-image data gets 415, before the
+    rest of the upload is read. The decoded image is base64-encoded once,
+    straight into the upstream request.
+    """
+
+    try:
+        upload = await read_image_upload(
+            request.headers.get("content-type", ""), request.stream(), _content_length(request)
+        )
+    except UploadError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc)) from exc
+    fields = dict(upload.fields)
+    try:
+        data = json.loads(fields.pop("request", None) or "{}")
+        if not isinstance(data, dict):
+            raise ValueError("the request field must be a JSON object")
+        if isinstance(fields.get("context"), str):
+            data["context"] = json.loads(fields.pop("context"))
+        data.update(fields)
+        payload = AskRequest.model_validate(data)
+    except ValidationError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=exc.errors(include_url=False, include_context=False),
+        ) from exc
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Malformed form field: {exc}") from exc
+    payload._uploaded_image = upload.image
+    return await proxy_ask(payload, request, response)
+
+
+def _content_length(request: Request) -> Optional[int]:
+    try:
+        return int(request.headers["content-length"])
+    except (KeyError, ValueError):
+        return None
+
+
+async def _read_body(request: Request, max_bytes: int) -> bytes:
+    """The request body, refused with 413 as soon as it is declared or read past ``max_bytes``."""
+
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Request body exceeds {max_bytes} bytes.",
+    )
+    declared = _content_length(request)
+    if declared is not None and declared > max_bytes:
+        raise too_large
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > max_bytes:
+            raise too_large
+    return bytes(body)
+
+
+@app.post("/ask/stream")
+async def proxy_ask_stream(payload: AskRequest, request: Request) -> StreamingResponse:
+    """Server-Sent Events variant of /ask that relays upstream text as it arrives.
+
+    Answers 501 unless ``UPSTREAM_STREAM_URL`` names a streaming upstream.
+    Events are ``chunk`` (``{"text": ...}``) for each upstream fragment, relayed
+    unchecked, and a final ``done`` carrying the normalized answer. Sections
+    are only checked once the stream has ended: ``done`` lists the
+    ``missing_sections``, and if any were missing or empty it holds the
+    deterministic fallback with ``fallback`` true so the client can replace
+    what it rendered. The status line is already sent when the upstream is
+    reached, so shed load shows up as a fallback ``done`` event with
+    ``retry_after`` instead of 429/503.
+    """
+
+    if not UPSTREAM_STREAM_URL:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Streaming is disabled; no streaming upstream is configured (UPSTREAM_STREAM_URL).",
+        )
+    issue_text = extract_issue_text(payload)
+    await _prepare_image(payload)
+    manual_context = await _search_manual(issue_text)
+    return StreamingResponse(
+        _stream_answer_events(
+            payload, issue_text, manual_context, _client_key(payload, request), _request_priority(payload, request)
+        ),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "X-Issue-Detected": _issue_header(detect_issue(issue_text)),
+        },
+    )
+
+
+async def _stream_answer_events(
+    payload: AskRequest,
+    issue_text: str,
+    manual_context: ManualContext,
+    client: str,
+    priority: Priority,
+) -> AsyncIterator[str]:
+    parts: List[str] = []
+    error: Optional[str] = None
+    retry_after: Optional[int] = None
+    # Streamed answers are reassembled from the stream endpoint's events, so they get their own keys.
+    key = _response_cache_key(payload, manual_context, endpoint="stream")
+    cached = await RESPONSE_CACHE.aget(key) if RESPONSE_CACHE.enabled else None
+    try:
+        if cached is not None:
+            chunks: AsyncIterator[str] = _single_chunk(cached)
+            slot: AsyncContextManager[None] = nullcontext()
+        else:
+            chunks = _stream_upstream_text(build_upstream_payload(payload, manual_context))
+            slot = _upstream_slot(client, priority)
+        async with slot:
+            async for text in chunks:
+                if not text:
+                    continue
+                parts.append(text)
+                yield _sse_event("chunk", {"text": text})
+    except Overloaded as exc:
+        error = f"The assistant is busy ({exc.reason})."
+        retry_after = exc.retry_after
+    except (httpx.HTTPError, ValueError, UpstreamUnavailable) as exc:
+        error = f"Upstream request failed: {exc}"
+
+    streamed = "".join(parts).strip()
+    missing = missing_sections(parse_sections(streamed, REQUIRED_SECTION_HEADERS), REQUIRED_SECTION_HEADERS)
+    answer = await _normalize(issue_text, streamed, manual_context)
+    if cached is None and error is None and answer == streamed:
+        await RESPONSE_CACHE.aset(key, streamed)
+    event = {"answer": answer, "fallback": answer != streamed, "missing_sections": missing}
+    if error:
+        event["error"] = error
+    if retry_after is not None:
+        event["retry_after"] = retry_after
+    yield _sse_event("done", event)
+
+
+async def _single_chunk(text: str) -> AsyncIterator[str]:
+    yield text
+
+
+async def _stream_upstream_text(upstream_payload: UpstreamPayload) -> AsyncIterator[str]:
+    """Yield answer text from the upstream as it arrives.
+
+    Event-stream and plain-text upstreams are relayed incrementally; a JSON
+    upstream can only be relayed once its body is complete.
+    """
+
+    _admit_upstream_call()
+    client = UPSTREAM_CLIENT
+    owned = client is None
+    if client is None:
+        client = create_upstream_client(HTTP_TIMEOUT_SECONDS)
+    try:
+        async with client.stream(
+            "POST",
+            UPSTREAM_STREAM_URL,
+            content=encode_upstream_body(upstream_payload),
+            headers={"Content-Type": "application/json"},
+        ) as response:
+            response.raise_for_status()
+            content_type = response.headers.get("content-type", "")
+            if content_type.startswith("text/event-stream"):
+                async for data in _sse_data(response.aiter_lines()):
+                    yield _upstream_event_text(data)
+            elif content_type.startswith("application/json"):
+                data = json.loads(await response.aread())
+                answer = data.get("answer") if isinstance(data, dict) else None
+                yield answer.strip() if isinstance(answer, str) else ""
+            else:
+                async for text in response.aiter_text():
+                    yield text
+    except httpx.HTTPStatusError as exc:
+        _record_upstream_outcome(exc.response.status_code < 500)
+        raise
+    except httpx.RequestError:
+        _record_upstream_outcome(False)
+        raise
+    else:
+        _record_upstream_outcome(True)
+    finally:
+        if owned:
+            await client.aclose()
+
+
+async def _sse_data(lines: AsyncIterator[str]) -> AsyncIterator[str]:
+    """The data of each server-sent event, per the event-stream format.
+
+    One space after ``data:`` is dropped, not all surrounding whitespace: a
+    plain-text token such as " the" keeps the space that separates it from
+    the previous one. Several ``data`` lines of one event are joined with
+    newlines, and the event is dispatched at the blank line that ends it.
+    """
+
+    data: List[str] = []
+    async for line in lines:
+        if not line:
+            if data:
+                yield "\n".join(data)
+                data = []
+            continue
+        if line.startswith(":"):
+            continue
+        field, _, value = line.partition(":")
+        if field == "data":
+            data.append(value[1:] if value.startswith(" ") else value)
+    # The format drops an unterminated last event; an upstream that closes without the blank line still meant it.
+    if data:
+        yield "\n".join(data)
+
+
+def _upstream_event_text(data: str) -> str:
+    if not data or data == "[DONE]":
+        return ""
+    try:
+        parsed = json.loads(data)
+    except ValueError:
+        return data
+    if isinstance(parsed, str):
+        return parsed
+    if isinstance(parsed, dict):
+        for field in ("token", "delta", "text", "answer"):
+            value = parsed.get(field)
+            if isinstance(value, str):
+                return value
+        return ""
+    # A plain-text token that happens to parse as JSON, such as "42" or "true".
+    return data
+
+
+def _sse_event(event: str, data: Dict[str, object]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post(
+    "/ask/batch",
+    # The body is read by hand so its size can be capped; keep it in the OpenAPI schema anyway.
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": BatchAskRequest.model_json_schema()}},
+        }
+    },
+)
+async def proxy_ask_batch(request: Request) -> StreamingResponse:
+    """Answer many /ask items in one call, streamed back as NDJSON.
+
+    Manual search runs once for the whole batch; upstream calls run at most
+    ``ASK_BATCH_CONCURRENCY`` at a time. Each line is the result for one item,
+    tagged with its ``index``, in completion order. A failed item yields an
+    ``error`` object with the HTTP status /ask would have returned. A body
+    over ``ASK_BATCH_MAX_BYTES`` is refused with 413 before it is parsed.
+    """
+
+    body = await _read_body(request, ASK_BATCH_MAX_BYTES)
+    try:
+        batch = BatchAskRequest.model_validate_json(body)
+    except ValidationError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=exc.errors(include_url=False, include_context=False, include_input=False),
+        ) from exc
+    return StreamingResponse(_batch_results(batch.items, request), media_type="application/x-ndjson")
+
+
+async def _batch_results(items: Sequence[Dict[str, Any]], request: Request) -> AsyncIterator[str]:
+    payloads: List[Optional[AskRequest]] = []
+    for index, item in enumerate(items):
+        try:
+            payloads.append(AskRequest.model_validate(item))
+        except ValidationError as exc:
+            payloads.append(None)
+            detail = exc.errors(include_url=False, include_context=False)
+            yield _ndjson_line({"index": index, "error": {"status": 422, "detail": detail}})
+
+    issues = [extract_issue_text(payload) if payload else None for payload in payloads]
+    contexts = await CPU_EXECUTOR.run(sum(len(issue or "") for issue in issues), search_manual_contexts, issues)
+    for payload, manual_context in zip(payloads, contexts):
+        if payload is not None:
+            MANUAL_LOOKUPS.inc(result="hit" if manual_context else "miss")
+
+    semaphore = asyncio.Semaphore(max(1, ASK_BATCH_CONCURRENCY))
+
+    async def answer(index: int, payload: AskRequest, issue_text: str) -> Dict[str, object]:
+        result: Dict[str, object] = {"index": index, "ticket_id": payload.ticket_id}
+        manual_context = contexts[index]
+        try:
+            async with semaphore:
+                await _prepare_image(payload)
+                raw_answer = await _upstream_answer(
+                    payload, manual_context, _client_key(payload, request), _request_priority(payload, request)
+                )
+            normalized = await _normalize(issue_text, raw_answer, manual_context)
+        except HTTPException as exc:
+            result["error"] = {"status": exc.status_code, "detail": exc.detail}
+            return result
+        except Exception:
+            logger.exception("batch item failed", extra={"fields": {"index": index}})
+            result["error"] = {"status": status.HTTP_500_INTERNAL_SERVER_ERROR, "detail": "Internal error."}
+            return result
+        result.update(
+            answer=normalized,
+            fallback=normalized != raw_answer,
+            manual_title=manual_context[0]["title"] if manual_context else None,
+            manual_titles=_manual_titles(manual_context),
+            issue_detected=_issue_header(detect_issue(issue_text)),
+        )
+        return result
+
+    tasks = [
+        asyncio.ensure_future(answer(index, payload, issues[index] or ""))
+        for index, payload in enumerate(payloads)
+        if payload is not None
+    ]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield _ndjson_line(await finished)
+    finally:
+        # The client went away or the stream failed: stop the remaining upstream calls.
+        for task in tasks:
+            task.cancel()
+
+
+def _ndjson_line(data: Dict[str, object]) -> str:
+    return json.dumps(data, ensure_ascii=False, default=str) + "\n"
+
+
+@app.get("/cache/stats")
+async def cache_stats() -> Dict[str, object]:
+    """Hit/miss counters and usage of the upstream response cache, the screenshot store and the search memo."""
+
+    stats = await RESPONSE_CACHE.astats()
+    stats["image_store"] = IMAGE_STORE.stats() if IMAGE_STORE else {"enabled": False}
+    stats["manual_search"] = _search_memo_stats()
+    return stats
+
+
+def _search_memo_stats() -> Dict[str, object]:
+    if MANUAL_SEARCH_MEMO is None:
+        return {"enabled": False}
+    if CPU_EXECUTOR.kind == "process":
+        # Offloaded searches hit the memo inside each worker process; the parent's counters would read 0.
+        return {"enabled": True, "reported": False, "reason": "not collected from CPU_EXECUTOR=process workers"}
+    return MANUAL_SEARCH_MEMO.stats()
+
+
+async def fetch_cached_upstream_answer(
+    payload: AskRequest,
+    manual_context: ManualContext,
+    client: str = "",
+    priority: Priority = Priority.INTERACTIVE,
+) -> str:
+    """Serve repeated questions from the response cache before going upstream.
+
+    Only cache misses go through admission control, keyed by ``client``.
+    """
+
+    if not RESPONSE_CACHE.enabled:
+        return await fetch_upstream_answer(payload, manual_context, client, priority)
+
+    key = _response_cache_key(payload, manual_context)
+    cached = await RESPONSE_CACHE.aget(key)
+    if cached is not None:
+        return cached
+
+    answer = await fetch_upstream_answer(payload, manual_context, client, priority)
+    if answer:
+        # Empty answers fall back to templates; don't pin them in the cache.
+        await RESPONSE_CACHE.aset(key, answer)
+    return answer
+
+
+@asynccontextmanager
+async def _upstream_slot(client: str, priority: Priority = Priority.INTERACTIVE) -> AsyncIterator[None]:
+    """Hold an admission slot for an upstream call; raises :class:`Overloaded` when shed."""
+
+    admission = UPSTREAM_ADMISSION
+    if admission is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        await admission.acquire(client, priority)
+    except Overloaded as exc:
+        ADMISSION_REJECTED.inc(reason=exc.reason)
+        raise
+    _finish_stage("admission_wait", started)
+    held = time.perf_counter()
+    try:
+        yield
+    finally:
+        admission.release(priority, time.perf_counter() - held)
+
+
+def _client_key(payload: AskRequest, request: Request) -> str:
+    """Fairness key: the ticket when the caller sends one, else the caller's address.
+
+    The app sends ``ticket_id: 0`` when no ticket is focused; that and an empty
+    id mean "no ticket", or every such agent would share one queue.
+    """
+
+    ticket = str(payload.ticket_id).strip() if payload.ticket_id is not None else ""
+    if ticket and ticket != "0":
+        return f"ticket:{ticket}"
+    forwarded = request.headers.get("x-forwarded-for", "")
+    if forwarded:
+        return f"addr:{forwarded.split(',')[0].strip()}"
+    return f"addr:{request.client.host}" if request.client else "addr:unknown"
+
+
+def _request_priority(payload: AskRequest, request: Request) -> Priority:
+    """``X-Request-Priority: interactive|background`` wins; otherwise auto-coach calls run in the background."""
+
+    header = request.headers.get("x-request-priority", "").strip().lower()
+    if header in {priority.value for priority in Priority}:
+        return Priority(header)
+    return Priority.BACKGROUND if payload.auto_coach else Priority.INTERACTIVE
+
+
+def _response_cache_key(payload: AskRequest, manual_context: ManualContext, endpoint: str = "") -> str:
+    if payload.prepared_image is not None:
+        image = payload.prepared_image.digest
+    elif payload.uploaded_image is not None:
+        image = payload.uploaded_image.sha256
+    else:
+        image = image_digest(payload.image_base64)
+    grounding = "\x1e".join(_manual_excerpt_block(snippet) for snippet in manual_context or [])
+    return cache_key(payload.question, grounding or None, image, endpoint)
+
+
+async def fetch_upstream_answer(
+    payload: AskRequest,
+    manual_context: ManualContext,
+    client: str = "",
+    priority: Priority = Priority.INTERACTIVE,
+) -> str:
+    """Call the upstream AI service and extract the answer string.
+
+    Concurrent calls with an identical upstream payload share one request.
+    Only that request takes an admission slot, under the first caller's
+    ``client`` and ``priority``; callers that join it wait without holding
+    one, and share its result, including an :class:`Overloaded` rejection.
+    """
+
+    upstream_payload = build_upstream_payload(payload, manual_context)
+
+    async def admitted() -> str:
+        async with _upstream_slot(client, priority):
+            return await _request_upstream_answer(upstream_payload)
+
+    return await UPSTREAM_FLIGHTS.do(_payload_fingerprint(upstream_payload), admitted)
+
+
+def build_upstream_payload(payload: AskRequest, manual_context: ManualContext) -> UpstreamPayload:
+    upstream_payload: UpstreamPayload = {
         "question": _attach_manual_context(payload.question, manual_context),
     }
-    if payload.image_base64:
+    if payload.prepared_image is not None:
+        upstream_payload["image"] = payload.prepared_image.data_base64
+    elif payload.uploaded_image is not None:
+        # The one base64 encoding of an uploaded image; it goes into the body without further copies.
+        upstream_payload["image"] = base64.b64encode(payload.uploaded_image.data)
+    elif payload.image_base64:
         upstream_payload["image"] = payload.image_base64
+    return upstream_payload
 
-    async with httpx.AsyncClient(timeout=HTTP_TIMEOUT_SECONDS) as client:
-        response = await client.post(
-            UPSTREAM_ASK_URL,
-            json=upstream_payload,
-        )
-    print("Upstream payload:", upstream_payload)
-    print("Upstream status:", response.status_code)
+
+def _payload_fingerprint(upstream_payload: UpstreamPayload) -> str:
+    digest = hashlib.sha256()
+    for key in sorted(upstream_payload):
+        value = upstream_payload[key]
+        digest.update(key.encode("utf-8") + b"\x00")
+        digest.update(value if isinstance(value, bytes) else value.encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+
+async def _request_upstream_answer(upstream_payload: UpstreamPayload) -> str:
+    started = time.perf_counter()
+    deadline = _upstream_deadline()
+    # Serialized once and shared by every retry and hedge.
+    body = encode_upstream_body(upstream_payload)
+    try:
+        # The deadline covers retries and hedges too: it bounds what the caller waits.
+        response = await asyncio.wait_for(_send_with_retries(body), deadline)
+    except asyncio.TimeoutError as exc:
+        UPSTREAM_TIMEOUTS.inc()
+        _record_upstream_outcome(False)
+        # Censored sample: the call took at least this long. Without it a slowdown never raises the deadline.
+        UPSTREAM_LATENCIES.observe(deadline)
+        raise DeadlineExceeded(f"no upstream answer within the {deadline:.1f}s deadline") from exc
+    UPSTREAM_RESPONSES.inc(status=response.status_code)
+    logger.info(
+        "upstream responded",
+        extra={
+            "fields": {
+                "status": response.status_code,
+                "upstream_ms": _finish_stage("upstream_response", started),
+                **summarize_upstream_payload(upstream_payload),
+            }
+        },
+    )
     response.raise_for_status()
 
     try:
@@ -205,6 +1119,109 @@ async def fetch_upstream_answer(payload: AskRequest, manual_context: Optional[Ma
     return answer.strip()
 
 
+async def _send_with_retries(body: bytes) -> httpx.Response:
+    """Send the call, retrying connect failures and 502/503 answers while the budget allows."""
+
+    UPSTREAM_RETRY_BUDGET.record_request()
+    attempt = 0
+    while True:
+        try:
+            response = await hedged(
+                lambda: _attempt_upstream(body),
+                _hedge_delay(),
+                lambda: _spend_retry("hedge"),
+                succeeded=lambda response: response.status_code < 500,
+            )
+        except RETRYABLE_ERRORS as exc:
+            if attempt >= UPSTREAM_MAX_RETRIES or not _spend_retry("error"):
+                raise
+            reason = type(exc).__name__
+        else:
+            if (
+                response.status_code not in RETRYABLE_STATUSES
+                or attempt >= UPSTREAM_MAX_RETRIES
+                or not _spend_retry("status")
+            ):
+                return response
+            reason = str(response.status_code)
+        attempt += 1
+        delay = backoff_delay(attempt, UPSTREAM_RETRY_BACKOFF_BASE_SECONDS, UPSTREAM_RETRY_BACKOFF_MAX_SECONDS)
+        logger.info(
+            "retrying upstream call",
+            extra={"fields": {"attempt": attempt, "reason": reason, "delay_ms": round(delay * 1000, 2)}},
+        )
+        await asyncio.sleep(delay)
+
+
+async def _attempt_upstream(body: bytes) -> httpx.Response:
+    _admit_upstream_call()
+    started = time.perf_counter()
+    try:
+        response = await _post_upstream(body)
+    except httpx.TimeoutException:
+        UPSTREAM_TIMEOUTS.inc()
+        _record_upstream_outcome(False)
+        raise
+    except httpx.RequestError:
+        _record_upstream_outcome(False)
+        raise
+    # 4xx means the upstream is up and rejected this request; only 5xx counts against it.
+    _record_upstream_outcome(response.status_code < 500, time.perf_counter() - started)
+    return response
+
+
+def _upstream_deadline() -> float:
+    """Adaptive deadline, or the full HTTP timeout while the breaker is probing a recovering upstream."""
+
+    if UPSTREAM_BREAKER is not None and UPSTREAM_BREAKER.state is CircuitState.HALF_OPEN:
+        return HTTP_TIMEOUT_SECONDS
+    return UPSTREAM_DEADLINE.seconds()
+
+
+def _hedge_delay() -> Optional[float]:
+    if not UPSTREAM_HEDGE_ENABLED or len(UPSTREAM_LATENCIES) < UPSTREAM_DEADLINE_MIN_SAMPLES:
+        return None
+    return UPSTREAM_LATENCIES.percentile(UPSTREAM_HEDGE_PERCENTILE)
+
+
+def _spend_retry(kind: str) -> bool:
+    if UPSTREAM_RETRY_BUDGET.try_spend():
+        UPSTREAM_RETRIES.inc(kind=kind)
+        return True
+    UPSTREAM_RETRIES_DENIED.inc(kind=kind)
+    return False
+
+
+def _admit_upstream_call() -> None:
+    if UPSTREAM_BREAKER is not None and not UPSTREAM_BREAKER.allow():
+        UPSTREAM_SHORT_CIRCUITS.inc()
+        raise CircuitOpenError("upstream circuit is open")
+
+
+def _record_upstream_outcome(success: bool, seconds: Optional[float] = None) -> None:
+    if UPSTREAM_BREAKER is not None:
+        UPSTREAM_BREAKER.record(success)
+    if success and seconds is not None:
+        UPSTREAM_LATENCIES.observe(seconds)
+
+
+async def _post_upstream(body: bytes) -> httpx.Response:
+    """POST the JSON ``body`` through the shared client, or a one-off client outside the app lifespan."""
+
+    connect_timer = ConnectTimer()
+    extensions = {"trace": connect_timer}
+    headers = {"Content-Type": "application/json"}
+    client = UPSTREAM_CLIENT
+    try:
+        if client is not None:
+            return await client.post(UPSTREAM_ASK_URL, content=body, headers=headers, extensions=extensions)
+        async with create_upstream_client(HTTP_TIMEOUT_SECONDS) as client:
+            return await client.post(UPSTREAM_ASK_URL, content=body, headers=headers, extensions=extensions)
+    finally:
+        if connect_timer.seconds is not None:
+            STAGE_SECONDS.observe(connect_timer.seconds, stage="upstream_connect")
+
+
 def extract_issue_text(payload: AskRequest) -> str:
     """Heuristically pull the customer's issue text from the request payload."""
 
@@ -249,12 +1266,20 @@ def sanitize_issue(issue: str) -> str:
 def normalize_response(
     issue_text: str,
     raw_answer: str,
-    manual_context: Optional[ManualSnippet],
+    manual_context: ManualContext,
 ) -> str:
-    """Ensure the answer conforms to the mandatory section contract."""
+    """Ensure the answer conforms to the mandatory section contract.
+
+    A complete answer is returned as is. When only some sections are missing
+    or empty, the upstream sections are kept and just the gaps are filled
+    from the deterministic template; an answer without any usable section is
+    replaced by the template entirely.
+    """
 
     answer = (raw_answer or "").strip()
-    if answer and has_required_sections(answer) and sections_non_empty(answer):
+    sections = parse_sections(answer, REQUIRED_SECTION_HEADERS)
+    missing = missing_sections(sections, REQUIRED_SECTION_HEADERS)
+    if answer and not missing:
         return answer
 
     category = classify_issue(issue_text)
@@ -263,51 +1288,45 @@ def normalize_response(
         IssueCategory.FUNCTIONAL: _build_functional_response,
         IssueCategory.UNKNOWN: _build_unknown_response,
     }
-    builder = builders.get(category, _build_unknown_response)
-    return _append_manual_reference(builder(issue_text), manual_context)
-
-
-def has_required_sections(answer: str) -> bool:
-    """Check whether all required headings exist in the payload."""
-
-    return all(section in answer for section in REQUIRED_SECTION_HEADERS)
+    template = builders.get(category, _build_unknown_response)(issue_text)
+    if len(missing) == len(REQUIRED_SECTION_HEADERS):
+        return _append_manual_reference(template, manual_context)
+
+    upstream = section_contents(sections)
+    fallback = section_contents(parse_sections(template, REQUIRED_SECTION_HEADERS))
+    repaired = "\n\n".join(
+        f"{header}\n{upstream.get(header) or fallback[header]}" for header in REQUIRED_SECTION_HEADERS
+    )
+    return _append_manual_reference(repaired, manual_context)
 
 
-def sections_non_empty(answer: str) -> bool:
-    """Verify every mandatory section has non-empty content."""
+def classify_issue(issue_text: str) -> IssueCategory:
+    """Rough classification used to steer the normalized template."""
 
-    lowered_answer = answer
-    for index, section in enumerate(REQUIRED_SECTION_HEADERS):
-        start = lowered_answer.find(section)
-        if start == -1:
-            return False
-        start += len(section)
-        end_candidates: List[int] = []
-        for next_section in REQUIRED_SECTION_HEADERS[index + 1 :]:
-            next_pos = lowered_answer.find(next_section, start)
-            if next_pos != -1:
-                end_candidates.append(next_pos)
-        end = min(end_candidates) if end_candidates else len(lowered_answer)
-        content = lowered_answer[start:end].strip()
-        if not content:
-            return False
-    return True
+    return detect_issue(issue_text).category
 
 
-def classify_issue(issue_text: str) -> IssueCategory:
-    """Rough classification used to steer the normalized template."""
+def detect_issue(issue_text: str) -> IssueDetection:
+    """Classify in one keyword scan; system keywords win over functional ones."""
 
-    normalized = issue_text.lower()
-    if not normalized or len(normalized) < 12:
-        return IssueCategory.UNKNOWN
+    matches = ISSUE_KEYWORDS.find(issue_text)
+    if len(issue_text) < 12:
+        return IssueDetection(IssueCategory.UNKNOWN, matches)
+    found = {match.category for match in matches}
+    for category in (IssueCategory.SYSTEM, IssueCategory.FUNCTIONAL):
+        if category.value in found:
+            return IssueDetection(category, matches)
+    return IssueDetection(IssueCategory.UNKNOWN, matches)
 
-    if any(keyword in normalized for keyword in SYSTEM_KEYWORDS):
-        return IssueCategory.SYSTEM
 
-    if any(keyword in normalized for keyword in FUNCTIONAL_KEYWORDS):
-        return IssueCategory.FUNCTIONAL
+def _issue_header(detection: IssueDetection) -> str:
+    """``X-Issue-Detected`` value, e.g. ``SYSTEM_OR_ENVIRONMENT; SYSTEM_OR_ENVIRONMENT=crash,license``."""
 
-    return IssueCategory.UNKNOWN
+    parts = [detection.category.value]
+    for category, keywords in matched_keywords(detection.matches).items():
+        parts.append(f"{category}={','.join(keywords)}")
+    # Header values must be latin-1; configured keywords could be anything.
+    return "; ".join(parts).encode("ascii", "replace").decode("ascii")
 
 
 def _build_functional_response(issue_text: str) -> str:
@@ -341,143 +1360,317 @@ def _build_functional_response(issue_text: str) -> str:
 # ---------------------------------------------------------------------------
 # Tally manual ingestion utilities
 # ---------------------------------------------------------------------------
-MANUAL_DATA: Dict[str, Sequence[Dict[str, str]]] = {"tutorials": []}
+MANUAL_INDEX = ManualIndex.build([])
+# Bumped on every successful (re)load so derived caches can tell snapshots apart.
+MANUAL_GENERATION = 0
+MANUAL_STATS: Dict[str, object] = {}
+MANUAL_SEARCH_MEMO = create_search_memo(MANUAL_INDEX)
+
+
+class ManualLoad(NamedTuple):
+    index: ManualIndex
+    source: str
+    path: str
+
+
+def _read_manual() -> Optional[ManualLoad]:
+    """Build a fresh manual snapshot from the binary index or the JSON, without publishing it."""
+
+    if MANUAL_INDEX_PATH and os.path.exists(MANUAL_INDEX_PATH):
+        try:
+            return ManualLoad(load_manual_index(MANUAL_INDEX_PATH, MANUAL_PATH), "binary", MANUAL_INDEX_PATH)
+        except (OSError, ManualIndexFormatError) as exc:
+            logger.warning(
+                "ignoring binary manual index; falling back to JSON",
+                extra={"fields": {"path": MANUAL_INDEX_PATH, "reason": str(exc)}},
+            )
+    if not MANUAL_PATH:
+        return None
+    with open(MANUAL_PATH, "r", encoding="utf-8") as manual_file:
+        parsed = json.load(manual_file)
+    if not isinstance(parsed, dict) or "tutorials" not in parsed:
+        raise ValueError(f"{MANUAL_PATH} has no 'tutorials' list")
+    return ManualLoad(ManualIndex.build(parsed.get("tutorials", [])), "json", MANUAL_PATH)
+
+
+def _attach_vectors(load: Optional[ManualLoad]) -> Optional[ManualLoad]:
+    """Build the passage vectors when vector ranking is configured and numpy is installed."""
+
+    if load is None or MANUAL_RANKING != "vector" or not len(load.index):
+        return load
+    if not numpy_available():
+        logger.warning("MANUAL_RANKING=vector needs numpy; ranking with BM25 instead")
+        return load
+    load.index.vectors = PassageVectors.build(load.index)
+    return load
+
+
+def _publish_manual(load: ManualLoad, build_ms: float) -> Dict[str, object]:
+    """Swap in a new snapshot; searches already running keep the index they started with."""
+
+    global MANUAL_INDEX, MANUAL_GENERATION, MANUAL_STATS
+    stats: Dict[str, object] = {
+        "generation": MANUAL_GENERATION + 1,
+        "source": load.source,
+        "path": load.path,
+        "tutorials": len(load.index),
+        "terms": load.index.vocabulary_size,
+        "passages": sum(len(passages) for passages in load.index.passages),
+        "vector_dims": load.index.vectors.dims if load.index.vectors is not None else None,
+        "vector_bytes": load.index.vectors.nbytes if load.index.vectors is not None else None,
+        "build_ms": build_ms,
+        "loaded_at": time.time(),
+    }
+    MANUAL_INDEX = load.index
+    MANUAL_GENERATION += 1
+    if MANUAL_SEARCH_MEMO is not None:
+        MANUAL_SEARCH_MEMO.reset(load.index)
+    MANUAL_STATS = stats
+    logger.info("manual loaded", extra={"fields": stats})
+    return stats
 
 
 def _load_manual_data() -> None:
-    global MANUAL_DATA
-    if not MANUAL_PATH:
-        return
+    started = time.perf_counter()
     try:
-        with open(MANUAL_PATH, "r", encoding="utf-8") as manual_file:
-            parsed = json.load(manual_file)
-        if isinstance(parsed, dict) and "tutorials" in parsed:
-            MANUAL_DATA = parsed
-            print(f"[manual] Loaded {len(parsed.get('tutorials', []))} tutorials from {MANUAL_PATH}")
+        load = _attach_vectors(_read_manual())
     except FileNotFoundError:
-        print(f"[manual] File not found at {MANUAL_PATH}. Skipping manual grounding.")
-    except Exception as exc:  # pragma: no cover - defensive logging
-        print(f"[manual] Failed to load manual: {exc}")
+        logger.warning("manual not found; skipping manual grounding", extra={"fields": {"path": MANUAL_PATH}})
+        return
+    except Exception:  # pragma: no cover - defensive logging
+        logger.exception("failed to load manual", extra={"fields": {"path": MANUAL_PATH}})
+        return
+    if load is not None:
+        _publish_manual(load, elapsed_ms(started))
+
+
+def _manual_signature() -> Tuple[Optional[int], ...]:
+    signature: List[Optional[int]] = []
+    for path in (MANUAL_PATH, MANUAL_INDEX_PATH):
+        try:
+            signature.append(os.stat(path).st_mtime_ns if path else None)
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+async def reload_manual() -> Dict[str, object]:
+    """Rebuild the manual snapshot in a worker thread, then publish it atomically.
+
+    Concurrent reloads are serialized. On failure the current snapshot stays
+    in place and the exception propagates.
+    """
+
+    async with MANUAL_RELOAD_LOCK:
+        started = time.perf_counter()
+        load = await asyncio.to_thread(lambda: _attach_vectors(_read_manual()))
+        if load is None:
+            raise FileNotFoundError("no manual source configured")
+        stats = _publish_manual(load, elapsed_ms(started))
+        # Process workers hold their own copy of the index; recycle them so they load the new one.
+        CPU_EXECUTOR.restart(__name__)
+        return stats
+
+
+async def watch_manual_files(interval: float) -> None:
+    """Reload the manual whenever the JSON or the binary index changes on disk."""
+
+    signature = _manual_signature()
+    while True:
+        await asyncio.sleep(interval)
+        current = _manual_signature()
+        if current == signature:
+            continue
+        signature = current
+        try:
+            await reload_manual()
+        except Exception:
+            logger.exception("manual reload after file change failed")
 
 
 def search_manual_snippet(query: Optional[str]) -> Optional[ManualSnippet]:
-    if not query:
-        return None
+    """The single best excerpt for ``query``."""
 
-    tutorials = MANUAL_DATA.get("tutorials", [])
-    if not tutorials:
-        return None
+    snippets = _search_index(MANUAL_INDEX, query, 1)
+    return snippets[0] if snippets else None
 
-    normalized = query.lower().strip()
-    if len(normalized) < 4:
-        return None
-    terms = [term for term in re.split(r"[\\s,./]+", normalized) if len(term) > 2]
-    if not terms:
-        return None
 
-    best: Optional[Dict[str, str]] = None
-    best_score = 0
-    best_term = ""
+def search_manual_context(query: Optional[str]) -> ManualContext:
+    """Excerpts from up to ``MANUAL_CONTEXT_TOP_K`` tutorials, packed into the grounding budget."""
 
-    for tutorial in tutorials:
-        title = tutorial.get("title", "")
-        learning = tutorial.get("learning", "")
-        if not learning:
-            continue
-        score = 0
-        matched_term = ""
-        lowered_title = title.lower()
-        lowered_learning = learning.lower()
-
-        for term in terms:
-            if term in lowered_title:
-                score += 6
-                matched_term = term
-            if term in lowered_learning:
-                score += 1
-                if not matched_term:
-                    matched_term = term
-
-        if score > best_score:
-            best_score = score
-            best = tutorial
-            best_term = matched_term
-
-    if not best or best_score <= 0:
-        return None
+    return _pack_context(_search_index(MANUAL_INDEX, query, MANUAL_CONTEXT_TOP_K))
 
-    snippet = _trim_manual_snippet(best.get("learning", ""), best_term)
-    if not snippet:
-        return None
 
-    return ManualSnippet(
-        title=best.get("title", "Tally Manual"),
-        learning=snippet,
-        score=best_score,
-    )
+def search_manual_contexts(queries: Sequence[Optional[str]]) -> List[ManualContext]:
+    """Search a whole batch against one index snapshot, looking up each distinct query once."""
 
+    index = MANUAL_INDEX
+    results: Dict[Optional[str], ManualContext] = {}
+    for query in queries:
+        if query not in results:
+            results[query] = _pack_context(_search_index(index, query, MANUAL_CONTEXT_TOP_K))
+    return [results[query] for query in queries]
 
-def _trim_manual_snippet(text: str, term: str) -> str:
-    cleaned = text.strip()
-    if not cleaned:
-        return ""
-    if len(cleaned) <= MANUAL_MAX_SNIPPET_CHARS:
-        return cleaned
 
-    focus = cleaned.lower()
-    if term:
-        idx = focus.find(term.lower())
+def _search_index(index: ManualIndex, query: Optional[str], limit: int) -> List[ManualSnippet]:
+    """Best excerpts from up to ``limit`` different tutorials, best first, near-duplicates removed."""
+
+    if not query:
+        return []
+
+    if not len(index):
+        return []
+
+    normalized = query.strip()
+    if len(normalized) < 4:
+        return []
+    terms = query_terms(normalized)
+    if not terms:
+        return []
+
+    limit = max(1, limit)
+    if MANUAL_SEARCH_MEMO is None:
+        return _rank_excerpts(index, terms, limit)
+    # Searched with the sorted terms as well, so the result depends on nothing but the key.
+    key = memo_key(terms, limit)
+    memoized = MANUAL_SEARCH_MEMO.get(index, key)
+    if memoized is not None:
+        return list(memoized)
+    snippets = _rank_excerpts(index, sorted(terms), limit)
+    MANUAL_SEARCH_MEMO.put(index, key, snippets)
+    return snippets
+
+
+def _rank_excerpts(index: ManualIndex, terms: Sequence[str], limit: int) -> List[ManualSnippet]:
+    """Rank ``index`` for ``terms`` with the configured ranking and cut excerpts from the winners."""
+
+    if MANUAL_RANKING == "vector" and index.vectors is not None:
+        hits = [
+            (hit.doc_id, _vector_span(index, hit), round(hit.score, 4))
+            for hit in index.vectors.search_documents(terms, limit)
+            if hit.score >= MANUAL_VECTOR_MIN_SCORE
+        ]
     else:
-        idx = len(cleaned) // 2
-    if idx == -1:
-        idx = len(cleaned) // 2
-
-    half_window = MANUAL_MAX_SNIPPET_CHARS // 2
-    start = max(0, idx - half_window)
-    end = min(len(cleaned), start + MANUAL_MAX_SNIPPET_CHARS)
-    snippet = cleaned[start:end]
+        if MANUAL_RANKING in {"bm25", "vector"}:
+            ranked = index.rank_bm25(terms, MANUAL_BM25_PARAMS, limit)
+        else:
+            ranked = index.rank(terms, limit)
+        hits = [
+            (hit.doc_id, index.best_span(hit.doc_id, terms, MANUAL_MAX_SNIPPET_CHARS), hit.score)
+            for hit in ranked
+            if hit.score > 0
+        ]
+    if not hits:
+        return []
+
+    floor = hits[0][2] * MANUAL_CONTEXT_MIN_RELATIVE_SCORE
+    snippets: List[ManualSnippet] = []
+    for doc_id, span, score in hits:
+        if snippets and score < floor:
+            break
+        snippet = _format_manual_excerpt(index.bodies[doc_id], span.start, span.end)
+        if snippet:
+            snippets.append(ManualSnippet(title=index.titles[doc_id], learning=snippet, score=score))
+    return drop_overlapping(snippets, lambda snippet: set(query_terms(snippet["learning"])))
+
+
+def _vector_span(index: ManualIndex, hit: VectorHit) -> Passage:
+    """The matched passage, continued with the passages after it while they fit the snippet size.
+
+    A short heading passage is often the closest match; the text under it is what answers the question.
+    """
+
+    limit = hit.start + MANUAL_MAX_SNIPPET_CHARS
+    end = hit.end
+    for passage in index.passages[hit.doc_id]:
+        if passage.end > limit:
+            if passage.start >= hit.start:
+                break
+            continue
+        end = max(end, passage.end)
+    return Passage(hit.start, min(end, limit))
+
+
+def _pack_context(snippets: ManualContext) -> ManualContext:
+    """The best excerpt, trimmed to the prompt budget if need be, plus the most relevant others that fit beside it."""
+
+    if not snippets:
+        return snippets
+    budget = context_budget()
+    top = snippets[0]
+    header = _manual_excerpt_block(ManualSnippet(title=top["title"], learning="", score=top["score"]))
+    best = ManualSnippet(
+        title=top["title"], learning=trim_to_budget(top["learning"].strip(), budget, header), score=top["score"]
+    )
+    room = budget - budget_cost(_manual_excerpt_block(best))
+    others = snippets[1:]
+    if not others or room <= 0:
+        return [best]
+    return [
+        best,
+        *pack(
+            others,
+            [budget_cost(_manual_excerpt_block(snippet)) for snippet in others],
+            [snippet["score"] for snippet in others],
+            room,
+        ),
+    ]
+
+
+def _format_manual_excerpt(text: str, start: int, end: int) -> str:
+    snippet = text[start:end].strip()
+    if not snippet:
+        return ""
     if start > 0:
         snippet = "..." + snippet
-    if end < len(cleaned):
+    if end < len(text):
         snippet = snippet + "..."
     return snippet
 
 
-def _attach_manual_context(question: str, manual_context: Optional[ManualSnippet]) -> str:
-    if not manual_context:
+def _attach_manual_context(question: str, manual_context: ManualContext) -> str:
+    snippets = [snippet for snippet in manual_context or [] if snippet["learning"].strip()]
+    if not snippets:
         return question
     question = (question or "").rstrip()
-    snippet = manual_context["learning"].strip()
-    if not snippet:
-        return question
-    title = manual_context["title"]
+    excerpts = "\n\n".join(_manual_excerpt_block(snippet) for snippet in snippets)
+    subject, unanswered = (
+        ("this knowledge excerpt when it is", "the excerpt does not")
+        if len(snippets) == 1
+        else ("these knowledge excerpts when they are", "the excerpts do not")
+    )
     return (
         f"{question}\n\n"
         "---\n"
         "You also have access to the following verified knowledge from the official Tally manual.\n"
-        f"Title: {title}\n"
-        f"Excerpt:\n{snippet}\n"
+        f"{excerpts}\n"
         "---\n"
-        "Ground every factual statement in this knowledge excerpt when it is relevant, and prefer escalation if the excerpt does not answer the question."
+        f"Ground every factual statement in {subject} relevant, and prefer escalation if {unanswered} answer the question."
     )
 
 
+def _manual_excerpt_block(snippet: ManualSnippet) -> str:
+    return f"Title: {snippet['title']}\nExcerpt:\n{snippet['learning'].strip()}"
+
+
+def _manual_titles(manual_context: ManualContext) -> List[str]:
+    return [snippet["title"] for snippet in manual_context or []]
+
+
 _load_manual_data()
 
 
-def _append_manual_reference(answer: str, manual_context: Optional[ManualSnippet]) -> str:
-    if not manual_context:
-        return answer
-    snippet = manual_context["learning"].strip()
-    if not snippet:
+def _append_manual_reference(answer: str, manual_context: ManualContext) -> str:
+    """Cite the same excerpts the upstream prompt was grounded in."""
+
+    sources = [
+        f"• Source: {snippet['title']}\n{snippet['learning'].strip()}"
+        for snippet in manual_context or []
+        if snippet["learning"].strip()
+    ]
+    if not sources:
         return answer
-    title = manual_context["title"]
-    reference = (
-        "\n\n"
-        "Reference Knowledge:\n"
-        f"• Source: {title}\n"
-        f"{snippet}"
-    )
+    reference = "\n\n" + "Reference Knowledge:\n" + "\n\n".join(sources)
     return f"{answer.rstrip()}{reference}"
 
 
@@ -536,13 +1729,3 @@ def _build_unknown_response(issue_text: str) -> str:
     )
     return "\n\n".join([acknowledgement, clarifying, solution]).strip()
 
-
-if __name__ == "__main__":
-    import uvicorn
-
-    uvicorn.run(
-        "proxy_backend.main:app",
-        host="0.0.0.0",
-        port=int(os.getenv("PORT", "8000")),
-        reload=os.getenv("ENV", "development") == "development",
-    )
@@ -0,0 +1,363 @@
+"""Compact, memory-mapped binary form of the manual index.
+
+``python -m proxy_backend.manual_binary [manual.json] [manual.idx]`` compiles
+the manual offline into one file: a UTF-8 text blob, offset tables, a sorted
+term dictionary, IDF values and per-field postings. The proxy maps that file
+read-only, so every worker shares one page-cache copy and startup skips JSON
+parsing and index construction. Text and postings are only decoded for the
+tutorials and terms a request actually touches.
+
+File layout (little-endian)::
+
+    b"TMIX" | u32 version | u32 section count
+    section count x (8-byte name, u64 offset, u64 length)
+    sections, each 8-byte aligned
+"""
+from __future__ import annotations
+
+import argparse
+import bisect
+import functools
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from .manual_index import PASSAGE_TARGET_CHARS, TOKEN_PATTERN, ManualIndex, Passage, Posting
+
+MAGIC = b"TMIX"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<4sII")
+_SECTION = struct.Struct("<8sQQ")
+_DOC_FIELDS = 6  # title offset/length, body offset/length (bytes), title/body token counts
+
+
+class ManualIndexFormatError(ValueError):
+    """The binary index is unreadable, from another format version, or stale."""
+
+
+def _u32(values: Sequence[int]) -> bytes:
+    packed = array("I", values)
+    if packed.itemsize != 4:  # pragma: no cover - exotic platforms
+        raise ManualIndexFormatError("unsigned int is not 32-bit on this platform")
+    if sys.byteorder == "big":  # pragma: no cover
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _f64(values: Sequence[float]) -> bytes:
+    packed = array("d", values)
+    if sys.byteorder == "big":  # pragma: no cover
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _encode_field(
+    terms: Sequence[str], postings: Mapping[str, Mapping[int, Posting]]
+) -> Tuple[bytes, bytes, bytes]:
+    starts: List[int] = [0]
+    entries: List[int] = []
+    positions: List[int] = []
+    for term in terms:
+        for doc_id, posting in sorted(postings.get(term, {}).items()):
+            entries.extend((doc_id, posting.count, len(positions)))
+            positions.extend(posting.positions)
+        starts.append(len(entries) // 3)
+    return _u32(starts), _u32(entries), _u32(positions)
+
+
+def source_signature(manual_path: str) -> Dict[str, object]:
+    stat = os.stat(manual_path)
+    return {"source_size": stat.st_size, "source_mtime_ns": stat.st_mtime_ns}
+
+
+def index_settings() -> Dict[str, object]:
+    """Settings baked into the file; a mismatch means it must be rebuilt."""
+
+    return {
+        "format_version": FORMAT_VERSION,
+        "token_pattern": TOKEN_PATTERN.pattern,
+        "passage_target_chars": PASSAGE_TARGET_CHARS,
+    }
+
+
+def write_manual_index(index: ManualIndex, path: str, source: Optional[Dict[str, object]] = None) -> int:
+    """Serialize ``index`` to ``path`` atomically and return the file size."""
+
+    text = bytearray()
+    docs: List[int] = []
+    for doc_id in range(len(index)):
+        title = index.titles[doc_id].encode("utf-8")
+        body = index.bodies[doc_id].encode("utf-8")
+        docs.extend((len(text), len(title), len(text) + len(title), len(body)))
+        text += title + body
+        docs.extend((index.title_lengths[doc_id], index.body_lengths[doc_id]))
+
+    passage_starts: List[int] = [0]
+    passage_spans: List[int] = []
+    for doc_passages in index.passages:
+        for passage in doc_passages:
+            passage_spans.extend(passage)
+        passage_starts.append(len(passage_spans) // 2)
+
+    terms = sorted(index.idf, key=lambda term: term.encode("utf-8"))
+    term_blob = bytearray()
+    term_offsets: List[int] = [0]
+    for term in terms:
+        term_blob += term.encode("utf-8")
+        term_offsets.append(len(term_blob))
+
+    title_starts, title_entries, title_positions = _encode_field(terms, index.title_postings)
+    body_starts, body_entries, body_positions = _encode_field(terms, index.body_postings)
+    meta = {
+        **index_settings(),
+        **(source or {}),
+        "documents": len(index),
+        "terms": len(terms),
+        "built_at": time.time(),
+        "avg_title_length": index.avg_title_length,
+        "avg_body_length": index.avg_body_length,
+    }
+    sections = [
+        (b"meta", json.dumps(meta).encode("utf-8")),
+        (b"text", bytes(text)),
+        (b"docs", _u32(docs)),
+        (b"pidx", _u32(passage_starts)),
+        (b"pass", _u32(passage_spans)),
+        (b"terms", bytes(term_blob)),
+        (b"toff", _u32(term_offsets)),
+        (b"idf", _f64([index.idf[term] for term in terms])),
+        (b"t_idx", title_starts),
+        (b"t_ent", title_entries),
+        (b"t_pos", title_positions),
+        (b"b_idx", body_starts),
+        (b"b_ent", body_entries),
+        (b"b_pos", body_positions),
+    ]
+
+    offset = _HEADER.size + _SECTION.size * len(sections)
+    table = bytearray(_HEADER.pack(MAGIC, FORMAT_VERSION, len(sections)))
+    body = bytearray()
+    for name, payload in sections:
+        padding = -(offset + len(body)) % 8
+        body += b"\0" * padding
+        table += _SECTION.pack(name, offset + len(body), len(payload))
+        body += payload
+
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as output:
+        output.write(table)
+        output.write(body)
+    os.replace(temporary, path)
+    return len(table) + len(body)
+
+
+class _TermTable:
+    """Binary search over the sorted UTF-8 term dictionary."""
+
+    def __init__(self, blob: memoryview, offsets: memoryview) -> None:
+        self._blob = blob
+        self._offsets = offsets
+        self._keys = _TermKeys(self)
+        # Query vocabularies are small and repetitive; skip the binary search for repeats.
+        self.find = functools.lru_cache(maxsize=4096)(self._find)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def raw(self, index: int) -> bytes:
+        return bytes(self._blob[self._offsets[index] : self._offsets[index + 1]])
+
+    def _find(self, term: str) -> int:
+        key = term.encode("utf-8")
+        index = bisect.bisect_left(self._keys, key)
+        if index < len(self) and self.raw(index) == key:
+            return index
+        return -1
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(len(self)):
+            yield self.raw(index).decode("utf-8")
+
+
+class _TermKeys(Sequence[bytes]):
+    def __init__(self, table: _TermTable) -> None:
+        self._table = table
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def __getitem__(self, index):  # type: ignore[override]
+        return self._table.raw(index)
+
+
+class _PostingsView(Mapping[str, Dict[int, Posting]]):
+    """Read-only ``term -> {doc_id: Posting}`` decoded from the mapped arrays on lookup.
+
+    Positions are zero-copy slices of the mapped position array.
+    """
+
+    def __init__(self, terms: _TermTable, starts: memoryview, entries: memoryview, positions: memoryview) -> None:
+        self._terms = terms
+        self._starts = starts
+        self._entries = entries
+        self._positions = positions
+
+    def __getitem__(self, term: str) -> Dict[int, Posting]:
+        index = self._terms.find(term)
+        if index < 0 or self._starts[index] == self._starts[index + 1]:
+            raise KeyError(term)
+        entries = self._entries
+        positions = self._positions
+        postings: Dict[int, Posting] = {}
+        for base in range(self._starts[index] * 3, self._starts[index + 1] * 3, 3):
+            doc_id, count, start = entries[base], entries[base + 1], entries[base + 2]
+            postings[doc_id] = Posting(doc_id, count, positions[start : start + count])
+        return postings
+
+    def __iter__(self) -> Iterator[str]:
+        for index, term in enumerate(self._terms):
+            if self._starts[index] != self._starts[index + 1]:
+                yield term
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class _IdfView(Mapping[str, float]):
+    def __init__(self, terms: _TermTable, values: memoryview) -> None:
+        self._terms = terms
+        self._values = values
+
+    def __getitem__(self, term: str) -> float:
+        index = self._terms.find(term)
+        if index < 0:
+            raise KeyError(term)
+        return self._values[index]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._terms)
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+
+class _TextView(Sequence[str]):
+    """Titles or bodies decoded from the text blob on access."""
+
+    def __init__(self, text: memoryview, docs: memoryview, field: int) -> None:
+        self._text = text
+        self._docs = docs
+        self._field = field
+
+    def __len__(self) -> int:
+        return len(self._docs) // _DOC_FIELDS
+
+    def __getitem__(self, doc_id):  # type: ignore[override]
+        base = doc_id * _DOC_FIELDS + self._field
+        start, length = self._docs[base], self._docs[base + 1]
+        return bytes(self._text[start : start + length]).decode("utf-8")
+
+
+class _PassageView(Sequence[Tuple[Passage, ...]]):
+    def __init__(self, starts: memoryview, spans: memoryview) -> None:
+        self._starts = starts
+        self._spans = spans
+
+    def __len__(self) -> int:
+        return len(self._starts) - 1
+
+    def __getitem__(self, doc_id):  # type: ignore[override]
+        return tuple(
+            Passage(self._spans[2 * index], self._spans[2 * index + 1])
+            for index in range(self._starts[doc_id], self._starts[doc_id + 1])
+        )
+
+
+class MappedManualIndex(ManualIndex):
+    """:class:`ManualIndex` backed by a read-only memory map."""
+
+    def __init__(self, path: str, handle: mmap.mmap, meta: Dict[str, object], sections: Dict[str, memoryview]) -> None:
+        self.path = path
+        self.meta = meta
+        self._mmap = handle
+        terms = _TermTable(sections["terms"], sections["toff"].cast("I"))
+        docs = sections["docs"].cast("I")
+        super().__init__(
+            titles=_TextView(sections["text"], docs, 0),
+            bodies=_TextView(sections["text"], docs, 2),
+            title_postings=_PostingsView(
+                terms, sections["t_idx"].cast("I"), sections["t_ent"].cast("I"), sections["t_pos"].cast("I")
+            ),
+            body_postings=_PostingsView(
+                terms, sections["b_idx"].cast("I"), sections["b_ent"].cast("I"), sections["b_pos"].cast("I")
+            ),
+            title_lengths=docs[4::_DOC_FIELDS],
+            body_lengths=docs[5::_DOC_FIELDS],
+            passages=_PassageView(sections["pidx"].cast("I"), sections["pass"].cast("I")),
+            idf=_IdfView(terms, sections["idf"].cast("d")),
+        )
+
+
+def load_manual_index(path: str, source_path: Optional[str] = None) -> MappedManualIndex:
+    """Map ``path`` read-only; reject it if it is stale relative to ``source_path``."""
+
+    if sys.byteorder == "big":  # pragma: no cover
+        raise ManualIndexFormatError("binary manual index is little-endian only")
+    with open(path, "rb") as index_file:
+        handle = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(handle)
+    try:
+        magic, version, count = _HEADER.unpack_from(view, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ManualIndexFormatError(f"unsupported manual index format in {path}")
+        sections: Dict[str, memoryview] = {}
+        for number in range(count):
+            name, offset, length = _SECTION.unpack_from(view, _HEADER.size + number * _SECTION.size)
+            sections[name.rstrip(b"\0").decode("ascii")] = view[offset : offset + length]
+        meta = json.loads(bytes(sections["meta"]))
+    except (struct.error, KeyError, ValueError) as exc:
+        raise ManualIndexFormatError(f"corrupt manual index {path}: {exc}") from exc
+
+    for key, expected in index_settings().items():
+        if meta.get(key) != expected:
+            raise ManualIndexFormatError(f"manual index {path} was built with {key}={meta.get(key)!r}")
+    if source_path and os.path.exists(source_path):
+        for key, expected in source_signature(source_path).items():
+            if meta.get(key) != expected:
+                raise ManualIndexFormatError(f"manual index {path} is older than {source_path}")
+    return MappedManualIndex(path, handle, meta, sections)
+
+
+def build_from_json(source_path: str, output_path: str) -> Dict[str, object]:
+    started = time.perf_counter()
+    with open(source_path, "r", encoding="utf-8") as manual_file:
+        parsed = json.load(manual_file)
+    index = ManualIndex.build(parsed.get("tutorials", []) if isinstance(parsed, dict) else [])
+    size = write_manual_index(index, output_path, source_signature(source_path))
+    return {
+        "output": output_path,
+        "documents": len(index),
+        "terms": index.vocabulary_size,
+        "bytes": size,
+        "build_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    default_source = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "assets", "tally_manual.json"))
+    parser = argparse.ArgumentParser(description="Compile the Tally manual into a memory-mappable index.")
+    parser.add_argument("source", nargs="?", default=os.getenv("TALLY_MANUAL_PATH", default_source))
+    parser.add_argument("output", nargs="?", help="Defaults to the source path with an .idx extension.")
+    args = parser.parse_args(argv)
+    output = args.output or os.path.splitext(args.source)[0] + ".idx"
+    print(json.dumps(build_from_json(args.source, output)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
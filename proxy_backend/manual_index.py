@@ -0,0 +1,323 @@
+"""Inverted index over the Tally manual used for grounding lookups.
+
+The index is built once when the manual is loaded so request-time searches
+only touch the postings of the query terms instead of lowercasing and
+rescanning every tutorial body.
+"""
+from __future__ import annotations
+
+import bisect
+import heapq
+import math
+import re
+from typing import TYPE_CHECKING, Dict, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from .manual_vectors import PassageVectors
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+MIN_TERM_LENGTH = 3
+TITLE_MATCH_SCORE = 6
+BODY_MATCH_SCORE = 1
+DEFAULT_TITLE = "Tally Manual"
+PASSAGE_TARGET_CHARS = 600
+BLOCK_SEPARATOR_PATTERN = re.compile(r"\n[ \t]*\n")
+HEADING_PATTERN = re.compile(r"#{1,6}\s")
+
+
+class BM25Params(NamedTuple):
+    """BM25F knobs: saturation ``k1`` plus per-field weight and length normalization."""
+
+    k1: float = 1.2
+    title_weight: float = 3.0
+    body_weight: float = 1.0
+    title_b: float = 0.5
+    body_b: float = 0.75
+
+
+class Posting(NamedTuple):
+    """Occurrences of a term inside a single tutorial field."""
+
+    doc_id: int
+    count: int
+    positions: Sequence[int]
+
+
+class Passage(NamedTuple):
+    """Character span ``[start, end)`` of a passage inside a tutorial body."""
+
+    start: int
+    end: int
+
+
+class SearchHit(NamedTuple):
+    """Best-matching tutorial and its ranking score."""
+
+    doc_id: int
+    score: float
+
+
+def fold_term(token: str) -> str:
+    """Normalize a lowercased token so simple plurals share one posting list."""
+
+    if len(token) > 4 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> Iterator[Tuple[str, int]]:
+    """Yield ``(term, offset)`` pairs; offsets index into the original text."""
+
+    for match in TOKEN_PATTERN.finditer(text):
+        yield fold_term(match.group().lower()), match.start()
+
+
+def query_terms(query: str) -> List[str]:
+    """Split a free-text query into the terms used for index lookups."""
+
+    return [term for term, _ in tokenize(query) if len(term) >= MIN_TERM_LENGTH]
+
+
+def _build_postings(texts: Sequence[str]) -> Tuple[Dict[str, Dict[int, Posting]], Tuple[int, ...]]:
+    positions: Dict[str, Dict[int, List[int]]] = {}
+    lengths: List[int] = []
+    for doc_id, text in enumerate(texts):
+        length = 0
+        for term, offset in tokenize(text):
+            positions.setdefault(term, {}).setdefault(doc_id, []).append(offset)
+            length += 1
+        lengths.append(length)
+    postings = {
+        term: {
+            doc_id: Posting(doc_id, len(offsets), tuple(offsets))
+            for doc_id, offsets in docs.items()
+        }
+        for term, docs in positions.items()
+    }
+    return postings, tuple(lengths)
+
+
+def _blocks(body: str) -> Iterator[Passage]:
+    """Yield the non-blank paragraphs of ``body`` with surrounding whitespace trimmed."""
+
+    cursor = 0
+    for separator in [*BLOCK_SEPARATOR_PATTERN.finditer(body), None]:
+        stop = separator.start() if separator else len(body)
+        chunk = body[cursor:stop]
+        stripped = chunk.strip()
+        if stripped:
+            start = cursor + (len(chunk) - len(chunk.lstrip()))
+            yield Passage(start, start + len(stripped))
+        if separator:
+            cursor = separator.end()
+
+
+def split_passages(body: str, target_chars: int = PASSAGE_TARGET_CHARS) -> Tuple[Passage, ...]:
+    """Group paragraphs into passages of roughly ``target_chars``.
+
+    Markdown headings always open a new passage. When a passage is closed
+    because it grew too long, its last paragraph is repeated at the start of
+    the next one so matches near a boundary keep some context.
+    """
+
+    passages: List[Passage] = []
+    current: List[Passage] = []
+    for block in _blocks(body):
+        is_heading = HEADING_PATTERN.match(body, block.start) is not None
+        if current and (is_heading or block.end - current[0].start > target_chars):
+            passages.append(Passage(current[0].start, current[-1].end))
+            current = current[-1:] if not is_heading and len(current) > 1 else []
+        current.append(block)
+    if current:
+        passages.append(Passage(current[0].start, current[-1].end))
+    return tuple(passages)
+
+
+def _top_hits(scores: Mapping[int, float], limit: int) -> List[SearchHit]:
+    """Highest scores first; ties go to the earlier tutorial."""
+
+    best = heapq.nsmallest(limit, scores, key=lambda doc_id: (-scores[doc_id], doc_id))
+    return [SearchHit(doc_id, scores[doc_id]) for doc_id in best]
+
+
+def _average(values: Sequence[int]) -> float:
+    return (sum(values) / len(values)) if values else 0.0
+
+
+class ManualIndex:
+    """Immutable term → postings index over tutorial titles and bodies."""
+
+    # Dense passage embeddings for MANUAL_RANKING=vector, attached after the index is built.
+    vectors: Optional["PassageVectors"] = None
+
+    def __init__(
+        self,
+        titles: Sequence[str],
+        bodies: Sequence[str],
+        title_postings: Mapping[str, Mapping[int, Posting]],
+        body_postings: Mapping[str, Mapping[int, Posting]],
+        title_lengths: Sequence[int],
+        body_lengths: Sequence[int],
+        passages: Sequence[Sequence[Passage]],
+        idf: Optional[Mapping[str, float]] = None,
+    ) -> None:
+        self.titles = titles
+        self.bodies = bodies
+        self.title_postings = title_postings
+        self.body_postings = body_postings
+        self.title_lengths = title_lengths
+        self.body_lengths = body_lengths
+        self.passages = passages
+        self.avg_title_length = _average(title_lengths)
+        self.avg_body_length = _average(body_lengths)
+        self.idf = idf if idf is not None else self._compute_idf()
+
+    @classmethod
+    def build(cls, tutorials: Sequence[Mapping[str, str]]) -> "ManualIndex":
+        titles: List[str] = []
+        bodies: List[str] = []
+        for tutorial in tutorials:
+            body = (tutorial.get("learning") or "").strip()
+            if not body:
+                continue
+            titles.append(tutorial.get("title") or DEFAULT_TITLE)
+            bodies.append(body)
+        title_postings, title_lengths = _build_postings(titles)
+        body_postings, body_lengths = _build_postings(bodies)
+        passages = [split_passages(body) for body in bodies]
+        return cls(titles, bodies, title_postings, body_postings, title_lengths, body_lengths, passages)
+
+    def __len__(self) -> int:
+        return len(self.bodies)
+
+    @property
+    def vocabulary_size(self) -> int:
+        return len(self.idf)
+
+    def _compute_idf(self) -> Dict[str, float]:
+        total = len(self.bodies)
+        idf: Dict[str, float] = {}
+        for term in self.title_postings.keys() | self.body_postings.keys():
+            frequency = len(self.title_postings.get(term, {}).keys() | self.body_postings.get(term, {}).keys())
+            idf[term] = math.log(1.0 + (total - frequency + 0.5) / (frequency + 0.5))
+        return idf
+
+    def rank(self, terms: Sequence[str], limit: int) -> List[SearchHit]:
+        """The ``limit`` best tutorials touched by ``terms``, best first.
+
+        A term found in the title is worth ``TITLE_MATCH_SCORE`` and a term
+        found in the body ``BODY_MATCH_SCORE``; ties go to the earlier
+        tutorial, matching the original linear scan.
+        """
+
+        scores: Dict[int, int] = {}
+        for term in terms:
+            for doc_id in self.title_postings.get(term, {}):
+                scores[doc_id] = scores.get(doc_id, 0) + TITLE_MATCH_SCORE
+            for doc_id in self.body_postings.get(term, {}):
+                scores[doc_id] = scores.get(doc_id, 0) + BODY_MATCH_SCORE
+        return _top_hits(scores, limit)
+
+    def rank_bm25(self, terms: Sequence[str], params: BM25Params = BM25Params(), limit: int = 1) -> List[SearchHit]:
+        """The ``limit`` best tutorials by BM25F over the title and body fields, best first.
+
+        Term frequencies are length-normalized per field, combined with the
+        field weights, saturated with ``k1`` and scaled by the term's IDF.
+        """
+
+        accumulators: Dict[int, float] = {}
+        for term in dict.fromkeys(terms):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            title_docs = self.title_postings.get(term, {})
+            body_docs = self.body_postings.get(term, {})
+            for doc_id in title_docs.keys() | body_docs.keys():
+                weighted_tf = 0.0
+                title_posting = title_docs.get(doc_id)
+                if title_posting:
+                    weighted_tf += params.title_weight * title_posting.count / self._norm(
+                        params.title_b, self.title_lengths[doc_id], self.avg_title_length
+                    )
+                body_posting = body_docs.get(doc_id)
+                if body_posting:
+                    weighted_tf += params.body_weight * body_posting.count / self._norm(
+                        params.body_b, self.body_lengths[doc_id], self.avg_body_length
+                    )
+                contribution = idf * weighted_tf / (params.k1 + weighted_tf)
+                accumulators[doc_id] = accumulators.get(doc_id, 0.0) + contribution
+
+        return [SearchHit(hit.doc_id, round(hit.score, 4)) for hit in _top_hits(accumulators, limit)]
+
+    @staticmethod
+    def _norm(b: float, length: int, average: float) -> float:
+        if average <= 0:
+            return 1.0
+        return 1.0 - b + b * length / average
+
+    def best_span(self, doc_id: int, terms: Sequence[str], max_chars: int) -> Passage:
+        """Return the body span of the best-scoring passages within ``max_chars``.
+
+        Passages are scored from the body postings of ``terms``. The best one
+        is widened with adjacent passages that also match while the merged
+        span fits; a single passage longer than the budget is windowed
+        around its first matching term.
+        """
+
+        passages = self.passages[doc_id]
+        if not passages:
+            return Passage(0, min(len(self.bodies[doc_id]), max_chars))
+
+        term_positions = [
+            (self.idf.get(term, 0.0), posting.positions)
+            for term in dict.fromkeys(terms)
+            for posting in [self.body_postings.get(term, {}).get(doc_id)]
+            if posting
+        ]
+        scores = [self._passage_score(passage, term_positions) for passage in passages]
+        best = max(range(len(passages)), key=lambda index: (scores[index], -index))
+        start, end = passages[best]
+        if end - start > max_chars:
+            return self._window(passages[best], term_positions, max_chars)
+
+        low = high = best
+        while True:
+            candidates = []
+            if low > 0 and scores[low - 1] > 0 and end - passages[low - 1].start <= max_chars:
+                candidates.append((scores[low - 1], 0, low - 1))
+            if high + 1 < len(passages) and scores[high + 1] > 0 and passages[high + 1].end - start <= max_chars:
+                candidates.append((scores[high + 1], 1, high + 1))
+            if not candidates:
+                break
+            _, following, index = max(candidates)
+            if following:
+                high, end = index, passages[index].end
+            else:
+                low, start = index, passages[index].start
+        return Passage(start, end)
+
+    @staticmethod
+    def _passage_score(passage: Passage, term_positions: Sequence[Tuple[float, Sequence[int]]]) -> float:
+        score = 0.0
+        for idf, positions in term_positions:
+            count = bisect.bisect_left(positions, passage.end) - bisect.bisect_left(positions, passage.start)
+            if count:
+                score += idf * (1.0 + math.log(count))
+        return score
+
+    @staticmethod
+    def _window(
+        passage: Passage,
+        term_positions: Sequence[Tuple[float, Sequence[int]]],
+        max_chars: int,
+    ) -> Passage:
+        focus = passage.start
+        inside = [
+            positions[bisect.bisect_left(positions, passage.start)]
+            for _, positions in term_positions
+            if bisect.bisect_left(positions, passage.start) < bisect.bisect_left(positions, passage.end)
+        ]
+        if inside:
+            focus = min(inside)
+        start = max(passage.start, min(focus - max_chars // 2, passage.end - max_chars))
+        return Passage(start, start + max_chars)
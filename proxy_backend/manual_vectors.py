@@ -0,0 +1,216 @@
+"""Dense vector retrieval over manual passages (``MANUAL_RANKING=vector``).
+
+Every passage becomes a TF-IDF vector over the manual vocabulary. Term
+frequency is sublinear, and the tutorial title is folded into each of its
+passages. The TF-IDF matrix is projected onto its top
+``MANUAL_VECTOR_DIMS`` singular directions (latent semantic analysis).
+Terms that keep appearing together in the manual, such as "bill" and
+"invoice", then end up close to each other, so a paraphrase still finds
+the passage. The result is stored as one L2-normalized float32 matrix.
+A query costs one matrix-vector product plus an ``argpartition`` for the
+top k.
+
+Everything runs locally on CPU. NumPy is an optional dependency; without
+it the proxy ranks with BM25 instead.
+"""
+from __future__ import annotations
+
+import math
+import os
+from collections import Counter
+from typing import Dict, List, NamedTuple, Sequence
+
+from .manual_index import MIN_TERM_LENGTH, ManualIndex, tokenize
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without the optional dependency
+    np = None
+
+MANUAL_VECTOR_DIMS = int(os.getenv("MANUAL_VECTOR_DIMS", "128"))
+# Only the terms found in the most passages get a column; rarer ones rarely help a paraphrase.
+MANUAL_VECTOR_MAX_TERMS = int(os.getenv("MANUAL_VECTOR_MAX_TERMS", "8192"))
+MANUAL_VECTOR_TITLE_WEIGHT = float(os.getenv("MANUAL_VECTOR_TITLE_WEIGHT", "2.0"))
+# Cosine similarity below which the best passage is not considered a match.
+MANUAL_VECTOR_MIN_SCORE = float(os.getenv("MANUAL_VECTOR_MIN_SCORE", "0.25"))
+SVD_OVERSAMPLES = 10
+SVD_POWER_ITERATIONS = 2
+SVD_SEED = 20240601
+
+
+def numpy_available() -> bool:
+    """Vector ranking needs the optional ``numpy`` package."""
+
+    return np is not None
+
+
+class VectorHit(NamedTuple):
+    """A passage and its cosine similarity to the query; ``start``/``end`` index the tutorial body."""
+
+    doc_id: int
+    start: int
+    end: int
+    score: float
+
+
+def _terms(text: str) -> List[str]:
+    return [term for term, _ in tokenize(text) if len(term) >= MIN_TERM_LENGTH]
+
+
+class PassageVectors:
+    """L2-normalized passage embeddings plus what is needed to embed a query the same way."""
+
+    def __init__(
+        self,
+        vocabulary: Dict[str, int],
+        idf: "np.ndarray",
+        projection: "np.ndarray",
+        matrix: "np.ndarray",
+        spans: "np.ndarray",
+    ) -> None:
+        self.vocabulary = vocabulary
+        self.idf = idf
+        # Term → latent space (terms x dims) and the passage embeddings (passages x dims).
+        self.projection = projection
+        self.matrix = matrix
+        # One (doc_id, start, end) row per passage, grouped by tutorial.
+        self.spans = spans
+        # First passage row of every tutorial that has passages, for per-tutorial maxima.
+        self._doc_starts = np.flatnonzero(np.diff(spans[:, 0], prepend=-1)) if len(spans) else spans[:0, 0]
+
+    def __len__(self) -> int:
+        return int(self.matrix.shape[0])
+
+    @property
+    def dims(self) -> int:
+        return int(self.matrix.shape[1])
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.projection.nbytes + self.matrix.nbytes + self.spans.nbytes + self.idf.nbytes)
+
+    @classmethod
+    def build(
+        cls,
+        index: ManualIndex,
+        dims: int = MANUAL_VECTOR_DIMS,
+        max_terms: int = MANUAL_VECTOR_MAX_TERMS,
+        title_weight: float = MANUAL_VECTOR_TITLE_WEIGHT,
+    ) -> "PassageVectors":
+        if np is None:
+            raise RuntimeError("vector ranking needs numpy")
+        counts: List[Counter] = []
+        spans: List[Sequence[int]] = []
+        for doc_id, body in enumerate(index.bodies):
+            title_terms = _terms(index.titles[doc_id])
+            for passage in index.passages[doc_id]:
+                passage_counts: Counter = Counter(_terms(body[passage.start : passage.end]))
+                for term in title_terms:
+                    passage_counts[term] += title_weight
+                counts.append(passage_counts)
+                spans.append((doc_id, passage.start, passage.end))
+
+        frequency: Counter = Counter()
+        for passage_counts in counts:
+            frequency.update(passage_counts.keys())
+        kept = sorted(frequency, key=lambda term: (-frequency[term], term))[:max_terms]
+        vocabulary = {term: column for column, term in enumerate(kept)}
+        total = len(counts)
+        idf = np.array(
+            [math.log((1 + total) / (1 + frequency[term])) + 1.0 for term in kept], dtype=np.float32
+        )
+
+        tfidf = np.zeros((total, len(kept)), dtype=np.float32)
+        for row, passage_counts in enumerate(counts):
+            columns = [vocabulary[term] for term in passage_counts if term in vocabulary]
+            weights = [1.0 + math.log(passage_counts[term]) for term in passage_counts if term in vocabulary]
+            tfidf[row, columns] = weights
+        tfidf *= idf
+        _normalize_rows(tfidf)
+
+        projection = _truncated_svd_basis(tfidf, dims)
+        matrix = tfidf @ projection
+        _normalize_rows(matrix)
+        return cls(vocabulary, idf, projection, np.ascontiguousarray(matrix), np.array(spans, dtype=np.int64))
+
+    def embed(self, terms: Sequence[str]) -> "np.ndarray":
+        """Unit query vector in the latent space; all zeros when no term is in the vocabulary."""
+
+        counts = Counter(term for term in terms if term in self.vocabulary)
+        vector = np.zeros(self.dims, dtype=np.float32)
+        if not counts:
+            return vector
+        columns = [self.vocabulary[term] for term in counts]
+        weights = np.array([1.0 + math.log(count) for count in counts.values()], dtype=np.float32)
+        weights *= self.idf[columns]
+        vector = weights @ self.projection[columns]
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else vector
+
+    def search(self, terms: Sequence[str], k: int = 1) -> List[VectorHit]:
+        """The ``k`` passages most similar to ``terms``, best first."""
+
+        query = self.embed(terms)
+        if k <= 0 or not len(self) or not query.any():
+            return []
+        scores = self.matrix @ query
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        # Highest score first; ties go to the earlier passage, like the other rankings.
+        return self._hits(scores, top)
+
+    def search_documents(self, terms: Sequence[str], k: int = 1) -> List[VectorHit]:
+        """The best passage of each of the ``k`` tutorials whose best passage is most similar, best first."""
+
+        query = self.embed(terms)
+        if k <= 0 or not len(self) or not query.any():
+            return []
+        scores = self.matrix @ query
+        best = np.maximum.reduceat(scores, self._doc_starts)
+        if k < len(best):
+            documents = np.argpartition(-best, k - 1)[:k]
+        else:
+            documents = np.arange(len(best))
+        ends = np.append(self._doc_starts[1:], len(scores))
+        rows = np.array(
+            [start + int(np.argmax(scores[start:end])) for start, end in zip(self._doc_starts[documents], ends[documents])],
+            dtype=np.int64,
+        )
+        return self._hits(scores, rows)
+
+    def _hits(self, scores: "np.ndarray", rows: "np.ndarray") -> List[VectorHit]:
+        # Highest score first; ties go to the earlier passage, like the other rankings.
+        ordered = rows[np.lexsort((rows, -scores[rows]))]
+        return [
+            VectorHit(int(self.spans[row, 0]), int(self.spans[row, 1]), int(self.spans[row, 2]), float(scores[row]))
+            for row in ordered
+        ]
+
+
+def _normalize_rows(matrix: "np.ndarray") -> None:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+
+
+def _truncated_svd_basis(matrix: "np.ndarray", dims: int) -> "np.ndarray":
+    """Top right singular vectors of ``matrix`` (columns x dims) by randomized SVD.
+
+    A full SVD of the passage-term matrix would take seconds; a few passes
+    against a random sketch give the leading directions in well under one.
+    The seed is fixed so rebuilding the same manual gives the same vectors.
+    """
+
+    rows, columns = matrix.shape
+    dims = max(1, min(dims, rows, columns))
+    sketch = min(columns, dims + SVD_OVERSAMPLES)
+    generator = np.random.default_rng(SVD_SEED)
+    basis = matrix @ generator.standard_normal((columns, sketch)).astype(np.float32)
+    basis, _ = np.linalg.qr(basis)
+    for _ in range(SVD_POWER_ITERATIONS):
+        basis, _ = np.linalg.qr(matrix.T @ basis)
+        basis, _ = np.linalg.qr(matrix @ basis)
+    _, _, right = np.linalg.svd(basis.T @ matrix, full_matrices=False)
+    return np.ascontiguousarray(right[:dims].T, dtype=np.float32)
@@ -0,0 +1,351 @@
+"""Failure isolation for calls to the upstream AI service.
+
+A cold or degraded upstream otherwise makes every request wait for the full
+HTTP timeout. The circuit breaker stops calling it once the recent error
+rate is too high, and the adaptive deadline cuts individual calls off at a
+multiple of recently observed latency instead of the fixed worst case.
+Transient failures are retried with jittered backoff and slow calls can be
+hedged, both paid for from a shared retry budget so they cannot multiply
+load during an outage.
+"""
+from __future__ import annotations
+
+import asyncio
+import collections
+import enum
+import math
+import os
+import random
+import time
+from typing import Awaitable, Callable, Deque, Dict, Optional, Set, Tuple, TypeVar
+
+import httpx
+
+T = TypeVar("T")
+
+UPSTREAM_BREAKER_ENABLED = os.getenv("UPSTREAM_BREAKER_ENABLED", "true").strip().lower() in {"1", "true", "yes", "on"}
+# Open once at least MIN_REQUESTS calls in the last WINDOW_SECONDS failed at FAILURE_RATE or more.
+UPSTREAM_BREAKER_FAILURE_RATE = float(os.getenv("UPSTREAM_BREAKER_FAILURE_RATE", "0.5"))
+UPSTREAM_BREAKER_WINDOW_SECONDS = float(os.getenv("UPSTREAM_BREAKER_WINDOW_SECONDS", "30"))
+UPSTREAM_BREAKER_MIN_REQUESTS = int(os.getenv("UPSTREAM_BREAKER_MIN_REQUESTS", "10"))
+# How long to short-circuit before letting probe requests through.
+UPSTREAM_BREAKER_OPEN_SECONDS = float(os.getenv("UPSTREAM_BREAKER_OPEN_SECONDS", "15"))
+UPSTREAM_BREAKER_HALF_OPEN_PROBES = int(os.getenv("UPSTREAM_BREAKER_HALF_OPEN_PROBES", "1"))
+# Deadline = clamp(percentile of recent latencies * multiplier, min, HTTP timeout). Calls cut
+# off by the deadline count as taking the deadline, so a slower upstream raises it again.
+UPSTREAM_DEADLINE_PERCENTILE = float(os.getenv("UPSTREAM_DEADLINE_PERCENTILE", "0.99"))
+UPSTREAM_DEADLINE_MULTIPLIER = float(os.getenv("UPSTREAM_DEADLINE_MULTIPLIER", "2.0"))
+# LLM answers routinely take 10-30s; never cut a call off sooner than this.
+UPSTREAM_DEADLINE_MIN_SECONDS = float(os.getenv("UPSTREAM_DEADLINE_MIN_SECONDS", "45"))
+UPSTREAM_LATENCY_SAMPLES = int(os.getenv("UPSTREAM_LATENCY_SAMPLES", "200"))
+# Samples older than this are forgotten, so a quiet spell does not pin the deadline.
+UPSTREAM_LATENCY_MAX_AGE_SECONDS = float(os.getenv("UPSTREAM_LATENCY_MAX_AGE_SECONDS", "600"))
+# Fewer samples than this and the full HTTP timeout applies.
+UPSTREAM_DEADLINE_MIN_SAMPLES = int(os.getenv("UPSTREAM_DEADLINE_MIN_SAMPLES", "20"))
+UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "2"))
+# A 504 can follow a fully generated (and paid for) answer; retrying it resends the whole generation.
+UPSTREAM_RETRY_GATEWAY_TIMEOUT = os.getenv("UPSTREAM_RETRY_GATEWAY_TIMEOUT", "false").strip().lower() in {"1", "true", "yes", "on"}
+# Retries (and hedges) may add at most this fraction of the request rate, plus a small floor.
+UPSTREAM_RETRY_BUDGET_RATIO = float(os.getenv("UPSTREAM_RETRY_BUDGET_RATIO", "0.1"))
+UPSTREAM_RETRY_MIN_PER_SECOND = float(os.getenv("UPSTREAM_RETRY_MIN_PER_SECOND", "0.5"))
+UPSTREAM_RETRY_BUDGET_WINDOW_SECONDS = float(os.getenv("UPSTREAM_RETRY_BUDGET_WINDOW_SECONDS", "10"))
+UPSTREAM_RETRY_BACKOFF_BASE_SECONDS = float(os.getenv("UPSTREAM_RETRY_BACKOFF_BASE_SECONDS", "0.2"))
+UPSTREAM_RETRY_BACKOFF_MAX_SECONDS = float(os.getenv("UPSTREAM_RETRY_BACKOFF_MAX_SECONDS", "2"))
+# Send a second copy of a call still running past this latency percentile; first answer wins.
+UPSTREAM_HEDGE_ENABLED = os.getenv("UPSTREAM_HEDGE_ENABLED", "false").strip().lower() in {"1", "true", "yes", "on"}
+UPSTREAM_HEDGE_PERCENTILE = float(os.getenv("UPSTREAM_HEDGE_PERCENTILE", "0.95"))
+
+# Connect-phase failures: the request never reached the upstream, so sending it again is safe.
+# A connection dropped mid-response (RemoteProtocolError) is not: the answer may already be generated.
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# A proxy in front of the upstream could not reach it or it refused the work outright.
+RETRYABLE_STATUSES = frozenset({502, 503} | ({504} if UPSTREAM_RETRY_GATEWAY_TIMEOUT else set()))
+
+
+class UpstreamUnavailable(Exception):
+    """The upstream was not asked, or gave up on, so the caller should fall back."""
+
+
+class CircuitOpenError(UpstreamUnavailable):
+    pass
+
+
+class DeadlineExceeded(UpstreamUnavailable):
+    pass
+
+
+class CircuitState(str, enum.Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker over a sliding time window of call outcomes.
+
+    Callers ask :meth:`allow` before each call and report the result with
+    :meth:`record`. While open every call is refused until ``open_seconds``
+    have passed; then up to ``half_open_probes`` calls are let through and
+    the first outcome decides between closing and re-opening. Probes that
+    never report back (cancelled callers) are replaced after another
+    ``open_seconds``.
+    """
+
+    def __init__(
+        self,
+        failure_rate: float,
+        window_seconds: float,
+        min_requests: int,
+        open_seconds: float,
+        half_open_probes: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_rate = failure_rate
+        self.window_seconds = window_seconds
+        self.min_requests = max(1, min_requests)
+        self.open_seconds = open_seconds
+        self.half_open_probes = max(1, half_open_probes)
+        self._clock = clock
+        self._outcomes: Deque[Tuple[float, bool]] = collections.deque()
+        self._failures = 0
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probed_at = 0.0
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> CircuitState:
+        if self._state is CircuitState.OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._state = CircuitState.HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def allow(self) -> bool:
+        state = self.state
+        if state is CircuitState.CLOSED:
+            return True
+        if state is CircuitState.HALF_OPEN:
+            now = self._clock()
+            if self._probes >= self.half_open_probes and now - self._probed_at >= self.open_seconds:
+                self._probes = 0
+            if self._probes < self.half_open_probes:
+                self._probes += 1
+                self._probed_at = now
+                return True
+        self.rejected += 1
+        return False
+
+    def record(self, success: bool) -> None:
+        state = self.state
+        if state is CircuitState.HALF_OPEN:
+            if success:
+                self._reset(CircuitState.CLOSED)
+            else:
+                self._trip()
+            return
+        if state is CircuitState.OPEN:
+            # A call admitted before the trip finished late; the window restarts on close anyway.
+            return
+        now = self._clock()
+        self._outcomes.append((now, success))
+        self._failures += not success
+        self._expire(now)
+        total = len(self._outcomes)
+        if total >= self.min_requests and self._failures >= self.failure_rate * total:
+            self._trip()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "state": self.state.value,
+            "window_requests": len(self._outcomes),
+            "window_failures": self._failures,
+            "rejected": self.rejected,
+            "opened": self.opened,
+        }
+
+    def _expire(self, now: float) -> None:
+        horizon = now - self.window_seconds
+        while self._outcomes and self._outcomes[0][0] < horizon:
+            _, success = self._outcomes.popleft()
+            self._failures -= not success
+
+    def _trip(self) -> None:
+        self._reset(CircuitState.OPEN)
+        self._opened_at = self._clock()
+        self.opened += 1
+
+    def _reset(self, state: CircuitState) -> None:
+        self._state = state
+        self._outcomes.clear()
+        self._failures = 0
+        self._probes = 0
+
+
+class LatencyWindow:
+    """The most recent ``size`` latency samples no older than ``max_age`` seconds, for percentile queries."""
+
+    def __init__(
+        self,
+        size: int,
+        max_age: float = UPSTREAM_LATENCY_MAX_AGE_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_age = max_age
+        self._clock = clock
+        self._samples: Deque[Tuple[float, float]] = collections.deque(maxlen=max(1, size))
+
+    def __len__(self) -> int:
+        self._expire()
+        return len(self._samples)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append((self._clock(), seconds))
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        self._expire()
+        if not self._samples:
+            return None
+        ordered = sorted(seconds for _, seconds in self._samples)
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+    def _expire(self) -> None:
+        if self.max_age <= 0:
+            return
+        horizon = self._clock() - self.max_age
+        while self._samples and self._samples[0][0] < horizon:
+            self._samples.popleft()
+
+
+class AdaptiveDeadline:
+    """Per-call deadline that follows recent upstream latency."""
+
+    def __init__(
+        self,
+        latencies: LatencyWindow,
+        ceiling: float,
+        percentile: float = UPSTREAM_DEADLINE_PERCENTILE,
+        multiplier: float = UPSTREAM_DEADLINE_MULTIPLIER,
+        floor: float = UPSTREAM_DEADLINE_MIN_SECONDS,
+        min_samples: int = UPSTREAM_DEADLINE_MIN_SAMPLES,
+    ) -> None:
+        self.latencies = latencies
+        self.ceiling = ceiling
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.floor = min(floor, ceiling)
+        self.min_samples = min_samples
+
+    def seconds(self) -> float:
+        observed = self.latencies.percentile(self.percentile)
+        if observed is None or len(self.latencies) < self.min_samples:
+            return self.ceiling
+        return min(self.ceiling, max(self.floor, observed * self.multiplier))
+
+
+class RetryBudget:
+    """Cap retries at ``ratio`` of recent requests plus ``min_per_second``.
+
+    Every original request is recorded with :meth:`record_request`; each
+    retry or hedge must win :meth:`try_spend`. When the upstream is failing
+    everywhere the budget runs dry and callers fail fast instead of
+    tripling the load.
+    """
+
+    def __init__(
+        self,
+        ratio: float,
+        min_per_second: float,
+        window_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.window_seconds = window_seconds
+        self._clock = clock
+        self._requests: Deque[float] = collections.deque()
+        self._retries: Deque[float] = collections.deque()
+        self.spent = 0
+        self.exhausted = 0
+
+    def record_request(self) -> None:
+        now = self._clock()
+        self._requests.append(now)
+        self._expire(now)
+
+    def try_spend(self) -> bool:
+        now = self._clock()
+        self._expire(now)
+        allowed = self.min_per_second * self.window_seconds + self.ratio * len(self._requests)
+        if len(self._retries) + 1 > allowed:
+            self.exhausted += 1
+            return False
+        self._retries.append(now)
+        self.spent += 1
+        return True
+
+    def _expire(self, now: float) -> None:
+        horizon = now - self.window_seconds
+        for timestamps in (self._requests, self._retries):
+            while timestamps and timestamps[0] < horizon:
+                timestamps.popleft()
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff for the ``attempt``-th retry (1-based)."""
+
+    return random.uniform(0.0, min(cap, base * (2 ** (attempt - 1))))
+
+
+async def hedged(
+    factory: Callable[[], Awaitable[T]],
+    delay: Optional[float],
+    may_hedge: Callable[[], bool],
+    succeeded: Callable[[T], bool] = lambda _: True,
+) -> T:
+    """Await ``factory()``; if it is still running after ``delay``, race a second copy.
+
+    The first result accepted by ``succeeded`` wins and the other call is
+    cancelled. If neither succeeds the last result is returned, or the last
+    exception raised. ``may_hedge`` is asked only when a hedge would be sent.
+    """
+
+    first = asyncio.ensure_future(factory())
+    tasks: Set["asyncio.Future[T]"] = {first}
+    try:
+        if delay is None:
+            return await first
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done or not may_hedge():
+            return await first
+        tasks.add(asyncio.ensure_future(factory()))
+        pending = set(tasks)
+        outcome: Optional["asyncio.Future[T]"] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                outcome = task
+                if task.exception() is None and succeeded(task.result()):
+                    return task.result()
+        assert outcome is not None
+        return outcome.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def create_upstream_breaker() -> Optional[CircuitBreaker]:
+    if not UPSTREAM_BREAKER_ENABLED:
+        return None
+    return CircuitBreaker(
+        UPSTREAM_BREAKER_FAILURE_RATE,
+        UPSTREAM_BREAKER_WINDOW_SECONDS,
+        UPSTREAM_BREAKER_MIN_REQUESTS,
+        UPSTREAM_BREAKER_OPEN_SECONDS,
+        UPSTREAM_BREAKER_HALF_OPEN_PROBES,
+    )
+
+
+def create_retry_budget() -> RetryBudget:
+    return RetryBudget(UPSTREAM_RETRY_BUDGET_RATIO, UPSTREAM_RETRY_MIN_PER_SECOND, UPSTREAM_RETRY_BUDGET_WINDOW_SECONDS)
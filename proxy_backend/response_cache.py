@@ -0,0 +1,279 @@
+"""Cache for upstream answers to repeated issue questions.
+
+Entries are keyed by a hash of the normalized question, the attached manual
+excerpts and a digest of the screenshot. Two backends are available: an
+in-process LRU bounded by total size in bytes, and a SQLite file that
+survives restarts.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Protocol, Tuple
+
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Collapse whitespace and case so trivially different questions share a key."""
+
+    return _WHITESPACE_PATTERN.sub(" ", question or "").strip().lower()
+
+
+def image_digest(image_base64: Optional[str]) -> str:
+    if not image_base64:
+        return ""
+    return hashlib.sha256(image_base64.encode("ascii", "ignore")).hexdigest()
+
+
+def cache_key(question: str, grounding: Optional[str], image: str = "", endpoint: str = "") -> str:
+    """Stable key for an upstream request; ``image`` is an image digest.
+
+    ``grounding`` is the manual text sent with the question, so an answer
+    grounded on an older copy of the manual is never served after a reload.
+    ``endpoint`` keeps answers from different upstream endpoints apart.
+    """
+
+    parts = [normalize_question(question), grounding or "", image]
+    if endpoint:
+        parts.append(endpoint)
+    material = "\x1f".join(parts)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _entry_size(key: str, value: str) -> int:
+    return len(key) + len(value.encode("utf-8"))
+
+
+class CacheBackend(Protocol):
+    # True when calls do I/O and must be kept off the event loop.
+    blocking: bool
+
+    def get(self, key: str) -> Optional[str]: ...
+
+    def set(self, key: str, value: str) -> None: ...
+
+    def clear(self) -> None: ...
+
+    def usage(self) -> Tuple[int, int]:
+        """Return ``(entries, bytes)`` currently held."""
+        ...
+
+
+class MemoryCacheBackend:
+    """LRU with TTL expiry and a cap on the total size of keys and values."""
+
+    blocking = False
+
+    def __init__(self, max_bytes: int, ttl_seconds: float) -> None:
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[str, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at, size = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self._bytes -= size
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        size = _entry_size(key, value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def usage(self) -> Tuple[int, int]:
+        with self._lock:
+            return len(self._entries), self._bytes
+
+
+class SQLiteCacheBackend:
+    """Persistent variant of the LRU; recency is tracked in a ``last_access`` column.
+
+    Hits do not write: their access times are collected and written in one
+    batch every ``TOUCH_BATCH`` hits or before the next store, which is when
+    eviction needs them.
+    """
+
+    blocking = True
+    TOUCH_BATCH = 64
+
+    def __init__(self, path: str, max_bytes: int, ttl_seconds: float) -> None:
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._touched: Dict[str, float] = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS response_cache_lru ON response_cache (last_access)")
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at <= now:
+                self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                self._touched.pop(key, None)
+                return None
+            self._touched[key] = now
+            if len(self._touched) >= self.TOUCH_BATCH:
+                self._flush_touches()
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        size = _entry_size(key, value)
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._touched.pop(key, None)
+            self._flush_touches()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, size, expires_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now + self.ttl_seconds, now),
+            )
+            self._conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (now,))
+            self._evict()
+
+    def _flush_touches(self) -> None:
+        if not self._touched:
+            return
+        self._conn.executemany(
+            "UPDATE response_cache SET last_access = ? WHERE key = ?",
+            [(accessed, key) for key, accessed in self._touched.items()],
+        )
+        self._touched.clear()
+
+    def _evict(self) -> None:
+        (total,) = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM response_cache").fetchone()
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM response_cache ORDER BY last_access").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+            total -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._touched.clear()
+            self._conn.execute("DELETE FROM response_cache")
+
+    def usage(self) -> Tuple[int, int]:
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM response_cache"
+            ).fetchone()
+        return entries, total
+
+
+class ResponseCache:
+    """Backend wrapper that counts hits, misses and stores."""
+
+    def __init__(self, backend: Optional[CacheBackend]) -> None:
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def get(self, key: str) -> Optional[str]:
+        if self.backend is None:
+            return None
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        if self.backend is None:
+            return
+        self.backend.set(key, value)
+        self.stores += 1
+
+    async def aget(self, key: str) -> Optional[str]:
+        """:meth:`get` for async callers; a blocking backend runs in a worker thread."""
+
+        if self.backend is not None and self.backend.blocking:
+            return await asyncio.to_thread(self.get, key)
+        return self.get(key)
+
+    async def aset(self, key: str, value: str) -> None:
+        if self.backend is not None and self.backend.blocking:
+            await asyncio.to_thread(self.set, key, value)
+        else:
+            self.set(key, value)
+
+    async def astats(self) -> Dict[str, object]:
+        if self.backend is not None and self.backend.blocking:
+            return await asyncio.to_thread(self.stats)
+        return self.stats()
+
+    def stats(self) -> Dict[str, object]:
+        entries, size = self.backend.usage() if self.backend is not None else (0, 0)
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__ if self.backend is not None else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+def create_response_cache(enabled: bool, max_bytes: int, ttl_seconds: float, sqlite_path: str = "") -> ResponseCache:
+    if not enabled or max_bytes <= 0 or ttl_seconds <= 0:
+        return ResponseCache(None)
+    if sqlite_path:
+        return ResponseCache(SQLiteCacheBackend(sqlite_path, max_bytes, ttl_seconds))
+    return ResponseCache(MemoryCacheBackend(max_bytes, ttl_seconds))
@@ -0,0 +1,97 @@
+"""Memo of manual search results keyed by the query's terms.
+
+Issue texts repeat heavily, e.g. the "your issue" fallback summary or common
+ticket titles. Most of them tokenize to a term list the manual has already
+been searched for. The memo maps the sorted term list (duplicates kept,
+since the legacy and vector rankings count them) to the excerpts found. A
+repeated question then skips ranking and excerpt selection, even when its
+answer still has to come from the upstream.
+
+Entries belong to one index snapshot. Publishing a new manual resets the
+memo, and a search still running against the previous snapshot neither
+reads nor fills it. This is unrelated to the response cache: that one stores
+upstream answers, this one stores search results only.
+
+With ``CPU_EXECUTOR=process`` each worker process keeps its own memo. It
+still saves the ranking work, but its hit and miss counts stay in the
+worker, so the proxy does not report them in that mode.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Generic, Hashable, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Distinct term lists remembered; 0 turns the memo off.
+MANUAL_SEARCH_MEMO_ENTRIES = int(os.getenv("MANUAL_SEARCH_MEMO_ENTRIES", "4096"))
+
+
+def memo_key(terms: Sequence[str], limit: int) -> Tuple[Hashable, ...]:
+    """Key for a search of ``terms`` returning up to ``limit`` excerpts; word order does not matter."""
+
+    return (limit, *sorted(terms))
+
+
+class SearchMemo(Generic[T]):
+    """LRU of search results for the current index snapshot, bounded by entry count."""
+
+    def __init__(self, max_entries: int, snapshot: object = None) -> None:
+        self.max_entries = max_entries
+        self._snapshot = snapshot
+        self._entries: "OrderedDict[Hashable, Tuple[T, ...]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.resets = 0
+
+    def reset(self, snapshot: object) -> None:
+        """Forget everything and start remembering results for ``snapshot``."""
+
+        with self._lock:
+            self._snapshot = snapshot
+            self._entries.clear()
+            self.resets += 1
+
+    def get(self, snapshot: object, key: Hashable) -> Optional[Tuple[T, ...]]:
+        with self._lock:
+            if snapshot is not self._snapshot:
+                return None
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, snapshot: object, key: Hashable, results: Sequence[T]) -> None:
+        with self._lock:
+            if snapshot is not self._snapshot:
+                return
+            self._entries[key] = tuple(results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "resets": self.resets,
+            }
+
+
+def create_search_memo(snapshot: object) -> Optional[SearchMemo]:
+    """``None`` when MANUAL_SEARCH_MEMO_ENTRIES is 0, which searches every time as before."""
+
+    if MANUAL_SEARCH_MEMO_ENTRIES <= 0:
+        return None
+    return SearchMemo(MANUAL_SEARCH_MEMO_ENTRIES, snapshot)
@@ -0,0 +1,96 @@
+"""Single-pass parsing of the mandatory answer sections."""
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Pattern, Sequence, Tuple
+
+
+class Section(NamedTuple):
+    """One header occurrence in an answer.
+
+    ``header`` is the canonical spelling from the required header list,
+    ``start``/``end`` span the header markup plus its content and
+    ``content`` is the stripped text up to the next recognised header.
+    """
+
+    header: str
+    start: int
+    end: int
+    content: str
+
+
+@lru_cache(maxsize=8)
+def _header_pattern(headers: Tuple[str, ...]) -> Tuple[Pattern[str], Dict[str, str]]:
+    """One alternation over every header, tolerant of casing and markdown.
+
+    ``Solution:``, ``solution:``, ``**Solution:**``, ``**Solution**:``,
+    ``__Solution__:`` and ``## Solution:`` all match. The header must start a
+    word so ``Resolution:`` is not mistaken for ``Solution:``.
+    """
+
+    canonical: Dict[str, str] = {}
+    names: List[str] = []
+    for header in headers:
+        name = header.rstrip(":").strip()
+        canonical[" ".join(name.lower().split())] = header
+        names.append(r"\s+".join(re.escape(word) for word in name.split()))
+    # Leading markup is picked up by _markup_start; keeping it out of the pattern
+    # lets the regex engine skip ahead to candidate words instead of trying every offset.
+    pattern = re.compile(
+        # Not preceded by a letter or digit; unlike \b this lets "__" emphasis come first.
+        r"(?<![^\W_])(?P<name>" + "|".join(names) + r")[ \t]*[*_]{0,3}[ \t]*:[*_]{0,3}",
+        re.IGNORECASE,
+    )
+    return pattern, canonical
+
+
+def _markup_start(text: str, start: int) -> int:
+    """Move ``start`` back over ``**``/``__`` emphasis and a ``##`` heading marker."""
+
+    floor = max(0, start - 3)
+    while start > floor and text[start - 1] in "*_":
+        start -= 1
+    probe = start
+    while probe > 0 and text[probe - 1] in " \t":
+        probe -= 1
+    if probe > 0 and text[probe - 1] == "#":
+        while probe > 0 and text[probe - 1] == "#":
+            probe -= 1
+        return probe
+    return start
+
+
+def parse_sections(text: str, headers: Sequence[str]) -> List[Section]:
+    """Split ``text`` into sections at every occurrence of one of ``headers``.
+
+    Text before the first header is ignored. Runs in one regex scan, so the
+    cost stays linear in the answer length however many headers there are.
+    """
+
+    pattern, canonical = _header_pattern(tuple(headers))
+    matches = list(pattern.finditer(text))
+    starts = [_markup_start(text, match.start()) for match in matches] + [len(text)]
+    sections: List[Section] = []
+    for index, match in enumerate(matches):
+        end = starts[index + 1]
+        header = canonical[" ".join(match.group("name").lower().split())]
+        sections.append(Section(header, starts[index], end, text[match.end() : end].strip()))
+    return sections
+
+
+def section_contents(sections: Sequence[Section]) -> Dict[str, str]:
+    """First non-empty content per header; headers that only appear empty map to ``""``."""
+
+    contents: Dict[str, str] = {}
+    for section in sections:
+        if not contents.get(section.header):
+            contents[section.header] = section.content
+    return contents
+
+
+def missing_sections(sections: Sequence[Section], headers: Sequence[str]) -> List[str]:
+    """Headers that never appeared or only appeared with empty content."""
+
+    contents = section_contents(sections)
+    return [header for header in headers if not contents.get(header)]
@@ -0,0 +1,127 @@
+"""Structured, sampled logging that never blocks the event loop on I/O.
+
+Records are pushed onto a bounded queue by a ``QueueHandler`` and written as
+JSON lines by a ``QueueListener`` thread. Large request fields are reduced to
+sizes, previews and digests before they are logged.
+"""
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+from typing import Dict, Mapping, Optional, Union
+
+LOGGER_NAME = "proxy_backend"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").strip().upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Comma separated LEVEL=rate pairs, e.g. "DEBUG=0.01,INFO=0.25". Unlisted levels are always kept.
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+LOG_PREVIEW_CHARS = int(os.getenv("LOG_PREVIEW_CHARS", "160"))
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def parse_sample_rates(spec: str) -> Dict[int, float]:
+    rates: Dict[int, float] = {}
+    for item in spec.split(","):
+        name, _, rate = item.partition("=")
+        level = logging.getLevelName(name.strip().upper())
+        if isinstance(level, int) and rate.strip():
+            rates[level] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a configured fraction of records per level; warnings and up are never sampled out by default."""
+
+    def __init__(self, rates: Mapping[int, float]) -> None:
+        super().__init__()
+        self.rates = dict(rates)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.levelno, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of blocking when the writer falls behind."""
+
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if isinstance(fields, Mapping):
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging() -> logging.Logger:
+    """Attach the queue handler to the package logger once per process."""
+
+    global _listener
+    logger = logging.getLogger(LOGGER_NAME)
+    if _listener is not None:
+        return logger
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    writer = logging.StreamHandler(sys.stdout)
+    writer.setFormatter(JsonFormatter())
+    _listener = logging.handlers.QueueListener(log_queue, writer, respect_handler_level=False)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(parse_sample_rates(LOG_SAMPLE_RATES)))
+    logger.addHandler(handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+    return logger
+
+
+def preview(text: Optional[str], limit: int = LOG_PREVIEW_CHARS) -> str:
+    text = text or ""
+    return text if len(text) <= limit else f"{text[:limit]}…"
+
+
+def summarize_upstream_payload(upstream_payload: Mapping[str, Union[str, bytes]]) -> Dict[str, object]:
+    """Log-safe view of an upstream payload: the image is reduced to size and digest."""
+
+    question = str(upstream_payload.get("question") or "")
+    summary: Dict[str, object] = {
+        "question_chars": len(question),
+        "question_preview": preview(question),
+    }
+    image = upstream_payload.get("image")
+    if image:
+        summary["image_b64_bytes"] = len(image)
+        # Uploaded images are already bytes; hashing them directly avoids another full copy.
+        encoded = image if isinstance(image, bytes) else image.encode("ascii", "ignore")
+        summary["image_sha256"] = hashlib.sha256(encoded).hexdigest()[:16]
+    return summary
+
+
+def elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 2)
@@ -0,0 +1,172 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from proxy_backend import main
+from proxy_backend.admission import AdmissionController, Overloaded, Priority
+from proxy_backend.main import AskRequest, _client_key
+from proxy_backend.response_cache import create_response_cache
+from proxy_backend.singleflight import SingleFlight
+
+
+def _controller(**overrides) -> AdmissionController:
+    options = dict(max_concurrent=1, max_queue=16, max_queue_per_client=8, queue_timeout=30)
+    options.update(overrides)
+    return AdmissionController(**options)
+
+
+async def _queue(controller, granted, name, client, priority=Priority.INTERACTIVE):
+    await controller.acquire(client, priority)
+    granted.append((name, priority))
+
+
+async def _drain(controller, granted, tasks):
+    """Hand the single slot from the interactive holder to each queued task in turn; return the admission order."""
+
+    for _ in tasks:
+        controller.release(granted[-1][1] if granted else Priority.INTERACTIVE)
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    return [name for name, _ in granted]
+
+
+def test_clients_are_served_round_robin():
+    async def scenario():
+        controller = _controller()
+        await controller.acquire("holder")
+        granted = []
+        tasks = []
+        for name, client in [("a1", "a"), ("a2", "a"), ("a3", "a"), ("b1", "b")]:
+            tasks.append(asyncio.ensure_future(_queue(controller, granted, name, client)))
+            await asyncio.sleep(0)
+        return await _drain(controller, granted, tasks)
+
+    assert asyncio.run(scenario()) == ["a1", "b1", "a2", "a3"]
+
+
+def test_interactive_requests_go_before_background_ones():
+    async def scenario():
+        controller = _controller()
+        await controller.acquire("holder")
+        granted = []
+        tasks = []
+        for name, priority in [("bg", Priority.BACKGROUND), ("live", Priority.INTERACTIVE)]:
+            tasks.append(asyncio.ensure_future(_queue(controller, granted, name, name, priority)))
+            await asyncio.sleep(0)
+        return await _drain(controller, granted, tasks), controller.promoted
+
+    assert asyncio.run(scenario()) == (["live", "bg"], 0)
+
+
+def test_starving_background_request_is_promoted(clock):
+    async def scenario():
+        controller = _controller(background_max_wait=20, clock=clock)
+        await controller.acquire("holder")
+        granted = []
+        tasks = [asyncio.ensure_future(_queue(controller, granted, "bg", "bg", Priority.BACKGROUND))]
+        await asyncio.sleep(0)
+        clock.now = 25
+        tasks.append(asyncio.ensure_future(_queue(controller, granted, "live", "live")))
+        await asyncio.sleep(0)
+        return await _drain(controller, granted, tasks), controller.promoted
+
+    assert asyncio.run(scenario()) == (["bg", "live"], 1)
+
+
+def test_background_calls_keep_slots_free_for_agents():
+    async def scenario():
+        controller = _controller(max_concurrent=4, background_share=0.5)
+        for _ in range(2):
+            await controller.acquire("coach", Priority.BACKGROUND)
+        waiting = asyncio.ensure_future(controller.acquire("coach", Priority.BACKGROUND))
+        await asyncio.sleep(0)
+        await controller.acquire("agent")
+        background_waiting = controller.queued_for(Priority.BACKGROUND)
+        controller.release(Priority.BACKGROUND)
+        await waiting
+        return background_waiting, controller.active_for(Priority.BACKGROUND), controller.active
+
+    assert asyncio.run(scenario()) == (1, 2, 3)
+
+
+def test_one_client_flooding_gets_429_while_a_full_queue_gets_503():
+    async def scenario():
+        controller = _controller(max_queue=3, max_queue_per_client=2)
+        await controller.acquire("holder")
+        tasks = [asyncio.ensure_future(controller.acquire("noisy")) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as per_client:
+            await controller.acquire("noisy")
+        tasks.append(asyncio.ensure_future(controller.acquire("quiet")))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as everyone:
+            await controller.acquire("other")
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return per_client.value, everyone.value, controller.queued
+
+    per_client, everyone, queued = asyncio.run(scenario())
+    assert (per_client.status_code, per_client.reason) == (429, "client_queue_full")
+    assert (everyone.status_code, everyone.reason) == (503, "queue_full")
+    assert queued == 0
+
+
+def test_waiting_past_the_queue_deadline_gives_503():
+    async def scenario():
+        controller = _controller(queue_timeout=0.01)
+        await controller.acquire("holder")
+        with pytest.raises(Overloaded) as timed_out:
+            await controller.acquire("late")
+        return timed_out.value, controller.queued, controller.rejected
+
+    error, queued, rejected = asyncio.run(scenario())
+    assert (error.status_code, error.reason) == (503, "queue_timeout")
+    assert queued == 0
+    assert rejected == {"queue_timeout": 1}
+
+
+@pytest.mark.parametrize(
+    "ticket_id, key", [(0, "addr:10.0.0.7"), ("", "addr:10.0.0.7"), (None, "addr:10.0.0.7"), (42, "ticket:42")]
+)
+def test_client_key_ignores_unfocused_ticket(ticket_id, key):
+    request = SimpleNamespace(headers={}, client=SimpleNamespace(host="10.0.0.7"))
+
+    assert _client_key(AskRequest(question="q", ticket_id=ticket_id), request) == key
+
+
+def test_coalesced_duplicates_do_not_hold_admission_slots(monkeypatch):
+    release = None
+    calls = []
+
+    async def request_upstream_answer(upstream_payload):
+        calls.append(upstream_payload["question"])
+        await release.wait()
+        return f"answer to {upstream_payload['question']}"
+
+    monkeypatch.setattr(main, "_request_upstream_answer", request_upstream_answer)
+    monkeypatch.setattr(main, "UPSTREAM_FLIGHTS", SingleFlight())
+    monkeypatch.setattr(main, "RESPONSE_CACHE", create_response_cache(True, 1 << 20, 60))
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        controller = _controller(max_concurrent=1)
+        monkeypatch.setattr(main, "UPSTREAM_ADMISSION", controller)
+        duplicates = [
+            asyncio.ensure_future(main.fetch_cached_upstream_answer(AskRequest(question="same"), [], f"agent{index}"))
+            for index in range(5)
+        ]
+        other = asyncio.ensure_future(main.fetch_cached_upstream_answer(AskRequest(question="other"), [], "agent9"))
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        held = (controller.active, controller.queued)
+        release.set()
+        return held, await asyncio.gather(*duplicates), await other
+
+    held, answers, other = asyncio.run(scenario())
+    assert held == (1, 1)
+    assert answers == ["answer to same"] * 5
+    assert other == "answer to other"
+    assert calls == ["same", "other"]
@@ -0,0 +1,83 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from proxy_backend import main
+
+ANSWER = (
+    "Issue Acknowledgement:\nThe invoice will not print.\n\n"
+    "Clarifying Question:\nWhich printer is selected?\n\n"
+    "Solution:\n- Step 1: Open the print preview."
+)
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Fake upstream: a question ``"wait <seconds> ..."`` is answered after that long. Tracks concurrency."""
+
+    seen = {"active": 0, "peak": 0}
+
+    async def answer(payload, manual_context, client, priority):
+        seen["active"] += 1
+        seen["peak"] = max(seen["peak"], seen["active"])
+        try:
+            await asyncio.sleep(float(payload.question.split()[1]))
+        finally:
+            seen["active"] -= 1
+        return ANSWER
+
+    monkeypatch.setattr(main, "_upstream_answer", answer)
+    return seen
+
+
+def _lines(response):
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_invalid_items_fail_alone_and_results_stream_in_completion_order(upstream):
+    items = [
+        {"question": "wait 0.2 invoice not printing"},
+        {"question": 42},
+        {"question": "wait 0.0 invoice not printing"},
+        {"question": "wait 0.1 invoice not printing"},
+    ]
+
+    lines = _lines(TestClient(main.app).post("/ask/batch", json={"items": items}))
+
+    assert [line["index"] for line in lines] == [1, 2, 3, 0]
+    assert lines[0]["error"]["status"] == 422
+    assert all(line["answer"] == ANSWER and not line["fallback"] for line in lines[1:])
+
+
+def test_batch_respects_the_concurrency_limit(upstream, monkeypatch):
+    monkeypatch.setattr(main, "ASK_BATCH_CONCURRENCY", 2)
+    items = [{"question": f"wait 0.05 ledger {index} missing"} for index in range(6)]
+
+    lines = _lines(TestClient(main.app).post("/ask/batch", json={"items": items}))
+
+    assert sorted(line["index"] for line in lines) == list(range(6))
+    assert upstream["peak"] == 2
+
+
+def test_oversized_batch_is_refused_before_parsing(upstream, monkeypatch):
+    monkeypatch.setattr(main, "ASK_BATCH_MAX_BYTES", 1024)
+    items = [{"question": "wait 0 screenshot attached", "image_base64": "A" * 600} for _ in range(2)]
+    client = TestClient(main.app)
+
+    declared = client.post("/ask/batch", json={"items": items})
+    body = json.dumps({"items": items}).encode("utf-8")
+    chunked = client.post("/ask/batch", content=iter([body[:512], body[512:]]))
+
+    assert (declared.status_code, chunked.status_code) == (413, 413)
+    assert upstream["peak"] == 0
+
+
+def test_malformed_batch_is_a_422():
+    client = TestClient(main.app)
+
+    assert client.post("/ask/batch", content=b"{not json").status_code == 422
+    assert client.post("/ask/batch", json={"items": []}).status_code == 422
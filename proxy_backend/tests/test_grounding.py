@@ -0,0 +1,61 @@
+import pytest
+
+from proxy_backend import grounding
+from proxy_backend.grounding import drop_overlapping, pack, trim_to_budget
+from proxy_backend.main import ManualSnippet, _manual_excerpt_block, _pack_context
+
+
+def _snippet(title, length, score):
+    words = " ".join(f"{title.lower()}{index}" for index in range(length))
+    return ManualSnippet(title=title, learning=words[:length], score=score)
+
+
+def test_pack_takes_the_most_valuable_set_that_fits():
+    assert pack(["a", "b", "c"], [50, 50, 100], [3.0, 3.0, 5.0], 100) == ["a", "b"]
+    assert pack(["a", "b", "c"], [50, 50, 100], [1.0, 1.0, 5.0], 100) == ["c"]
+
+
+def test_pack_keeps_input_order_and_skips_what_cannot_fit():
+    assert pack(["a", "b", "c"], [25, 200, 25], [1.0, 9.0, 2.0], 100) == ["a", "c"]
+    assert pack(["a"], [101], [1.0], 100) == []
+
+
+def test_drop_overlapping_keeps_the_first_of_near_duplicates():
+    terms = {"gst": {"gst", "return", "filing"}, "copy": {"gst", "return", "filing", "boilerplate"}, "bank": {"bank"}}
+
+    assert drop_overlapping(["gst", "copy", "bank"], terms.get, max_overlap=0.6) == ["gst", "bank"]
+    assert drop_overlapping(["gst", "copy", "bank"], terms.get, max_overlap=0.8) == ["gst", "copy", "bank"]
+
+
+def test_trim_to_budget_cuts_at_a_word_and_counts_the_header():
+    header = "Title: T\nExcerpt:\n"
+    trimmed = trim_to_budget("alpha beta gamma delta", 32, header)
+
+    assert trimmed == "alpha beta..."
+    assert len(header + trimmed) <= 32
+    assert trim_to_budget("short", 32, header) == "short"
+
+
+def test_best_excerpt_goes_first_even_when_it_alone_fills_the_budget(monkeypatch):
+    monkeypatch.setattr(grounding, "MANUAL_CONTEXT_BUDGET_CHARS", 1800)
+    best = _snippet("Payments and Receipts", 1800, 10.0)
+    runner_up = _snippet("Receipt Notes", 600, 6.0)
+
+    context = _pack_context([best, runner_up])
+
+    assert [snippet["title"] for snippet in context] == ["Payments and Receipts"]
+    assert context[0]["learning"].endswith("...")
+    assert len(_manual_excerpt_block(context[0])) <= 1800
+
+
+@pytest.mark.parametrize("budget", [1800, 3600])
+def test_remaining_room_is_shared_by_the_others(monkeypatch, budget):
+    monkeypatch.setattr(grounding, "MANUAL_CONTEXT_BUDGET_CHARS", budget)
+    snippets = [_snippet("Best", 900, 10.0), _snippet("Long", 1500, 9.0), _snippet("Short", 500, 6.0)]
+
+    context = _pack_context(snippets)
+
+    expected = ["Best", "Short"] if budget == 1800 else ["Best", "Long", "Short"]
+    assert [snippet["title"] for snippet in context] == expected
+    assert context[0] == snippets[0]
+    assert sum(len(_manual_excerpt_block(snippet)) for snippet in context) <= budget
@@ -0,0 +1,92 @@
+import asyncio
+import base64
+import hashlib
+
+import pytest
+
+from proxy_backend.image_upload import (
+    ImageTooLarge,
+    UnsupportedImage,
+    UploadError,
+    decode_image_base64,
+    read_image_upload,
+)
+
+BOUNDARY = "form-7f3a"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+# Contains a near-miss of the part separator, which must stay image data.
+PNG = b"\x89PNG\r\n\x1a\n" + b"\r\n--form-7f" + bytes(range(256)) * 4 + b"\r\n--"
+
+
+def _part(name, data, extra=""):
+    header = f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"{extra}\r\n\r\n'
+    return header.encode("ascii") + data + b"\r\n"
+
+
+def _body(*parts):
+    return b"".join(parts) + f"--{BOUNDARY}--\r\n".encode("ascii")
+
+
+def _upload(body, chunk_size, **options):
+    async def chunks():
+        for start in range(0, len(body), chunk_size):
+            yield body[start : start + chunk_size]
+
+    return asyncio.run(read_image_upload(CONTENT_TYPE, chunks(), **options))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 13, 64, 1 << 20])
+def test_fields_and_image_survive_any_chunk_boundary(chunk_size):
+    body = _body(
+        _part("question", "Invoice screen shows an error — पुनः".encode("utf-8")),
+        _part("image", PNG, '; filename="screen.png"\r\nContent-Type: image/png'),
+        _part("ticket_id", b"42"),
+    )
+
+    upload = _upload(body, chunk_size)
+
+    assert upload.fields == {"question": "Invoice screen shows an error — पुनः", "ticket_id": "42"}
+    assert bytes(upload.image.data) == PNG
+    assert upload.image.media_type == "image/png"
+    assert upload.image.sha256 == hashlib.sha256(PNG).hexdigest()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 77])
+def test_base64_image_field_is_decoded_incrementally(chunk_size):
+    encoded = base64.encodebytes(PNG)  # wrapped at 76 columns, as mail-style encoders do
+    upload = _upload(_body(_part("question", b"q"), _part("image_base64", encoded)), chunk_size)
+
+    assert bytes(upload.image.data) == PNG
+
+
+def test_oversized_image_is_rejected_with_413():
+    with pytest.raises(ImageTooLarge):
+        _upload(_body(_part("image", PNG)), 64, max_image_bytes=len(PNG) - 1)
+
+
+def test_declared_length_over_the_limit_is_rejected_before_reading():
+    with pytest.raises(ImageTooLarge):
+        _upload(b"", 1, content_length=1 << 40)
+
+
+def test_non_image_data_is_rejected_with_415():
+    with pytest.raises(UnsupportedImage):
+        _upload(_body(_part("image", b"%PDF-1.7 not a screenshot")), 8)
+
+
+def test_truncated_body_is_a_400():
+    body = _body(_part("question", b"q"))
+    with pytest.raises(UploadError) as error:
+        _upload(body[: -len("--\r\n")], 16)
+    assert error.value.status_code == 400
+
+
+def test_second_image_is_rejected():
+    with pytest.raises(UploadError):
+        _upload(_body(_part("image", PNG), _part("image_base64", base64.b64encode(PNG))), 32)
+
+
+def test_decode_image_base64_round_trips():
+    image = decode_image_base64(base64.b64encode(PNG).decode("ascii"))
+
+    assert (bytes(image.data), image.media_type) == (PNG, "image/png")
@@ -0,0 +1,52 @@
+import pytest
+
+from proxy_backend.issue_keywords import KeywordAutomaton
+from proxy_backend.main import IssueCategory, detect_issue
+
+
+@pytest.mark.parametrize(
+    "text, category",
+    [
+        ("Tally crashed after update", IssueCategory.SYSTEM),
+        ("installing tally fails", IssueCategory.SYSTEM),
+        ("licensing popup on every start", IssueCategory.SYSTEM),
+        ("billing totals look wrong today", IssueCategory.FUNCTIONAL),
+        ("bank statement not reconciled", IssueCategory.FUNCTIONAL),
+        ("ledgers imported twice from excel", IssueCategory.FUNCTIONAL),
+        ("nothing exported from the day book", IssueCategory.FUNCTIONAL),
+        ("invoicing stops at the last line", IssueCategory.FUNCTIONAL),
+        ("e-invoice not generating", IssueCategory.FUNCTIONAL),
+        ("taxable value mismatch", IssueCategory.FUNCTIONAL),
+        ("GSTIN rejected on the party ledger", IssueCategory.FUNCTIONAL),
+        ("reinstalled tally still failing", IssueCategory.SYSTEM),
+        ("uninstall tally", IssueCategory.SYSTEM),
+        ("tally running slowly", IssueCategory.SYSTEM),
+        ("please call me back tomorrow", IssueCategory.UNKNOWN),
+    ],
+)
+def test_detect_issue_accepts_inflections(text, category):
+    assert detect_issue(text).category is category
+
+
+def test_keywords_respect_word_boundaries():
+    automaton = KeywordAutomaton({"system": ["500", "entry"], "functional": ["tax", "gstr"]})
+
+    assert [match.keyword for match in automaton.find("error 500 while saving")] == ["500"]
+    assert automaton.find("paid 1500 in cash") == []
+    assert automaton.find("taxonomy of accounts") == []
+    assert [match.keyword for match in automaton.find("re-entry of the voucher")] == ["entry"]
+    assert [match.keyword for match in automaton.find("GSTR-1 filing")] == ["gstr"]
+
+
+def test_inflected_match_spans_the_whole_word():
+    automaton = KeywordAutomaton({"functional": ["invoice", "reconcile"]})
+
+    spans = [(match.keyword, match.start, match.end) for match in automaton.find("invoicing, invoices; reconciled")]
+    assert spans == [("invoice", 0, 9), ("invoice", 11, 19), ("reconcile", 21, 31)]
+
+
+def test_keyword_in_several_categories_reports_each():
+    automaton = KeywordAutomaton({"system": ["screen"], "functional": ["screen", "blank screen"]})
+
+    found = sorted((match.keyword, match.category) for match in automaton.find("blank screen"))
+    assert found == [("blank screen", "functional"), ("screen", "functional"), ("screen", "system")]
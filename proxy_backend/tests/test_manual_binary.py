@@ -0,0 +1,56 @@
+import json
+import os
+
+import pytest
+
+from proxy_backend.benchmarks.corpus import MANUAL_PATH, query_corpus
+from proxy_backend.manual_binary import ManualIndexFormatError, build_from_json, load_manual_index
+from proxy_backend.manual_index import BM25Params, ManualIndex, query_terms
+
+pytestmark = pytest.mark.skipif(not os.path.exists(MANUAL_PATH), reason="the Tally manual is not checked out")
+
+
+@pytest.fixture(scope="module")
+def indexes(tmp_path_factory):
+    with open(MANUAL_PATH, "r", encoding="utf-8") as manual_file:
+        built = ManualIndex.build(json.load(manual_file)["tutorials"])
+    path = str(tmp_path_factory.mktemp("manual") / "manual.idx")
+    build_from_json(MANUAL_PATH, path)
+    return built, load_manual_index(path, MANUAL_PATH)
+
+
+def test_mapped_index_holds_the_same_documents(indexes):
+    built, mapped = indexes
+
+    assert len(mapped) == len(built)
+    assert list(mapped.titles) == list(built.titles)
+    assert list(mapped.bodies) == list(built.bodies)
+    assert [tuple(passages) for passages in mapped.passages] == [tuple(passages) for passages in built.passages]
+    assert list(mapped.title_lengths) == list(built.title_lengths)
+    assert list(mapped.body_lengths) == list(built.body_lengths)
+    assert mapped.vocabulary_size == built.vocabulary_size
+    assert dict(mapped.idf) == pytest.approx(dict(built.idf))
+
+
+def test_mapped_index_ranks_like_the_built_one(indexes):
+    built, mapped = indexes
+
+    for query in query_corpus():
+        terms = query_terms(query)
+        assert mapped.rank(terms, 3) == built.rank(terms, 3), query
+        assert mapped.rank_bm25(terms, BM25Params(), 3) == built.rank_bm25(terms, BM25Params(), 3), query
+        for hit in built.rank(terms, 3):
+            assert mapped.best_span(hit.doc_id, terms, 1800) == built.best_span(hit.doc_id, terms, 1800), query
+
+
+def test_stale_or_foreign_files_are_rejected(indexes, tmp_path):
+    _, mapped = indexes
+    source = tmp_path / "manual.json"
+    source.write_text(json.dumps({"tutorials": []}), encoding="utf-8")
+    with pytest.raises(ManualIndexFormatError):
+        load_manual_index(mapped.path, str(source))
+
+    garbage = tmp_path / "garbage.idx"
+    garbage.write_bytes(b"not an index at all")
+    with pytest.raises(ManualIndexFormatError):
+        load_manual_index(str(garbage))
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import os
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from proxy_backend import main
+from proxy_backend.main import AskRequest
+from proxy_backend.response_cache import create_response_cache
+from proxy_backend.search_memo import SearchMemo
+
+GST = {"title": "GST Returns", "learning": "File GSTR-1 from the GST returns report after checking every voucher."}
+BANK = {"title": "Bank Reconciliation", "learning": "Reconcile the bank ledger against the statement date by date."}
+ADMIN = {"X-Admin-Token": "secret"}
+
+
+def _write(path, tutorials):
+    path.write_text(json.dumps({"tutorials": tutorials}), encoding="utf-8")
+    # Force a new mtime even on filesystems with coarse timestamps.
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+@pytest.fixture
+def manual(tmp_path, monkeypatch):
+    """A published two-tutorial manual read from a temporary JSON file; module state is restored afterwards."""
+
+    for name in ("MANUAL_INDEX", "MANUAL_GENERATION", "MANUAL_STATS"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+    path = tmp_path / "manual.json"
+    _write(path, [GST, BANK])
+    monkeypatch.setattr(main, "MANUAL_PATH", str(path))
+    monkeypatch.setattr(main, "MANUAL_INDEX_PATH", "")
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(main, "MANUAL_SEARCH_MEMO", SearchMemo(16))
+    monkeypatch.setattr(main, "RESPONSE_CACHE", create_response_cache(True, 1 << 20, 60))
+    asyncio.run(main.reload_manual())
+    return path
+
+
+def _titles(query):
+    return [snippet["title"] for snippet in main.search_manual_context(query)]
+
+
+def test_admin_reload_publishes_the_new_manual(manual):
+    _write(manual, [dict(GST, title="GSTR-1 Filing"), BANK])
+    client = TestClient(main.app)
+
+    reloaded = client.post("/admin/manual/reload", headers=ADMIN)
+
+    assert reloaded.status_code == 200
+    assert (reloaded.json()["tutorials"], reloaded.json()["source"]) == (2, "json")
+    assert client.get("/admin/manual", headers=ADMIN).json()["generation"] == reloaded.json()["generation"]
+    assert _titles("GST returns voucher") == ["GSTR-1 Filing"]
+    assert client.post("/admin/manual/reload").status_code == 401
+
+
+def test_searches_see_the_old_manual_until_the_new_one_is_complete(manual, monkeypatch):
+    _write(manual, [dict(GST, title="GSTR-1 Filing"), BANK])
+    reading, finish = threading.Event(), threading.Event()
+    read_manual = main._read_manual
+
+    def slow_read():
+        reading.set()
+        finish.wait(5)
+        return read_manual()
+
+    monkeypatch.setattr(main, "_read_manual", slow_read)
+
+    async def scenario():
+        reload = asyncio.ensure_future(main.reload_manual())
+        await asyncio.to_thread(reading.wait, 5)
+        during = _titles("GST returns voucher")
+        finish.set()
+        await reload
+        return during, _titles("GST returns voucher")
+
+    assert asyncio.run(scenario()) == (["GST Returns"], ["GSTR-1 Filing"])
+
+
+def test_corrupt_manual_keeps_the_old_index_and_reports_the_error(manual):
+    index, stats = main.MANUAL_INDEX, main.MANUAL_STATS
+    manual.write_text("{not json", encoding="utf-8")
+
+    failed = TestClient(main.app).post("/admin/manual/reload", headers=ADMIN)
+
+    assert failed.status_code == 500
+    assert "previous manual is still active" in failed.json()["detail"]
+    assert (main.MANUAL_INDEX, main.MANUAL_STATS) == (index, stats)
+    assert _titles("GST returns voucher") == ["GST Returns"]
+
+
+def test_watcher_reloads_on_change_and_survives_a_bad_file(manual):
+    async def scenario():
+        generation = main.MANUAL_GENERATION
+        watcher = asyncio.ensure_future(main.watch_manual_files(0.01))
+        await asyncio.sleep(0.05)
+        manual.write_text("{not json", encoding="utf-8")
+        await asyncio.sleep(0.05)
+        after_bad_file = main.MANUAL_GENERATION
+        _write(manual, [dict(GST, title="GSTR-1 Filing"), BANK])
+        for _ in range(100):
+            if main.MANUAL_GENERATION != after_bad_file:
+                break
+            await asyncio.sleep(0.01)
+        watcher.cancel()
+        return generation, after_bad_file, main.MANUAL_GENERATION
+
+    before, after_bad_file, after = asyncio.run(scenario())
+    assert after_bad_file == before
+    assert after == before + 1
+    assert _titles("GST returns voucher") == ["GSTR-1 Filing"]
+
+
+def test_publish_invalidates_memoized_searches_and_answers_grounded_on_changed_text(manual):
+    gst, bank = AskRequest(question="GST returns voucher"), AskRequest(question="bank ledger reconcile")
+
+    def cache_key(payload):
+        return main._response_cache_key(payload, main.search_manual_context(payload.question))
+
+    main.RESPONSE_CACHE.set(cache_key(gst), "old GST answer")
+    main.RESPONSE_CACHE.set(cache_key(bank), "bank answer")
+    assert main.MANUAL_SEARCH_MEMO.stats()["entries"] == 2
+
+    _write(manual, [dict(GST, learning=GST["learning"] + " Then upload the JSON to the GST portal."), BANK])
+    asyncio.run(main.reload_manual())
+
+    assert main.MANUAL_SEARCH_MEMO.stats()["entries"] == 0
+    assert main.RESPONSE_CACHE.get(cache_key(gst)) is None
+    assert main.RESPONSE_CACHE.get(cache_key(bank)) == "bank answer"
@@ -0,0 +1,26 @@
+import pytest
+
+from proxy_backend.metrics import Metric, Registry
+
+
+def test_metric_without_samples_cannot_be_created():
+    class Incomplete(Metric):
+        kind = "counter"
+
+    with pytest.raises(TypeError):
+        Incomplete("proxy_incomplete", "Never rendered.")
+
+
+def test_registry_renders_each_kind():
+    registry = Registry()
+    registry.counter("proxy_requests", "Requests.", ["status"]).inc(status=200)
+    registry.gauge("proxy_depth", "Depth.", function=lambda: 3)
+    registry.histogram("proxy_seconds", "Seconds.", buckets=(0.1, 1.0)).observe(0.5)
+
+    rendered = registry.render()
+
+    assert 'proxy_requests_total{status="200"} 1' in rendered
+    assert "proxy_depth 3" in rendered
+    assert 'proxy_seconds_bucket{le="0.1"} 0' in rendered
+    assert 'proxy_seconds_bucket{le="1"} 1' in rendered
+    assert "proxy_seconds_count 1" in rendered
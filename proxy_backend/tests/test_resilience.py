@@ -0,0 +1,228 @@
+import asyncio
+import random
+
+import httpx
+import pytest
+
+from proxy_backend import main
+from proxy_backend.resilience import (
+    AdaptiveDeadline,
+    CircuitBreaker,
+    CircuitState,
+    LatencyWindow,
+    RetryBudget,
+    backoff_delay,
+    hedged,
+)
+
+
+def test_timeouts_raise_a_deadline_learned_from_fast_answers(clock):
+    latencies = LatencyWindow(200, max_age=600, clock=clock)
+    deadline = AdaptiveDeadline(latencies, ceiling=90, floor=5, min_samples=20)
+    for _ in range(20):
+        latencies.observe(2.0)
+    assert deadline.seconds() == 5
+
+    seen = []
+    for _ in range(5):
+        # What _request_upstream_answer records when a call is cut off.
+        latencies.observe(deadline.seconds())
+        seen.append(deadline.seconds())
+
+    assert seen == [10, 20, 40, 80, 90]
+
+
+def test_old_samples_age_out(clock):
+    latencies = LatencyWindow(200, max_age=600, clock=clock)
+    deadline = AdaptiveDeadline(latencies, ceiling=90, floor=5, min_samples=20)
+    for _ in range(20):
+        latencies.observe(2.0)
+
+    clock.now = 601
+
+    assert len(latencies) == 0
+    assert deadline.seconds() == 90
+
+
+def test_breaker_opens_probes_and_closes(clock):
+    breaker = CircuitBreaker(failure_rate=0.5, window_seconds=30, min_requests=4, open_seconds=15, clock=clock)
+    for success in (True, False, True):
+        breaker.record(success)
+    assert breaker.state is CircuitState.CLOSED
+
+    breaker.record(False)
+    assert breaker.state is CircuitState.OPEN
+    assert not breaker.allow()
+
+    clock.now = 15
+    assert breaker.state is CircuitState.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # one probe at a time
+
+    breaker.record(True)
+    assert breaker.state is CircuitState.CLOSED
+    assert breaker.allow()
+    assert (breaker.opened, breaker.rejected) == (1, 2)
+
+
+def test_failed_probe_reopens_and_lost_probe_is_replaced(clock):
+    breaker = CircuitBreaker(failure_rate=0.5, window_seconds=30, min_requests=1, open_seconds=15, clock=clock)
+    breaker.record(False)
+    clock.now = 15
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state is CircuitState.OPEN
+
+    clock.now = 30
+    assert breaker.allow()  # this probe's caller never reports back
+    clock.now = 44
+    assert not breaker.allow()
+    clock.now = 45
+    assert breaker.allow()
+
+
+def test_breaker_forgets_failures_outside_the_window(clock):
+    breaker = CircuitBreaker(failure_rate=0.5, window_seconds=30, min_requests=4, open_seconds=15, clock=clock)
+    for _ in range(3):
+        breaker.record(False)
+    clock.now = 31
+    breaker.record(False)
+
+    assert breaker.state is CircuitState.CLOSED
+    assert breaker.stats()["window_failures"] == 1
+
+
+def test_exhausted_retry_budget_refuses_retries(clock):
+    budget = RetryBudget(ratio=0.1, min_per_second=0.1, window_seconds=10, clock=clock)
+    for _ in range(10):
+        budget.record_request()
+
+    assert [budget.try_spend() for _ in range(3)] == [True, True, False]
+    assert (budget.spent, budget.exhausted) == (2, 1)
+
+    clock.now = 11  # requests and retries both age out; only the floor is left
+    assert [budget.try_spend() for _ in range(2)] == [True, False]
+
+
+def test_backoff_grows_exponentially_up_to_the_cap(monkeypatch):
+    bounds = []
+    monkeypatch.setattr(random, "uniform", lambda low, high: bounds.append((low, high)) or high)
+
+    delays = [backoff_delay(attempt, base=0.2, cap=1.0) for attempt in range(1, 5)]
+
+    assert delays == [0.2, 0.4, 0.8, 1.0]
+    assert all(low == 0.0 for low, _ in bounds)
+
+
+def _hedge_factory(answers):
+    """Calls in order; each answer is ``(seconds to wait, result)``. Logs start times and cancellations."""
+
+    log = []
+
+    async def call():
+        number = len(log)
+        loop = asyncio.get_running_loop()
+        log.append([loop.time(), "running"])
+        delay, result = answers[number]
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            log[number][1] = "cancelled"
+            raise
+        log[number][1] = "done"
+        return result
+
+    return call, log
+
+
+def test_fast_call_is_not_hedged():
+    call, log = _hedge_factory([(0, "first")])
+    asked = []
+
+    result = asyncio.run(hedged(call, 10, lambda: asked.append(True) or True))
+
+    assert result == "first"
+    assert len(log) == 1
+    assert asked == []
+
+
+def test_hedge_starts_after_the_delay_and_the_winner_cancels_the_loser():
+    call, log = _hedge_factory([(3600, "stuck"), (0, "hedge")])
+
+    result = asyncio.run(hedged(call, 0.05, lambda: True))
+
+    assert result == "hedge"
+    assert log[1][0] - log[0][0] >= 0.05
+    assert [state for _, state in log] == ["cancelled", "done"]
+
+
+def test_hedge_is_skipped_when_the_budget_says_no():
+    call, log = _hedge_factory([(0.1, "first"), (0, "hedge")])
+
+    assert asyncio.run(hedged(call, 0.01, lambda: False)) == "first"
+    assert len(log) == 1
+
+
+def test_unsuccessful_answer_does_not_win_the_race():
+    call, log = _hedge_factory([(0.1, 200), (0, 503)])
+
+    result = asyncio.run(hedged(call, 0.01, lambda: True, succeeded=lambda status: status < 500))
+
+    assert result == 200
+    assert [state for _, state in log] == ["done", "done"]
+
+
+@pytest.fixture
+def upstream_attempts(monkeypatch, clock):
+    """Replace the upstream call with a script of exceptions and status codes; return the calls made."""
+
+    calls = []
+    monkeypatch.setattr(main, "UPSTREAM_RETRY_BUDGET", RetryBudget(0.1, 1.0, 10, clock=clock))
+    monkeypatch.setattr(main, "UPSTREAM_RETRY_BACKOFF_BASE_SECONDS", 0.0)
+    monkeypatch.setattr(main, "UPSTREAM_HEDGE_ENABLED", False)
+
+    def script(*outcomes):
+        async def attempt(body):
+            outcome = outcomes[len(calls)]
+            calls.append(outcome)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return httpx.Response(outcome)
+
+        monkeypatch.setattr(main, "_attempt_upstream", attempt)
+        return calls
+
+    return script
+
+
+@pytest.mark.parametrize("error", [httpx.ReadTimeout("slow"), httpx.RemoteProtocolError("dropped")])
+def test_errors_after_the_request_was_sent_are_not_retried(upstream_attempts, error):
+    calls = upstream_attempts(error, 200)
+
+    with pytest.raises(type(error)):
+        asyncio.run(main._send_with_retries(b"{}"))
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize("status_code", [500, 504])
+def test_final_statuses_are_returned_without_retry(upstream_attempts, status_code):
+    calls = upstream_attempts(status_code, 200)
+
+    assert asyncio.run(main._send_with_retries(b"{}")).status_code == status_code
+    assert len(calls) == 1
+
+
+def test_connect_failures_and_503_are_retried(upstream_attempts):
+    calls = upstream_attempts(httpx.ConnectError("refused"), 503, 200)
+
+    assert asyncio.run(main._send_with_retries(b"{}")).status_code == 200
+    assert len(calls) == 3
+
+
+def test_retries_stop_when_the_budget_runs_out(upstream_attempts, monkeypatch, clock):
+    monkeypatch.setattr(main, "UPSTREAM_RETRY_BUDGET", RetryBudget(0.0, 0.0, 10, clock=clock))
+    calls = upstream_attempts(httpx.ConnectError("refused"), 200)
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(main._send_with_retries(b"{}"))
+    assert len(calls) == 1
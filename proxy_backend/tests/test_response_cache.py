@@ -0,0 +1,38 @@
+import asyncio
+import threading
+
+from proxy_backend.response_cache import ResponseCache, SQLiteCacheBackend, _entry_size
+
+
+def test_sqlite_eviction_sees_hits_that_were_not_written_yet(tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.db"), max_bytes=_entry_size("k1", "x" * 100) * 2, ttl_seconds=60)
+    backend.set("k1", "x" * 100)
+    backend.set("k2", "x" * 100)
+
+    assert backend.get("k1") == "x" * 100  # k1 is now the most recent, but only in memory
+    backend.set("k3", "x" * 100)
+
+    assert backend.get("k1") == "x" * 100
+    assert backend.get("k2") is None
+    assert backend.usage()[0] == 2
+
+
+def test_sqlite_lookups_run_off_the_event_loop(tmp_path):
+    cache = ResponseCache(SQLiteCacheBackend(str(tmp_path / "cache.db"), max_bytes=1 << 20, ttl_seconds=60))
+    threads = set()
+    original_get = cache.backend.get
+
+    def recording_get(key):
+        threads.add(threading.get_ident())
+        return original_get(key)
+
+    cache.backend.get = recording_get
+
+    async def scenario():
+        await cache.aset("key", "answer")
+        return await cache.aget("key"), await cache.aget("missing"), await cache.astats()
+
+    value, missing, stats = asyncio.run(scenario())
+    assert (value, missing) == ("answer", None)
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert threading.get_ident() not in threads
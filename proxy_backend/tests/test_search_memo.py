@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from proxy_backend import main
+from proxy_backend.cpu_offload import CpuExecutor
+from proxy_backend.manual_index import ManualIndex
+from proxy_backend.search_memo import SearchMemo, memo_key
+
+TUTORIALS = [
+    {"title": "GST Returns", "learning": "File GSTR-1 from the GST returns report after checking every voucher."},
+    {"title": "Bank Reconciliation", "learning": "Reconcile the bank ledger against the statement date by date."},
+]
+
+
+def test_key_ignores_word_order_but_not_repeats_or_limit():
+    assert memo_key(["gst", "return"], 3) == memo_key(["return", "gst"], 3)
+    assert memo_key(["gst", "gst"], 3) != memo_key(["gst"], 3)
+    assert memo_key(["gst"], 1) != memo_key(["gst"], 3)
+
+
+def test_least_recently_used_entry_is_evicted():
+    snapshot = object()
+    memo = SearchMemo(2, snapshot)
+    memo.put(snapshot, "a", ["A"])
+    memo.put(snapshot, "b", ["B"])
+    assert memo.get(snapshot, "a") == ("A",)
+
+    memo.put(snapshot, "c", ["C"])
+
+    assert memo.get(snapshot, "b") is None
+    assert (memo.get(snapshot, "a"), memo.get(snapshot, "c")) == (("A",), ("C",))
+    assert memo.stats()["entries"] == 2
+
+
+def test_searches_against_an_older_snapshot_neither_read_nor_fill():
+    old, new = object(), object()
+    memo = SearchMemo(8, old)
+    memo.put(old, "key", ["old"])
+    memo.reset(new)
+
+    memo.put(old, "late", ["old"])
+
+    assert memo.get(new, "key") is None
+    assert memo.get(old, "late") is None
+    assert memo.stats()["entries"] == 0
+
+
+@pytest.fixture
+def manual(monkeypatch):
+    """A small published manual with a fresh memo; module state is restored afterwards."""
+
+    for name in ("MANUAL_INDEX", "MANUAL_GENERATION", "MANUAL_STATS"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+    monkeypatch.setattr(main, "MANUAL_SEARCH_MEMO", SearchMemo(16))
+    main._publish_manual(main.ManualLoad(ManualIndex.build(TUTORIALS), "json", "manual.json"), 0.0)
+    return main.MANUAL_SEARCH_MEMO
+
+
+def test_repeated_search_is_served_from_the_memo(manual):
+    first = main.search_manual_context("GST returns voucher")
+    again = main.search_manual_context("voucher returns GST")
+
+    assert again == first
+    assert [snippet["title"] for snippet in first] == ["GST Returns"]
+    assert (manual.hits, manual.misses) == (1, 1)
+
+
+def test_publishing_a_new_manual_clears_the_memo(manual):
+    main.search_manual_context("GST returns voucher")
+    renamed = [dict(TUTORIALS[0], title="GSTR-1 Filing"), TUTORIALS[1]]
+
+    main._publish_manual(main.ManualLoad(ManualIndex.build(renamed), "json", "manual.json"), 0.0)
+
+    assert manual.stats()["entries"] == 0
+    assert [snippet["title"] for snippet in main.search_manual_context("GST returns voucher")] == ["GSTR-1 Filing"]
+
+
+def test_memo_statistics_are_not_reported_from_process_workers(manual, monkeypatch):
+    assert asyncio.run(main.cache_stats())["manual_search"]["max_entries"] == 16
+
+    monkeypatch.setattr(main, "CPU_EXECUTOR", CpuExecutor("process", 1, 0))
+
+    assert asyncio.run(main.cache_stats())["manual_search"]["reported"] is False
@@ -0,0 +1,61 @@
+import pytest
+
+from proxy_backend.main import REQUIRED_SECTION_HEADERS, normalize_response
+from proxy_backend.sections import missing_sections, parse_sections, section_contents
+
+COMPLETE = (
+    "Issue Acknowledgement:\nThe invoice will not print.\n\n"
+    "Clarifying Question:\nWhich printer is selected?\n\n"
+    "Solution:\n- Step 1: Open the print preview."
+)
+
+
+@pytest.mark.parametrize(
+    "markup",
+    ["Solution:", "solution:", "**Solution:**", "**Solution**:", "## Solution:", "__SOLUTION__:", "Solution :"],
+)
+def test_header_markdown_variants(markup):
+    sections = parse_sections(f"Intro text\n{markup}\nRestart Tally.", REQUIRED_SECTION_HEADERS)
+
+    assert [(section.header, section.content) for section in sections] == [("Solution:", "Restart Tally.")]
+    assert sections[0].start == len("Intro text\n")
+
+
+def test_header_must_start_a_word():
+    assert parse_sections("Resolution: reinstall", REQUIRED_SECTION_HEADERS) == []
+
+
+def test_multi_word_header_tolerates_whitespace():
+    sections = parse_sections("issue   acknowledgement:\nNoted.", REQUIRED_SECTION_HEADERS)
+
+    assert [section.header for section in sections] == ["Issue Acknowledgement:"]
+
+
+def test_empty_repeat_does_not_hide_earlier_content():
+    sections = parse_sections("Solution: first\nSolution:\n", REQUIRED_SECTION_HEADERS)
+
+    assert section_contents(sections) == {"Solution:": "first"}
+    assert missing_sections(sections, REQUIRED_SECTION_HEADERS) == ["Issue Acknowledgement:", "Clarifying Question:"]
+
+
+def test_complete_answer_is_returned_unchanged():
+    assert normalize_response("invoice not printing", f"  {COMPLETE}\n", []) == COMPLETE
+
+
+def test_only_missing_sections_are_repaired():
+    partial = "**Issue Acknowledgement:** The invoice will not print.\n\nSolution:\nUse the print preview."
+
+    repaired = normalize_response("invoice not printing in tally", partial, [])
+    contents = section_contents(parse_sections(repaired, REQUIRED_SECTION_HEADERS))
+
+    assert contents["Issue Acknowledgement:"] == "The invoice will not print."
+    assert contents["Solution:"] == "Use the print preview."
+    assert contents["Clarifying Question:"]
+    assert missing_sections(parse_sections(repaired, REQUIRED_SECTION_HEADERS), REQUIRED_SECTION_HEADERS) == []
+
+
+def test_answer_without_sections_is_replaced_by_the_template():
+    repaired = normalize_response("tally crashed after update", "Sorry, try again later.", [])
+
+    assert "Sorry" not in repaired
+    assert missing_sections(parse_sections(repaired, REQUIRED_SECTION_HEADERS), REQUIRED_SECTION_HEADERS) == []
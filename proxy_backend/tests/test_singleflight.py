@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from proxy_backend.singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    async def scenario():
+        flights = SingleFlight()
+        calls = 0
+        release = asyncio.Event()
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return "answer"
+
+        waiters = [asyncio.ensure_future(flights.do("key", fetch)) for _ in range(5)]
+        await asyncio.sleep(0)
+        assert len(flights) == 1
+        release.set()
+        results = await asyncio.gather(*waiters)
+        return calls, results, flights
+
+    calls, results, flights = asyncio.run(scenario())
+    assert calls == 1
+    assert results == ["answer"] * 5
+    assert (flights.started, flights.coalesced, len(flights)) == (1, 4, 0)
+
+
+def test_exception_reaches_every_waiter_and_key_is_released():
+    async def scenario():
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def fail():
+            await release.wait()
+            raise RuntimeError("upstream down")
+
+        waiters = [asyncio.ensure_future(flights.do("key", fail)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        outcomes = await asyncio.gather(*waiters, return_exceptions=True)
+        again = await flights.do("key", lambda: asyncio.sleep(0, result="retried"))
+        return outcomes, again
+
+    outcomes, again = asyncio.run(scenario())
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+    assert again == "retried"
+
+
+def test_cancelling_one_waiter_leaves_the_shared_call_running():
+    async def scenario():
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+            return "answer"
+
+        first = asyncio.ensure_future(flights.do("key", fetch))
+        second = asyncio.ensure_future(flights.do("key", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        return first, await second
+
+    first, result = asyncio.run(scenario())
+    assert first.cancelled()
+    assert result == "answer"
+
+
+def test_cancelling_the_last_waiter_cancels_and_forgets_the_call():
+    async def scenario():
+        flights = SingleFlight()
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def fetch():
+            started.set()
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiter = asyncio.ensure_future(flights.do("key", fetch))
+        await started.wait()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        await asyncio.wait_for(cancelled.wait(), 1)
+        return len(flights)
+
+    assert asyncio.run(scenario()) == 0
@@ -0,0 +1,46 @@
+import json
+
+import httpx
+from fastapi.testclient import TestClient
+
+from proxy_backend import main
+from proxy_backend.response_cache import create_response_cache
+
+
+def _events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_streaming_is_disabled_without_a_streaming_upstream(monkeypatch):
+    monkeypatch.setattr(main, "UPSTREAM_STREAM_URL", "")
+
+    response = TestClient(main.app).post("/ask/stream", json={"question": "invoice not printing"})
+
+    assert response.status_code == 501
+
+
+def test_chunks_are_relayed_and_sections_checked_at_the_end(monkeypatch):
+    upstream = (
+        'data: {"token": "Issue Acknowledgement:\\nThe invoice will not print.\\n\\n"}\n\n'
+        'data: {"token": "Solution:\\n- Step 1: Open the print preview."}\n\n'
+        "data: [DONE]\n\n"
+    )
+    transport = httpx.MockTransport(
+        lambda request: httpx.Response(200, headers={"content-type": "text/event-stream"}, text=upstream)
+    )
+    monkeypatch.setattr(main, "UPSTREAM_STREAM_URL", "http://upstream.test/ask/stream")
+    monkeypatch.setattr(main, "create_upstream_client", lambda timeout: httpx.AsyncClient(transport=transport))
+    monkeypatch.setattr(main, "RESPONSE_CACHE", create_response_cache(False, 0, 0))
+
+    response = TestClient(main.app).post("/ask/stream", json={"question": "invoice not printing"})
+
+    events = _events(response.text)
+    assert [name for name, _ in events] == ["chunk", "chunk", "done"]
+    assert events[0][1]["text"].startswith("Issue Acknowledgement:")
+    done = events[-1][1]
+    assert done["missing_sections"] == ["Clarifying Question:"]
+    assert done["fallback"] is True
@@ -0,0 +1,83 @@
+"""Connection-pooled HTTP client used for calls to the upstream AI service.
+
+A single client is created for the lifetime of the app so `/ask` calls reuse
+keep-alive connections instead of paying DNS, TCP and TLS setup per request.
+"""
+from __future__ import annotations
+
+import importlib.util
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Mapping, Optional, Union
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+UPSTREAM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+UPSTREAM_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY_SECONDS", "30"))
+UPSTREAM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT_SECONDS", "10"))
+UPSTREAM_HTTP2 = os.getenv("UPSTREAM_HTTP2", "false").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def http2_available() -> bool:
+    """HTTP/2 support in httpx needs the optional ``h2`` package."""
+
+    return importlib.util.find_spec("h2") is not None
+
+
+def create_upstream_client(timeout_seconds: float) -> httpx.AsyncClient:
+    """Build the pooled client with the configured limits and protocol."""
+
+    http2 = UPSTREAM_HTTP2
+    if http2 and not http2_available():
+        logger.warning("UPSTREAM_HTTP2 is enabled but the 'h2' package is missing; using HTTP/1.1")
+        http2 = False
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(timeout_seconds, connect=min(timeout_seconds, UPSTREAM_CONNECT_TIMEOUT_SECONDS)),
+        limits=httpx.Limits(
+            max_connections=UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        http2=http2,
+    )
+
+
+class ConnectTimer:
+    """httpcore ``trace`` extension that measures new-connection setup (TCP + TLS).
+
+    ``seconds`` stays ``None`` when the request reused a pooled connection.
+    """
+
+    def __init__(self) -> None:
+        self._started: Optional[float] = None
+        self.seconds: Optional[float] = None
+
+    async def __call__(self, event: str, info: Dict[str, Any]) -> None:
+        if event == "connection.connect_tcp.started":
+            self._started = time.perf_counter()
+        elif event in ("connection.connect_tcp.complete", "connection.start_tls.complete") and self._started:
+            self.seconds = time.perf_counter() - self._started
+
+
+def encode_upstream_body(upstream_payload: Mapping[str, Union[str, bytes]]) -> bytes:
+    """Serialize the upstream JSON body in a single join.
+
+    ``bytes`` values must already be JSON-safe (base64 image data). They are
+    spliced in as-is instead of being decoded to ``str`` and escaped again.
+    """
+
+    pieces: List[bytes] = []
+    for key, value in upstream_payload.items():
+        pieces.append(b"," if pieces else b"{")
+        pieces.append(json.dumps(key).encode("utf-8") + b":")
+        if isinstance(value, bytes):
+            pieces.extend((b'"', value, b'"'))
+        else:
+            pieces.append(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+    pieces.append(b"}" if pieces else b"{}")
+    return b"".join(pieces)